@@ -19,7 +19,8 @@ database_name = config['database_connection']['database_name']
 
 engine = create_engine(f'postgresql://{user}:{password}@{hostname}/{database_name}',
                        pool_size=25,
-                       max_overflow=20)
+                       max_overflow=20,
+                       use_batch_mode=True)  # send executemany() statements in batches (psycopg2 execute_batch)
 
 Session = sessionmaker(bind=engine)
 
@@ -4,6 +4,8 @@ from sqlalchemy import Column, String, DateTime, BigInteger, Boolean, JSON, orm,
 from db.base import Base, Session
 from db.entities.executor import ExecutorEntity
 from db.entities.job import JobEntity
+from db.entities.sql_execution import SqlExecutionEntity
+from db.entities.sql_plan_node import SqlPlanNodeEntity
 from db.entities.stage import StageEntity
 from db.entities.task import TaskEntity
 from history_fetcher.utils import get_prop, get_system_property
@@ -22,7 +24,8 @@ class ApplicationEntity(Base):
     """
     A class used to represent the Application entity in the database.
 
-    Each Spark application should be represented by one record in the Application table.
+    Each Spark application should be represented by one record in the Application table. The applications fetched
+    from several History Servers are told apart by the cluster (the name of the History Server source).
     """
     __tablename__ = 'application'
 
@@ -37,6 +40,7 @@ class ApplicationEntity(Base):
     spark_properties = Column(JSON)
     spark_command = Column(String)
     mode = Column(String)
+    cluster = Column(String)
 
     def __init__(self, attributes):
         """
@@ -55,6 +59,7 @@ class ApplicationEntity(Base):
         self.spark_properties = get_prop(attributes, 'spark_properties')
         self.spark_command = get_prop(attributes, 'spark_command')
         self.mode = get_prop(attributes, 'mode')
+        self.cluster = get_prop(attributes, 'cluster')
 
         self.is_processed = False
 
@@ -98,7 +103,8 @@ class ApplicationEntity(Base):
             'runtime': get_prop(app_env_data, 'runtime'),
             'spark_properties': get_prop(app_env_data, 'sparkProperties'),
             'spark_command': get_system_property(app_env_data, app['id'], 'sun.java.command'),
-            'mode': app['mode']
+            'mode': app['mode'],
+            'cluster': get_prop(app, 'cluster')
         }
 
     @orm.reconstructor
@@ -163,10 +169,12 @@ class ApplicationEntity(Base):
 
         self.driver_gc_time_metric = executor_analyzer.analyze_driver_gc_time()
         self.executor_gc_time_metric = executor_analyzer.analyze_executors_gc_time()
+        self.executor_memory_wastage_metric = executor_analyzer.analyze_executor_memory_wastage()
 
         for metric in [
             self.driver_gc_time_metric,
-            self.executor_gc_time_metric
+            self.executor_gc_time_metric,
+            self.executor_memory_wastage_metric
         ]:
             if metric.severity > Severity.NONE:
                 self.metrics_overview[metric] = metric.severity
@@ -222,6 +230,42 @@ class ApplicationEntity(Base):
 
         return basic_metrics
 
+    def get_slowest_sql_executions(self, limit=10):
+        """
+        Get the slowest Spark SQL executions of the Spark application, together with the metrics of the nodes of their
+        physical plans.
+        :param limit: maximum number of the SQL executions
+        :return: list of dicts ("id", "description", "status", "duration", "job_ids", "nodes": list of dicts ("id",
+        "name", "child_node_ids", "metrics": {metric name: value})), sorted by the duration descending
+        """
+        db = Session()
+        try:
+            executions = db.query(SqlExecutionEntity).filter(SqlExecutionEntity.app_id == self.app_id)\
+                .filter(SqlExecutionEntity.duration.isnot(None))\
+                .order_by(SqlExecutionEntity.duration.desc()).limit(limit).all()
+            sql_keys = [execution.sql_key for execution in executions]
+            nodes = {}  # dict[sql_key, List[SqlPlanNodeEntity]]
+            for node in db.query(SqlPlanNodeEntity).filter(SqlPlanNodeEntity.sql_key.in_(sql_keys))\
+                    .order_by(SqlPlanNodeEntity.node_id):
+                nodes.setdefault(node.sql_key, []).append(node)
+        finally:
+            db.close()
+
+        return [{
+            "id": execution.execution_id,
+            "description": execution.description,
+            "status": execution.status,
+            "duration": fmt_time(execution.duration / 1000.0),  # seconds
+            "job_ids": sorted((execution.running_job_ids or []) + (execution.success_job_ids or []) +
+                              (execution.failed_job_ids or [])),
+            "nodes": [{
+                "id": node.node_id,
+                "name": node.node_name,
+                "child_node_ids": node.child_node_ids or [],
+                "metrics": node.metrics or {},
+            } for node in nodes.get(execution.sql_key, [])],
+        } for execution in executions]
+
     def get_basic_configs(self):
         """
         Get set of the most important Spark config properties and their values for the Spark application
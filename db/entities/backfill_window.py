@@ -0,0 +1,62 @@
+# coding=utf-8
+
+from sqlalchemy import Column, String, Integer, DateTime, func
+
+from db.base import Base
+from history_fetcher.utils import get_prop
+
+
+class BackfillWindowEntity(Base):
+    """
+    A class used to represent the backfill_window entity in the database (a progress of the backfill of History
+    Fetcher).
+
+    Each time window of a backfill should be represented by one record in the backfill_window table. A window is
+    completed once all its applications have been fetched (or quarantined), so that an interrupted backfill resumes
+    from the first window which has not been completed. The windows are tracked per cluster (History Server source).
+    """
+    __tablename__ = 'backfill_window'
+
+    PENDING = "pending"
+    COMPLETED = "completed"
+
+    cluster = Column(String, primary_key=True)
+    window_start = Column(DateTime, primary_key=True)
+    window_end = Column(DateTime, primary_key=True)
+    status = Column(String)
+    app_count = Column(Integer)
+    failed_count = Column(Integer)
+    updated_at = Column(DateTime, server_default=func.now(), onupdate=func.now())
+
+    def __init__(self, attributes):
+        """
+        Create a BackfillWindow object.
+        :param attributes: dictionary {name: value} containing the attributes
+        """
+        self.cluster = get_prop(attributes, "cluster")
+        self.window_start = get_prop(attributes, "window_start")
+        self.window_end = get_prop(attributes, "window_end")
+        self.status = get_prop(attributes, "status")
+        self.app_count = get_prop(attributes, "app_count")
+        self.failed_count = get_prop(attributes, "failed_count")
+
+    @staticmethod
+    def get_attributes(cluster, window_start, window_end, status, app_count=None, failed_count=None):
+        """
+        Get backfill_window attributes as a key-value dict
+        :param cluster: name of the History Server source
+        :param window_start: start of the window (datetime, inclusive)
+        :param window_end: end of the window (datetime, exclusive)
+        :param status: one of PENDING, COMPLETED
+        :param app_count: number of the applications fetched in the window
+        :param failed_count: number of the applications of the window which failed
+        :return: dict (attribute: value)
+        """
+        return {
+            'cluster': cluster,
+            'window_start': window_start,
+            'window_end': window_end,
+            'status': status,
+            'app_count': app_count,
+            'failed_count': failed_count
+        }
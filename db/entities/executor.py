@@ -4,6 +4,7 @@ from sqlalchemy import Column, String, Integer, Date, DateTime, BigInteger, Bool
 from sqlalchemy.orm import relationship
 
 from db.base import Base
+from history_fetcher.row_extractor import RowExtractor, Field, OptionalField, Arg, Key
 from history_fetcher.utils import get_prop
 
 
@@ -11,7 +12,8 @@ class ExecutorEntity(Base):
     """
     A class used to represent the Executor entity in the database.
 
-    Each executor in each Spark application should be represented by one record in the Executor table.
+    Each executor in each Spark application should be represented by one record in the Executor table. The peak_*
+    columns hold the peak memory metrics of the executor (Spark 3.0+, None for the older versions), in bytes.
     """
     __tablename__ = 'executor'
 
@@ -45,6 +47,15 @@ class ExecutorEntity(Base):
     total_on_heap_storage_memory = Column(String)
     total_off_heap_storage_memory = Column(String)
     blacklisted_in_stages = Column(String)
+    peak_jvm_heap_memory = Column(BigInteger)
+    peak_jvm_off_heap_memory = Column(BigInteger)
+    peak_on_heap_execution_memory = Column(BigInteger)
+    peak_off_heap_execution_memory = Column(BigInteger)
+    peak_on_heap_storage_memory = Column(BigInteger)
+    peak_off_heap_storage_memory = Column(BigInteger)
+    peak_on_heap_unified_memory = Column(BigInteger)
+    peak_off_heap_unified_memory = Column(BigInteger)
+    peak_process_tree_jvm_rss_memory = Column(BigInteger)
 
     def __init__(self, attributes):
         """
@@ -80,6 +91,15 @@ class ExecutorEntity(Base):
         self.total_on_heap_storage_memory = get_prop(attributes, "total_on_heap_storage_memory")
         self.total_off_heap_storage_memory = get_prop(attributes, "total_off_heap_storage_memory")
         self.blacklisted_in_stages = get_prop(attributes, "blacklisted_in_stages")
+        self.peak_jvm_heap_memory = get_prop(attributes, "peak_jvm_heap_memory")
+        self.peak_jvm_off_heap_memory = get_prop(attributes, "peak_jvm_off_heap_memory")
+        self.peak_on_heap_execution_memory = get_prop(attributes, "peak_on_heap_execution_memory")
+        self.peak_off_heap_execution_memory = get_prop(attributes, "peak_off_heap_execution_memory")
+        self.peak_on_heap_storage_memory = get_prop(attributes, "peak_on_heap_storage_memory")
+        self.peak_off_heap_storage_memory = get_prop(attributes, "peak_off_heap_storage_memory")
+        self.peak_on_heap_unified_memory = get_prop(attributes, "peak_on_heap_unified_memory")
+        self.peak_off_heap_unified_memory = get_prop(attributes, "peak_off_heap_unified_memory")
+        self.peak_process_tree_jvm_rss_memory = get_prop(attributes, "peak_process_tree_jvm_rss_memory")
 
     @staticmethod
     def get_attributes(app_id, executor):
@@ -89,34 +109,48 @@ class ExecutorEntity(Base):
         :param executor: executor data (json)
         :return: dict (attribute: value)
         """
-        return {
-            'executor_key': f"{app_id}_{executor['id']}",
-            'app_id': app_id,
-            'id': executor['id'],
-            'host_port': executor['hostPort'],
-            'is_active': executor['isActive'],
-            'rdd_blocks': executor['rddBlocks'],
-            'memory_used': executor['memoryUsed'],
-            'disk_used': executor['diskUsed'],
-            'total_cores': executor['totalCores'],
-            'max_tasks': executor['maxTasks'],
-            'active_tasks': executor['activeTasks'],
-            'failed_tasks': executor['failedTasks'],
-            'total_duration': executor['totalDuration'],
-            'total_gc_time': executor['totalGCTime'],
-            'total_input_bytes': executor['totalInputBytes'],
-            'total_shuffle_read': executor['totalShuffleRead'],
-            'total_shuffle_write': executor['totalShuffleWrite'],
-            'is_blacklisted': executor['isBlacklisted'],
-            'max_memory': executor['maxMemory'],
-            'add_time': executor['addTime'],
-            'remove_time': get_prop(executor, 'removeTime'),
-            'remove_reason': get_prop(executor, 'removeReason'),
-            'executor_stdout_log': get_prop(executor, 'executorLogs', 'stdout'),
-            'executor_stderr_log': get_prop(executor, 'executorLogs', 'stderr'),
-            'used_on_heap_storage_memory': get_prop(executor, 'memoryMetrics', 'usedOnHeapStorageMemory'),
-            'used_off_heap_storage_memory': get_prop(executor, 'memoryMetrics', 'usedOffHeapStorageMemory'),
-            'total_on_heap_storage_memory': get_prop(executor, 'memoryMetrics', 'totalOnHeapStorageMemory'),
-            'total_off_heap_storage_memory': get_prop(executor, 'memoryMetrics', 'totalOffHeapStorageMemory'),
-            'blacklisted_in_stages': executor['blacklistedInStages']
-        }
+        return EXECUTOR_EXTRACTOR.get_attributes(executor, app_id)
+
+
+# the mapping of the executor data (json) to the columns, compiled into the extractor of the row tuples (see
+# RowExtractor)
+EXECUTOR_EXTRACTOR = RowExtractor(ExecutorEntity, {
+    'executor_key': Key(Arg('app_id'), Field('id')),
+    'app_id': Arg('app_id'),
+    'id': Field('id'),
+    'host_port': Field('hostPort'),
+    'is_active': Field('isActive'),
+    'rdd_blocks': Field('rddBlocks'),
+    'memory_used': Field('memoryUsed'),
+    'disk_used': Field('diskUsed'),
+    'total_cores': Field('totalCores'),
+    'max_tasks': Field('maxTasks'),
+    'active_tasks': Field('activeTasks'),
+    'failed_tasks': Field('failedTasks'),
+    'total_duration': Field('totalDuration'),
+    'total_gc_time': Field('totalGCTime'),
+    'total_input_bytes': Field('totalInputBytes'),
+    'total_shuffle_read': Field('totalShuffleRead'),
+    'total_shuffle_write': Field('totalShuffleWrite'),
+    'is_blacklisted': Field('isBlacklisted'),
+    'max_memory': Field('maxMemory'),
+    'add_time': Field('addTime'),
+    'remove_time': OptionalField('removeTime'),
+    'remove_reason': OptionalField('removeReason'),
+    'executor_stdout_log': OptionalField('executorLogs', 'stdout'),
+    'executor_stderr_log': OptionalField('executorLogs', 'stderr'),
+    'used_on_heap_storage_memory': OptionalField('memoryMetrics', 'usedOnHeapStorageMemory'),
+    'used_off_heap_storage_memory': OptionalField('memoryMetrics', 'usedOffHeapStorageMemory'),
+    'total_on_heap_storage_memory': OptionalField('memoryMetrics', 'totalOnHeapStorageMemory'),
+    'total_off_heap_storage_memory': OptionalField('memoryMetrics', 'totalOffHeapStorageMemory'),
+    'blacklisted_in_stages': Field('blacklistedInStages'),
+    'peak_jvm_heap_memory': OptionalField('peakMemoryMetrics', 'JVMHeapMemory'),
+    'peak_jvm_off_heap_memory': OptionalField('peakMemoryMetrics', 'JVMOffHeapMemory'),
+    'peak_on_heap_execution_memory': OptionalField('peakMemoryMetrics', 'OnHeapExecutionMemory'),
+    'peak_off_heap_execution_memory': OptionalField('peakMemoryMetrics', 'OffHeapExecutionMemory'),
+    'peak_on_heap_storage_memory': OptionalField('peakMemoryMetrics', 'OnHeapStorageMemory'),
+    'peak_off_heap_storage_memory': OptionalField('peakMemoryMetrics', 'OffHeapStorageMemory'),
+    'peak_on_heap_unified_memory': OptionalField('peakMemoryMetrics', 'OnHeapUnifiedMemory'),
+    'peak_off_heap_unified_memory': OptionalField('peakMemoryMetrics', 'OffHeapUnifiedMemory'),
+    'peak_process_tree_jvm_rss_memory': OptionalField('peakMemoryMetrics', 'ProcessTreeJVMRSSMemory'),
+}, ['app_id'])
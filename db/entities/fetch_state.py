@@ -0,0 +1,92 @@
+# coding=utf-8
+
+from sqlalchemy import Column, String, Integer, DateTime, JSON, func
+
+from db.base import Base
+from history_fetcher.utils import get_prop
+
+
+class FetchStateEntity(Base):
+    """
+    A class used to represent the fetch_state entity in the database (a progress of History Fetcher).
+
+    Each application found by History Fetcher should be represented by one record in the fetch_state table. The record
+    is kept even if fetching the application fails, so that the failed applications can be retried later.
+
+    In the sharded mode, the record is also a lease: the worker fetching the application is recorded in worker_id, and
+    the application is reserved for the worker until lease_expires_at. The workers extend the leases of their
+    applications by heartbeats, the applications of a crashed worker can be claimed by another worker once their leases
+    expire.
+
+    In the incremental mode, the running applications are tracked with the running status, and the watermarks of the
+    last poll (see Watermarks) are recorded, so that the next poll fetches only the jobs and stages changed since.
+
+    The cluster (the name of the History Server source) tells which History Server the application is fetched from.
+    """
+    __tablename__ = 'fetch_state'
+
+    PENDING = "pending"
+    IN_PROGRESS = "in_progress"
+    COMPLETED = "completed"
+    FAILED = "failed"
+    RUNNING = "running"
+
+    app_id = Column(String, primary_key=True)
+    status = Column(String)
+    level = Column(String)
+    error = Column(String)
+    end_time = Column(DateTime)
+    app_summary = Column(JSON)
+    cluster = Column(String)
+    worker_id = Column(String)
+    lease_expires_at = Column(DateTime)
+    job_watermark = Column(Integer)
+    stage_watermark = Column(Integer)
+    completion_watermark = Column(String)
+    updated_at = Column(DateTime, server_default=func.now(), onupdate=func.now())
+
+    def __init__(self, attributes):
+        """
+        Create a FetchState object.
+        :param attributes: dictionary {name: value} containing the attributes
+        """
+        self.app_id = get_prop(attributes, "app_id")
+        self.status = get_prop(attributes, "status")
+        self.level = get_prop(attributes, "level")
+        self.error = get_prop(attributes, "error")
+        self.end_time = get_prop(attributes, "end_time")
+        self.app_summary = get_prop(attributes, "app_summary")
+        self.cluster = get_prop(attributes, "cluster")
+        self.worker_id = get_prop(attributes, "worker_id")
+        self.lease_expires_at = get_prop(attributes, "lease_expires_at")
+        self.job_watermark = get_prop(attributes, "job_watermark")
+        self.stage_watermark = get_prop(attributes, "stage_watermark")
+        self.completion_watermark = get_prop(attributes, "completion_watermark")
+
+    @staticmethod
+    def get_attributes(app, status, level=None, error=None, worker_id=None, watermarks=None):
+        """
+        Get fetch_state attributes as a key-value dict
+        :param app: application data (json), as returned by the applications endpoint
+        :param status: one of PENDING, IN_PROGRESS, COMPLETED, FAILED, RUNNING
+        :param level: the level being fetched (e.g. "stages")
+        :param error: error message if the fetching failed
+        :param worker_id: id of the worker which fetched the application (in the sharded mode)
+        :param watermarks: watermarks of the last poll of a running application (in the incremental mode), as returned
+        by Watermarks.get_attributes()
+        :return: dict (attribute: value)
+        """
+        return {
+            'app_id': app['id'],
+            'status': status,
+            'level': level,
+            'error': error,
+            'end_time': app['attempts'][0]['endTime'],
+            'app_summary': app,
+            'cluster': get_prop(app, 'cluster'),
+            'worker_id': worker_id,
+            'lease_expires_at': None,
+            'job_watermark': get_prop(watermarks, 'job_watermark'),
+            'stage_watermark': get_prop(watermarks, 'stage_watermark'),
+            'completion_watermark': get_prop(watermarks, 'completion_watermark'),
+        }
@@ -11,7 +11,8 @@ class JobEntity(Base):
     """
     A class used to represent the Job entity in the database.
 
-    Each job within each Spark application should be represented by one record in the Job table.
+    Each job within each Spark application should be represented by one record in the Job table. A job run by a Spark
+    SQL execution refers to it by the sql_key.
     """
     __tablename__ = 'job'
 
@@ -19,6 +20,8 @@ class JobEntity(Base):
     app = relationship("ApplicationEntity")
     app_id = Column(String, ForeignKey('application.app_id'))
     job_id = Column(String)
+    sql_execution = relationship("SqlExecutionEntity")
+    sql_key = Column(String, ForeignKey('sql_execution.sql_key'))
     submission_time = Column(DateTime)
     completion_time = Column(DateTime)
     status = Column(String)
@@ -43,6 +46,7 @@ class JobEntity(Base):
         self.job_key = get_prop(attributes, "job_key")
         self.app_id = get_prop(attributes, "app_id")
         self.job_id = get_prop(attributes, "job_id")
+        self.sql_key = get_prop(attributes, "sql_key")
         self.submission_time = get_prop(attributes, "submission_time")
         self.completion_time = get_prop(attributes, "completion_time")
         self.status = get_prop(attributes, "status")
@@ -60,19 +64,22 @@ class JobEntity(Base):
         self.killed_tasks_summary = get_prop(attributes, "killed_tasks_summary")
 
     @staticmethod
-    def get_attributes(app_id, job):
+    def get_attributes(app_id, job, job_sql_mapping=None):
         """
         Get job attributes as a key-value dict
         :param app_id: application id (string)
         :param job: job data (json)
+        :param job_sql_mapping: mapping of SQL executions to jobs as dict(job_key: sql_key), the jobs missing in the
+        mapping were not run by any SQL execution
         :return: dict (attribute: value)
         """
         return {
             'job_key': f"{app_id}_{job['jobId']}",
             'app_id': app_id,
             'job_id': job['jobId'],
+            'sql_key': get_prop(job_sql_mapping, f"{app_id}_{job['jobId']}"),
             'submission_time': job['submissionTime'],
-            'completion_time': job['completionTime'],
+            'completion_time': get_prop(job, 'completionTime'),  # missing while the job is running
             'status': job['status'],
             'num_tasks': job['numTasks'],
             'num_active_tasks': job['numActiveTasks'],
@@ -0,0 +1,81 @@
+# coding=utf-8
+
+from sqlalchemy import Column, String, Integer, DateTime, BigInteger, ARRAY, ForeignKey
+from sqlalchemy.orm import relationship
+
+from db.base import Base
+from history_fetcher.utils import get_prop
+
+
+class SqlExecutionEntity(Base):
+    """
+    A class used to represent the sql_execution entity in the database.
+
+    Each Spark SQL execution (a query or a DataFrame action) within each Spark application should be represented by one
+    record in the sql_execution table. The jobs run by the execution refer to it by their sql_key, and the operators of
+    its physical plan are represented by the records of the sql_plan_node table.
+    """
+    __tablename__ = 'sql_execution'
+
+    sql_key = Column(String, primary_key=True)
+    app = relationship("ApplicationEntity")
+    app_id = Column(String, ForeignKey('application.app_id'))
+    plan_nodes = relationship("SqlPlanNodeEntity", back_populates="sql_execution")
+    execution_id = Column(Integer)
+    status = Column(String)
+    description = Column(String)
+    plan_description = Column(String)
+    submission_time = Column(DateTime)
+    duration = Column(BigInteger)
+    running_job_ids = Column(ARRAY(Integer))
+    success_job_ids = Column(ARRAY(Integer))
+    failed_job_ids = Column(ARRAY(Integer))
+
+    def __init__(self, attributes):
+        """
+        Create a SqlExecution object.
+        :param attributes: dictionary {name: value} containing the attributes
+        """
+        self.sql_key = get_prop(attributes, "sql_key")
+        self.app_id = get_prop(attributes, "app_id")
+        self.execution_id = get_prop(attributes, "execution_id")
+        self.status = get_prop(attributes, "status")
+        self.description = get_prop(attributes, "description")
+        self.plan_description = get_prop(attributes, "plan_description")
+        self.submission_time = get_prop(attributes, "submission_time")
+        self.duration = get_prop(attributes, "duration")
+        self.running_job_ids = get_prop(attributes, "running_job_ids")
+        self.success_job_ids = get_prop(attributes, "success_job_ids")
+        self.failed_job_ids = get_prop(attributes, "failed_job_ids")
+
+    @staticmethod
+    def get_attributes(app_id, execution):
+        """
+        Get sql_execution attributes as a key-value dict
+        :param app_id: application id (string)
+        :param execution: SQL execution data (json), as returned by the sql endpoint
+        :return: dict (attribute: value)
+        """
+        return {
+            'sql_key': f"{app_id}_{execution['id']}",
+            'app_id': app_id,
+            'execution_id': execution['id'],
+            'status': execution['status'],
+            'description': get_prop(execution, 'description'),
+            'plan_description': get_prop(execution, 'planDescription'),
+            'submission_time': get_prop(execution, 'submissionTime'),
+            'duration': get_prop(execution, 'duration'),
+            'running_job_ids': get_prop(execution, 'runningJobIds'),
+            'success_job_ids': get_prop(execution, 'successJobIds'),
+            'failed_job_ids': get_prop(execution, 'failedJobIds'),
+        }
+
+    @staticmethod
+    def get_job_ids(execution):
+        """
+        Get the ids of all the jobs run by a SQL execution.
+        :param execution: SQL execution data (json), as returned by the sql endpoint
+        :return: list of job_id's
+        """
+        return (get_prop(execution, 'runningJobIds') or []) + (get_prop(execution, 'successJobIds') or []) + \
+            (get_prop(execution, 'failedJobIds') or [])
@@ -0,0 +1,60 @@
+# coding=utf-8
+
+from sqlalchemy import Column, String, Integer, JSON, ARRAY, ForeignKey
+from sqlalchemy.orm import relationship
+
+from db.base import Base
+from history_fetcher.utils import get_prop
+
+
+class SqlPlanNodeEntity(Base):
+    """
+    A class used to represent the sql_plan_node entity in the database.
+
+    Each operator of the physical plan of each Spark SQL execution (e.g. a scan, a join, an exchange) should be
+    represented by one record in the sql_plan_node table, together with its SQL metrics (e.g. number of output rows).
+    The plan is a tree, each node refers to the nodes whose output it consumes (child_node_ids).
+    """
+    __tablename__ = 'sql_plan_node'
+
+    node_key = Column(String, primary_key=True)
+    sql_execution = relationship("SqlExecutionEntity", back_populates="plan_nodes")
+    sql_key = Column(String, ForeignKey('sql_execution.sql_key'))
+    node_id = Column(Integer)
+    node_name = Column(String)
+    whole_stage_codegen_id = Column(Integer)
+    child_node_ids = Column(ARRAY(Integer))
+    metrics = Column(JSON)
+
+    def __init__(self, attributes):
+        """
+        Create a SqlPlanNode object.
+        :param attributes: dictionary {name: value} containing the attributes
+        """
+        self.node_key = get_prop(attributes, "node_key")
+        self.sql_key = get_prop(attributes, "sql_key")
+        self.node_id = get_prop(attributes, "node_id")
+        self.node_name = get_prop(attributes, "node_name")
+        self.whole_stage_codegen_id = get_prop(attributes, "whole_stage_codegen_id")
+        self.child_node_ids = get_prop(attributes, "child_node_ids")
+        self.metrics = get_prop(attributes, "metrics")
+
+    @staticmethod
+    def get_attributes(sql_key, node, child_node_ids):
+        """
+        Get sql_plan_node attributes as a key-value dict
+        :param sql_key: sql_key of the SQL execution
+        :param node: plan node data (json), an item of the nodes of the SQL execution
+        :param child_node_ids: list of the node_id's of the nodes whose output the node consumes (from the edges of
+        the SQL execution)
+        :return: dict (attribute: value)
+        """
+        return {
+            'node_key': f"{sql_key}_{node['nodeId']}",
+            'sql_key': sql_key,
+            'node_id': node['nodeId'],
+            'node_name': node['nodeName'],
+            'whole_stage_codegen_id': get_prop(node, 'wholeStageCodegenId'),
+            'child_node_ids': child_node_ids,
+            'metrics': {metric['name']: metric['value'] for metric in get_prop(node, 'metrics') or []},
+        }
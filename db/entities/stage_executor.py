@@ -4,6 +4,7 @@ from sqlalchemy import Column, String, Integer, Date, DateTime, BigInteger, Bool
 from sqlalchemy.orm import relationship
 
 from db.base import Base
+from history_fetcher.row_extractor import RowExtractor, Field, Arg, Key
 from history_fetcher.utils import get_prop
 
 
@@ -72,24 +73,29 @@ class StageExecutorEntity(Base):
         :param stage_executor_dict: stage_executor data (json)
         :return: dict (attribute: value)
         """
-        return {
-            'stage_executor_key': f"{stage_key}_{executor_id}",
-            'stage_key': stage_key,
-            'executor_key': f"{app_id}_{executor_id}",
-            'executor_id': executor_id,
-            'task_time': stage_executor_dict['taskTime'],
-            'failed_tasks': stage_executor_dict['failedTasks'],
-            'succeeded_tasks': stage_executor_dict['succeededTasks'],
-            'killed_tasks': stage_executor_dict['killedTasks'],
-            'input_bytes': stage_executor_dict['inputBytes'],
-            'input_records': stage_executor_dict['inputRecords'],
-            'output_bytes': stage_executor_dict['outputBytes'],
-            'output_records': stage_executor_dict['outputRecords'],
-            'shuffle_read': stage_executor_dict['shuffleRead'],
-            'shuffle_read_records': stage_executor_dict['shuffleReadRecords'],
-            'shuffle_write': stage_executor_dict['shuffleWrite'],
-            'shuffle_write_records': stage_executor_dict['shuffleWriteRecords'],
-            'memory_bytes_spilled': stage_executor_dict['memoryBytesSpilled'],
-            'disk_bytes_spilled': stage_executor_dict['diskBytesSpilled'],
-            'is_blacklisted_for_stage': stage_executor_dict['isBlacklistedForStage']
-        }
\ No newline at end of file
+        return STAGE_EXECUTOR_EXTRACTOR.get_attributes(stage_executor_dict, stage_key, executor_id, app_id)
+
+
+# the mapping of the stage_executor data (json) to the columns, compiled into the extractor of the row tuples (see
+# RowExtractor)
+STAGE_EXECUTOR_EXTRACTOR = RowExtractor(StageExecutorEntity, {
+    'stage_executor_key': Key(Arg('stage_key'), Arg('executor_id')),
+    'stage_key': Arg('stage_key'),
+    'executor_key': Key(Arg('app_id'), Arg('executor_id')),
+    'executor_id': Arg('executor_id'),
+    'task_time': Field('taskTime'),
+    'failed_tasks': Field('failedTasks'),
+    'succeeded_tasks': Field('succeededTasks'),
+    'killed_tasks': Field('killedTasks'),
+    'input_bytes': Field('inputBytes'),
+    'input_records': Field('inputRecords'),
+    'output_bytes': Field('outputBytes'),
+    'output_records': Field('outputRecords'),
+    'shuffle_read': Field('shuffleRead'),
+    'shuffle_read_records': Field('shuffleReadRecords'),
+    'shuffle_write': Field('shuffleWrite'),
+    'shuffle_write_records': Field('shuffleWriteRecords'),
+    'memory_bytes_spilled': Field('memoryBytesSpilled'),
+    'disk_bytes_spilled': Field('diskBytesSpilled'),
+    'is_blacklisted_for_stage': Field('isBlacklistedForStage'),
+}, ['stage_key', 'executor_id', 'app_id'])
@@ -13,6 +13,8 @@ class StageStatisticsEntity(Base):
     Each stage in each Spark application should be represented by one record in the stage_statistics table.
     All the attributes (except for stage_key) should contain an array of five values, one for each quantile:
     0.001, 0.25, 0.5, 0.75, 0.999
+    The distributions of the peak memory metrics of the executors of the stage (Spark 3.1+, only included in the stage
+    detail) are stored as a dict {metric: array of values}, for the quantiles in executor_metrics_quantiles.
     """
     __tablename__ = 'stage_statistics'
 
@@ -46,6 +48,8 @@ class StageStatisticsEntity(Base):
     shuffle_write_bytes = Column(ARRAY(Float))
     shuffle_write_records = Column(ARRAY(Float))
     shuffle_write_time = Column(ARRAY(Float))
+    executor_metrics_quantiles = Column(ARRAY(Float))
+    executor_peak_memory_metrics = Column(JSON)
 
     def __init__(self, attributes):
         """
@@ -81,13 +85,16 @@ class StageStatisticsEntity(Base):
         self.shuffle_write_bytes = get_prop(attributes, "shuffle_write_bytes")
         self.shuffle_write_records = get_prop(attributes, "shuffle_write_records")
         self.shuffle_write_time = get_prop(attributes, "shuffle_write_time")
+        self.executor_metrics_quantiles = get_prop(attributes, "executor_metrics_quantiles")
+        self.executor_peak_memory_metrics = get_prop(attributes, "executor_peak_memory_metrics")
 
     @staticmethod
-    def get_attributes(stage_key, stage_statistics):
+    def get_attributes(stage_key, stage_statistics, executor_metrics_distributions=None):
         """
         Get stage_statistics entity attributes as a key-value dict
         :param stage_key: stage key (string)
         :param stage_statistics: stage_statistics data (json)
+        :param executor_metrics_distributions: executorMetricsDistributions of the stage detail (json), or None
         :return: dict (attribute: value)
         """
         return {
@@ -119,5 +126,7 @@ class StageStatisticsEntity(Base):
             'shuffle_total_blocks_fetched': stage_statistics["shuffleReadMetrics"]["totalBlocksFetched"],
             'shuffle_write_bytes': stage_statistics["shuffleWriteMetrics"]["writeBytes"],
             'shuffle_write_records': stage_statistics["shuffleWriteMetrics"]["writeRecords"],
-            'shuffle_write_time': stage_statistics["shuffleWriteMetrics"]["writeTime"]
+            'shuffle_write_time': stage_statistics["shuffleWriteMetrics"]["writeTime"],
+            'executor_metrics_quantiles': get_prop(executor_metrics_distributions, 'quantiles'),
+            'executor_peak_memory_metrics': get_prop(executor_metrics_distributions, 'peakMemoryMetrics')
         }
@@ -4,6 +4,7 @@ from sqlalchemy import Column, String, Integer, Date, DateTime, BigInteger, Bool
 from sqlalchemy.orm import relationship
 
 from db.base import Base
+from history_fetcher.row_extractor import RowExtractor, Field, OptionalField, Arg, Const, Key
 from history_fetcher.utils import get_prop
 
 
@@ -55,6 +56,7 @@ class TaskEntity(Base):
     shuffle_bytes_written = Column(BigInteger, comment="Number of bytes written in shuffle operations")
     shuffle_write_time = Column(BigInteger, comment="Time spent blocking on writes to disk or buffer cache. The value is expressed in nanoseconds.")
     shuffle_records_written = Column(BigInteger, comment="Number of records written in shuffle operations")
+    sampling_weight = Column(Float, comment="Number of the tasks of the stage represented by this task: 1 for the tasks stored unconditionally, N/n for a task from a random sample of n out of N tasks. sum(metric * sampling_weight) estimates the total over all the tasks of the stage.")
 
     def __init__(self, attributes):
         """
@@ -99,6 +101,7 @@ class TaskEntity(Base):
         self.shuffle_bytes_written = get_prop(attributes, 'shuffle_bytes_written')
         self.shuffle_write_time = get_prop(attributes, 'shuffle_write_time')
         self.shuffle_records_written = get_prop(attributes, 'shuffle_records_written')
+        self.sampling_weight = get_prop(attributes, 'sampling_weight')
 
     @staticmethod
     def get_attributes(stage_key, task, app_id):
@@ -109,44 +112,48 @@ class TaskEntity(Base):
         :param app_id: application id (string)
         :return: dict (attribute: value)
         """
-        return {
-            'task_key': f"{stage_key}_{task['taskId']}",
-            'stage_key': stage_key,
-            'task_id': task['taskId'],
-            'index': task['index'],
-            'attempt': task['attempt'],
-            'launch_time': task['launchTime'],
-            'duration': task['duration'],
-            'executor_key': f"{app_id}_{task['executorId']}",
-            'host': task['host'],
-            'status': task['status'],
-            'error_message': get_prop(task, 'errorMessage'),
-            'task_locality': task['taskLocality'],
-            'speculative': task['speculative'],
-            'accumulator_updates': task['accumulatorUpdates'],
-            'executor_deserialize_time': get_prop(task, 'taskMetrics', 'executorDeserializeTime'),
-            'executor_deserialize_cpu_time': get_prop(task, 'taskMetrics', 'executorDeserializeCpuTime'),
-            'executor_run_time': get_prop(task, 'taskMetrics', 'executorRunTime'),
-            'executor_cpu_time': get_prop(task, 'taskMetrics', 'executorCpuTime'),
-            'result_size': get_prop(task, 'taskMetrics', 'resultSize'),
-            'jvm_gc_time': get_prop(task, 'taskMetrics', 'jvmGcTime'),
-            'result_serialization_time': get_prop(task, 'taskMetrics', 'resultSerializationTime'),
-            'memory_bytes_spilled': get_prop(task, 'taskMetrics', 'memoryBytesSpilled'),
-            'disk_bytes_spilled': get_prop(task, 'taskMetrics', 'diskBytesSpilled'),
-            'peak_execution_memory': get_prop(task, 'taskMetrics', 'peakExecutionMemory'),
-            'bytes_read': get_prop(task, 'taskMetrics', 'inputMetrics', 'bytesRead'),
-            'records_read': get_prop(task, 'taskMetrics', 'inputMetrics', 'recordsRead'),
-            'bytes_written': get_prop(task, 'taskMetrics', 'outputMetrics', 'bytesWritten'),
-            'records_written': get_prop(task, 'taskMetrics', 'outputMetrics', 'recordsWritten'),
-            'shuffle_remote_blocks_fetched': get_prop(task, 'taskMetrics','shuffleReadMetrics','remoteBlocksFetched'),
-            'shuffle_local_blocks_fetched': get_prop(task, 'taskMetrics', 'shuffleReadMetrics', 'localBlocksFetched'),
-            'shuffle_fetch_wait_time': get_prop(task, 'taskMetrics', 'shuffleReadMetrics', 'fetchWaitTime'),
-            'shuffle_remote_bytes_read': get_prop(task, 'taskMetrics', 'shuffleReadMetrics', 'remoteBytesRead'),
-            'shuffle_remote_bytes_read_to_disk': get_prop(task, 'taskMetrics', 'shuffleReadMetrics', 'remoteBytesReadToDisk'),
-            'shuffle_local_bytes_read': get_prop(task, 'taskMetrics', 'shuffleReadMetrics', 'localBytesRead'),
-            'shuffle_records_read': get_prop(task, 'taskMetrics', 'shuffleReadMetrics', 'recordsRead'),
-            'shuffle_bytes_written': get_prop(task, 'taskMetrics', 'shuffleWriteMetrics', 'bytesWritten'),
-            'shuffle_write_time': get_prop(task, 'taskMetrics', 'shuffleWriteMetrics', 'writeTime'),
-            'shuffle_records_written': get_prop(task, 'taskMetrics', 'shuffleWriteMetrics', 'recordsWritten')
-        }
+        return TASK_EXTRACTOR.get_attributes(task, stage_key, app_id)
 
+
+# the mapping of the task data (json) to the columns, compiled into the extractor of the row tuples (see RowExtractor)
+TASK_EXTRACTOR = RowExtractor(TaskEntity, {
+    'task_key': Key(Arg('stage_key'), Field('taskId')),
+    'stage_key': Arg('stage_key'),
+    'task_id': Field('taskId'),
+    'index': Field('index'),
+    'attempt': Field('attempt'),
+    'launch_time': Field('launchTime'),
+    'duration': Field('duration'),
+    'executor_key': Key(Arg('app_id'), Field('executorId')),
+    'host': Field('host'),
+    'status': Field('status'),
+    'error_message': OptionalField('errorMessage'),
+    'task_locality': Field('taskLocality'),
+    'speculative': Field('speculative'),
+    'accumulator_updates': Field('accumulatorUpdates'),
+    'executor_deserialize_time': OptionalField('taskMetrics', 'executorDeserializeTime'),
+    'executor_deserialize_cpu_time': OptionalField('taskMetrics', 'executorDeserializeCpuTime'),
+    'executor_run_time': OptionalField('taskMetrics', 'executorRunTime'),
+    'executor_cpu_time': OptionalField('taskMetrics', 'executorCpuTime'),
+    'result_size': OptionalField('taskMetrics', 'resultSize'),
+    'jvm_gc_time': OptionalField('taskMetrics', 'jvmGcTime'),
+    'result_serialization_time': OptionalField('taskMetrics', 'resultSerializationTime'),
+    'memory_bytes_spilled': OptionalField('taskMetrics', 'memoryBytesSpilled'),
+    'disk_bytes_spilled': OptionalField('taskMetrics', 'diskBytesSpilled'),
+    'peak_execution_memory': OptionalField('taskMetrics', 'peakExecutionMemory'),
+    'bytes_read': OptionalField('taskMetrics', 'inputMetrics', 'bytesRead'),
+    'records_read': OptionalField('taskMetrics', 'inputMetrics', 'recordsRead'),
+    'bytes_written': OptionalField('taskMetrics', 'outputMetrics', 'bytesWritten'),
+    'records_written': OptionalField('taskMetrics', 'outputMetrics', 'recordsWritten'),
+    'shuffle_remote_blocks_fetched': OptionalField('taskMetrics', 'shuffleReadMetrics', 'remoteBlocksFetched'),
+    'shuffle_local_blocks_fetched': OptionalField('taskMetrics', 'shuffleReadMetrics', 'localBlocksFetched'),
+    'shuffle_fetch_wait_time': OptionalField('taskMetrics', 'shuffleReadMetrics', 'fetchWaitTime'),
+    'shuffle_remote_bytes_read': OptionalField('taskMetrics', 'shuffleReadMetrics', 'remoteBytesRead'),
+    'shuffle_remote_bytes_read_to_disk': OptionalField('taskMetrics', 'shuffleReadMetrics', 'remoteBytesReadToDisk'),
+    'shuffle_local_bytes_read': OptionalField('taskMetrics', 'shuffleReadMetrics', 'localBytesRead'),
+    'shuffle_records_read': OptionalField('taskMetrics', 'shuffleReadMetrics', 'recordsRead'),
+    'shuffle_bytes_written': OptionalField('taskMetrics', 'shuffleWriteMetrics', 'bytesWritten'),
+    'shuffle_write_time': OptionalField('taskMetrics', 'shuffleWriteMetrics', 'writeTime'),
+    'shuffle_records_written': OptionalField('taskMetrics', 'shuffleWriteMetrics', 'recordsWritten'),
+    'sampling_weight': Const(1.0),
+}, ['stage_key', 'app_id'])
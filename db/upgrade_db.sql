@@ -0,0 +1,50 @@
+-- this script upgrades the tables of an existing database to the current version of the entities
+-- (the tables created by History Fetcher are not altered when the entities change, only the missing tables are created)
+-- the statements can be run repeatedly, the columns already present are skipped
+-- (fetch_state is created by History Fetcher with all its columns if it does not exist yet)
+
+
+-- task sampling (the tasks stored before stand for themselves)
+ALTER TABLE task ADD COLUMN IF NOT EXISTS sampling_weight double precision DEFAULT 1;
+COMMENT ON COLUMN task.sampling_weight IS 'Number of the tasks of the stage represented by this task: 1 for the tasks stored unconditionally, N/n for a task from a random sample of n out of N tasks. sum(metric * sampling_weight) estimates the total over all the tasks of the stage.';
+
+
+-- several History Servers (clusters) in one database
+ALTER TABLE application ADD COLUMN IF NOT EXISTS cluster varchar;
+ALTER TABLE IF EXISTS fetch_state ADD COLUMN IF NOT EXISTS cluster varchar;
+-- the applications stored before belong to the cluster of the single History Server: replace 'default' by the cluster
+-- option of history_fetcher/config.ini, or by the name of the source which continues fetching that History Server
+-- (with an empty app_id_prefix in its section, so that the application_id's of its applications stay the same)
+UPDATE application SET cluster = 'default' WHERE cluster IS NULL;
+DO $$
+BEGIN
+    IF to_regclass('fetch_state') IS NOT NULL THEN
+        UPDATE fetch_state SET cluster = 'default' WHERE cluster IS NULL;
+    END IF;
+END $$;
+
+
+-- Spark SQL executions (the sql_execution and sql_plan_node tables are created by History Fetcher, the foreign key of
+-- job.sql_key is created once sql_execution exists, run the script again after the first run of History Fetcher)
+ALTER TABLE job ADD COLUMN IF NOT EXISTS sql_key varchar;
+DO $$
+BEGIN
+    IF to_regclass('sql_execution') IS NOT NULL AND NOT EXISTS (
+            SELECT 1 FROM pg_constraint WHERE conname = 'job_sql_key_fkey' AND conrelid = 'job'::regclass) THEN
+        ALTER TABLE job ADD CONSTRAINT job_sql_key_fkey FOREIGN KEY (sql_key) REFERENCES sql_execution (sql_key);
+    END IF;
+END $$;
+
+
+-- executor peak memory metrics
+ALTER TABLE executor ADD COLUMN IF NOT EXISTS peak_jvm_heap_memory bigint;
+ALTER TABLE executor ADD COLUMN IF NOT EXISTS peak_jvm_off_heap_memory bigint;
+ALTER TABLE executor ADD COLUMN IF NOT EXISTS peak_on_heap_execution_memory bigint;
+ALTER TABLE executor ADD COLUMN IF NOT EXISTS peak_off_heap_execution_memory bigint;
+ALTER TABLE executor ADD COLUMN IF NOT EXISTS peak_on_heap_storage_memory bigint;
+ALTER TABLE executor ADD COLUMN IF NOT EXISTS peak_off_heap_storage_memory bigint;
+ALTER TABLE executor ADD COLUMN IF NOT EXISTS peak_on_heap_unified_memory bigint;
+ALTER TABLE executor ADD COLUMN IF NOT EXISTS peak_off_heap_unified_memory bigint;
+ALTER TABLE executor ADD COLUMN IF NOT EXISTS peak_process_tree_jvm_rss_memory bigint;
+ALTER TABLE stage_statistics ADD COLUMN IF NOT EXISTS executor_metrics_quantiles double precision[];
+ALTER TABLE stage_statistics ADD COLUMN IF NOT EXISTS executor_peak_memory_metrics json;
@@ -0,0 +1,141 @@
+import queue
+
+from db.entities.executor import ExecutorEntity
+from db.entities.task import TaskEntity
+
+
+class ApplicationRows:
+    """
+    A class holding the records of a single application, fetched from Spark History Server (SHS) but not yet written
+    into the database.
+
+    The records are added with the same interface as BulkWriter.add(), so the fetching code does not need to know if
+    it writes into the database directly or not.
+
+    The records of a large application can be streamed to its writer thread while the application is still being
+    fetched (see start_stream): the buffered records are handed over in chunks through a bounded queue, so that the
+    memory held by the application does not grow with its number of tasks. The chunks are written within the same
+    transaction as the rest of the application.
+    """
+    # the last chunk of the stream
+    END = object()
+
+    def __init__(self, app):
+        """
+        Create ApplicationRows object
+        :param app: application data (json), as returned by the applications endpoint
+        """
+        self.app = app
+        self.app_id = app['id']
+        self.level = None  # the level being fetched, for reporting the failures
+        self.rows = {}  # dict[entity, List[attributes]]
+        self.tuples = {}  # dict[entity, List[row tuple]], for the large volumes of records (tasks)
+        self.executor_keys = set()  # index of the executor keys of the application
+        self.watermarks = None  # Watermarks of a running application fetched incrementally, None for a full fetch
+        self.task_count = 0  # number of the buffered task records
+        self.stream = None  # queue.Queue of the chunks handed over to the writer thread, None if not streamed
+        self.write_future = None  # future of the writer thread writing the streamed application
+        self.fetch_exception = None  # exception raised while fetching the streamed application
+        self.stream_consumed = False  # True once the writer thread has read the end of the stream
+
+    def add(self, entity, attributes):
+        """
+        Add a record of the application.
+        :param entity: entity class (e.g. TaskEntity)
+        :param attributes: dictionary {name: value} containing the attributes, as returned by Entity.get_attributes()
+        """
+        self.rows.setdefault(entity, []).append(attributes)
+        if entity is ExecutorEntity:
+            self.executor_keys.add(attributes['executor_key'])
+
+    def add_tuples(self, entity, row_tuples):
+        """
+        Add records of the application in the compact form of row tuples.
+        :param entity: entity class (e.g. TaskEntity)
+        :param row_tuples: list of tuples containing the values in the order of the table columns
+        """
+        self.tuples.setdefault(entity, []).extend(row_tuples)
+        if entity is TaskEntity:
+            self.task_count += len(row_tuples)
+
+    def take(self):
+        """
+        Take all the buffered records out of the object.
+        :return: tuple (dict {entity: list of the attribute dictionaries}, dict {entity: list of the row tuples})
+        """
+        rows, tuples = self.rows, self.tuples
+        self.rows = {}
+        self.tuples = {}
+        self.task_count = 0
+        return rows, tuples
+
+    def start_stream(self, max_chunks):
+        """
+        Stream the records of the application to its writer thread from now on (see hand_over). The writer thread is
+        started afterwards, and its future is kept in write_future.
+        :param max_chunks: maximum number of the chunks waiting for the writer thread, hand_over blocks while the
+        queue is full
+        """
+        self.stream = queue.Queue(maxsize=max(max_chunks, 1))
+
+    def is_streamed(self):
+        """
+        Check if the records are streamed to the writer thread while the application is being fetched.
+        :return: True if the stream was started
+        """
+        return self.stream is not None
+
+    def hand_over(self):
+        """
+        Hand the buffered records over to the writer thread as a single chunk, waiting while the stream is full.
+        Called from the thread fetching the application.
+        """
+        if self.rows or self.tuples:
+            self.stream.put(self.take())
+
+    def end_stream(self, exception=None):
+        """
+        Hand the remaining records over to the writer thread and end the stream. Called from the thread fetching the
+        application once it is fetched (or failed).
+        :param exception: exception raised while fetching the application, or None
+        """
+        self.hand_over()
+        self.fetch_exception = exception
+        self.stream.put(self.END)
+
+    def get_chunks(self):
+        """
+        Get the chunks of the stream in the order in which they were handed over, until the stream is ended. Called
+        from the writer thread.
+        :return: generator of tuples (dict {entity: list of the attribute dictionaries}, dict {entity: list of the row
+        tuples})
+        """
+        while not self.stream_consumed:
+            chunk = self.stream.get()
+            if chunk is self.END:
+                self.stream_consumed = True
+                return
+            yield chunk
+
+    def discard_stream(self):
+        """
+        Drop the remaining chunks of the stream without writing them (e.g. after the writing failed), so that the
+        thread fetching the application is not blocked by the full stream. Waits until the stream is ended.
+        """
+        if self.is_streamed():
+            for _ in self.get_chunks():
+                pass
+
+    def is_incremental(self):
+        """
+        Check if the application is fetched incrementally (a poll of a running application, or its finalization).
+        :return: True if only the jobs and stages changed since the previous poll are fetched
+        """
+        return self.watermarks is not None
+
+    def is_running(self):
+        """
+        Check if the application is still running.
+        :return: True if the application has not completed
+        """
+        return not self.app['attempts'][0]['completed']
@@ -0,0 +1,151 @@
+import asyncio
+import logging
+import threading
+import time
+
+import aiohttp
+
+from logger.logger import SparkscopeLogger
+
+# Set up logger
+logger = logging.getLogger(__name__)
+
+
+class AsyncHttpEngine:
+    """
+    An asyncio-based engine for sending requests to Spark History Server (SHS).
+
+    The engine runs its own event loop in a background thread and shares a single pool of keep-alive connections
+    among all the requests. The number of concurrent requests is limited by the adaptive limit of a
+    ConcurrencyController, so thousands of requests can be pending without thousands of OS threads. The failed requests
+    are retried according to a RetryPolicy. The requests are submitted from the synchronous code and the results are
+    returned as concurrent.futures.Future objects.
+    """
+    def __init__(self, controller, retry_policy, timeout, verify_certificates, on_missing=None, metrics=None):
+        """
+        Create AsyncHttpEngine object and start its event loop
+        :param controller: ConcurrencyController limiting the requests being processed at the same time
+        :param retry_policy: RetryPolicy of the failed requests
+        :param timeout: timeout of a single request (in seconds)
+        :param verify_certificates: True if the SHS certificates should be verified
+        :param on_missing: optional function called with the URL and the reason if a request fails after all the
+        retries
+        :param metrics: optional FetchMetrics recording the requests
+        """
+        self.controller = controller
+        self.retry_policy = retry_policy
+        self.timeout = timeout
+        self.verify_certificates = verify_certificates
+        self.on_missing = on_missing
+        self.metrics = metrics
+        self.in_flight = 0
+
+        self.loop = asyncio.new_event_loop()
+        self.thread = threading.Thread(target=self.loop.run_forever, name="async-http-engine", daemon=True)
+        self.thread.start()
+
+        # the session and the condition must be created within the event loop
+        self.http_session, self.slots = asyncio.run_coroutine_threadsafe(self.open(), self.loop).result()
+
+    async def open(self):
+        """
+        Create the shared http session and the condition guarding the number of the in-flight requests.
+        :return: tuple (http session, condition)
+        """
+        connector = aiohttp.TCPConnector(limit=self.controller.max_limit,
+                                         ssl=None if self.verify_certificates else False)
+        http_session = aiohttp.ClientSession(connector=connector, headers={"Accept-Encoding": "gzip, deflate"},
+                                             timeout=aiohttp.ClientTimeout(total=self.timeout))
+        return http_session, asyncio.Condition()
+
+    def submit(self, url, on_received=None):
+        """
+        Submit a request to the event loop.
+        :param url: URL
+        :param on_received: optional function called with the response size (in bytes) before the future completes
+        :return: concurrent.futures.Future with the response body (bytes) or None
+        """
+        return asyncio.run_coroutine_threadsafe(self.get_body(url, on_received), self.loop)
+
+    async def get_body(self, url, on_received=None):
+        """
+        Get the response body from the specified URL, retrying the server errors, timeouts and connection errors. The
+        body is decoded by the caller, outside of the event loop.
+        :param url: URL
+        :param on_received: optional function called with the response size (in bytes)
+        :return: response body (bytes) or None if not able to get the response
+        """
+        attempt = 0
+        while True:
+            body, error, retryable = await self.get_body_once(url)
+            if not retryable or not self.retry_policy.can_retry(attempt):
+                break
+            await asyncio.sleep(self.retry_policy.get_delay(attempt))
+            attempt += 1
+
+        if error is not None:
+            logger.warning(f"Could not open {url} after {attempt + 1} attempts: {error}")
+            if self.on_missing is not None:
+                self.on_missing(url, error)
+        if on_received is not None:
+            on_received(len(body) if body is not None else 0)
+        return body
+
+    async def get_body_once(self, url):
+        """
+        Send a single request, waiting for a free slot under the adaptive concurrency limit. A missing resource
+        (HTTP 404) is not an error, the response body is None then.
+        :param url: URL
+        :return: tuple (response body or None, description of the error or None, True if the error is retryable)
+        """
+        async with self.slots:
+            await self.slots.wait_for(lambda: self.in_flight < self.controller.get_limit())
+            self.in_flight += 1
+
+        start = time.monotonic()
+        try:
+            logger.trace(f">>> REQ: {url}")
+            async with self.http_session.get(url) as response:
+                body = await response.read()
+            logger.trace(f"<<< RSP: {url}")
+            if self.retry_policy.is_retryable_status(response.status):
+                self.controller.on_failure(time.monotonic())
+                self.observe_request(url, start, len(body), failed=True)
+                return None, f"HTTP {response.status}", True
+            self.controller.on_success(time.monotonic() - start, time.monotonic())
+            self.observe_request(url, start, len(body))
+            if response.status == 404:
+                return None, None, False
+            if response.status >= 400:
+                return None, f"HTTP {response.status}", False
+            return body, None, False
+        except (aiohttp.ClientConnectionError, aiohttp.ClientPayloadError, asyncio.TimeoutError) as e:
+            self.controller.on_failure(time.monotonic())
+            self.observe_request(url, start, 0, failed=True)
+            return None, repr(e), True
+        except Exception as e:
+            return None, repr(e), False
+        finally:
+            async with self.slots:
+                self.in_flight -= 1
+                self.slots.notify_all()
+
+    def observe_request(self, url, start, size, failed=False):
+        """
+        Record a request in the metrics, if configured.
+        :param url: URL
+        :param start: time.monotonic() when the request was sent
+        :param size: size of the response body in bytes
+        :param failed: True if the request failed
+        """
+        if self.metrics is not None:
+            self.metrics.observe_request(url, time.monotonic() - start, size, failed)
+
+    def close(self):
+        """
+        Close the connections and stop the event loop.
+        """
+        asyncio.run_coroutine_threadsafe(self.http_session.close(), self.loop).result()
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self.thread.join()
+        self.loop.close()
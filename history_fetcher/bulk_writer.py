@@ -0,0 +1,215 @@
+import logging
+import time
+
+from psycopg2.extras import execute_values
+from sqlalchemy import JSON
+
+from db.entities.application import ApplicationEntity
+from db.entities.executor import ExecutorEntity
+from db.entities.job import JobEntity
+from db.entities.sql_execution import SqlExecutionEntity
+from db.entities.sql_plan_node import SqlPlanNodeEntity
+from db.entities.stage import StageEntity
+from db.entities.stage_executor import StageExecutorEntity
+from db.entities.stage_statistics import StageStatisticsEntity
+from db.entities.task import TaskEntity
+
+# Set up logger
+logger = logging.getLogger(__name__)
+
+
+class BulkWriter:
+    """
+    A class responsible for writing the fetched records into the database in batches, instead of inserting them one
+    by one.
+
+    The records are buffered per table. Once any of the buffers reaches the batch size, all the buffers are written
+    into the database in the order given by the foreign keys, so that a child record never precedes its parent.
+
+    The records are buffered as tuples in the order of the table columns and written positionally by a multi-row
+    INSERT on the DBAPI cursor of the session (within its transaction), without building an attribute dict per record.
+    Only the values of the JSON columns are converted (by the bind processors of SQLAlchemy), the other values
+    (numbers, strings, booleans, lists for the arrays) are adapted by psycopg2 itself, so the large tables (tasks)
+    are written without touching their rows.
+
+    In the upsert mode, the records are written by INSERT ... ON CONFLICT (primary key) DO UPDATE, so that an
+    application can be written again over its previously stored records (e.g. when it is refetched).
+    """
+
+    # tables ordered so that the parents are always written before their children
+    TABLE_ORDER = [ApplicationEntity,
+                   ExecutorEntity,
+                   SqlExecutionEntity,
+                   SqlPlanNodeEntity,
+                   JobEntity,
+                   StageEntity,
+                   StageExecutorEntity,
+                   StageStatisticsEntity,
+                   TaskEntity]
+
+    def __init__(self, db_session, batch_size, upsert=False):
+        """
+        Create BulkWriter object
+        :param db_session: database session
+        :param batch_size: number of records per table which are buffered before writing them into the database
+        :param upsert: True for updating the records which already exist in the database, instead of failing
+        """
+        self.db_session = db_session
+        self.batch_size = max(batch_size, 1)
+        self.upsert = upsert
+
+        dialect = db_session.bind.dialect
+        self.columns = {entity: [column.name for column in entity.__table__.columns] for entity in self.TABLE_ORDER}
+        self.inserts = {entity: self.get_insert(entity, dialect, False) for entity in self.TABLE_ORDER}
+        self.upserts = {entity: self.get_insert(entity, dialect, True) for entity in self.TABLE_ORDER}
+        self.processors = {entity: self.get_processors(entity, dialect) for entity in self.TABLE_ORDER}
+        self.buffers = {entity: [] for entity in self.TABLE_ORDER}
+        self.row_counts = {entity: 0 for entity in self.TABLE_ORDER}
+        self.write_times = {entity: 0.0 for entity in self.TABLE_ORDER}
+
+    def add(self, entity, attributes):
+        """
+        Add a record to the buffer of the corresponding table. Write all the buffers if the batch size is reached.
+        :param entity: entity class (e.g. TaskEntity)
+        :param attributes: dictionary {name: value} containing the attributes, as returned by Entity.get_attributes()
+        :raises ValueError: if the entity is not supported
+        """
+        if entity not in self.buffers:
+            raise ValueError(f"Unsupported entity: {entity}")
+
+        # the missing attributes are stored as NULL
+        self.buffers[entity].append(tuple(attributes.get(column) for column in self.columns[entity]))
+        if len(self.buffers[entity]) >= self.batch_size:
+            self.flush()
+
+    def add_tuple(self, entity, row_tuple):
+        """
+        Add a record in the compact form of a row tuple to the buffer of the corresponding table. Write all the
+        buffers if the batch size is reached.
+        :param entity: entity class (e.g. TaskEntity)
+        :param row_tuple: tuple containing the values in the order of the table columns
+        """
+        self.buffers[entity].append(row_tuple)
+        if len(self.buffers[entity]) >= self.batch_size:
+            self.flush()
+
+    def add_tuples(self, entity, row_tuples):
+        """
+        Add records in the compact form of row tuples (see add_tuple). Write all the buffers if the batch size is
+        reached.
+        :param entity: entity class (e.g. TaskEntity)
+        :param row_tuples: list of tuples containing the values in the order of the table columns
+        """
+        self.buffers[entity].extend(row_tuples)
+        if len(self.buffers[entity]) >= self.batch_size:
+            self.flush()
+
+    def flush(self):
+        """
+        Write all the buffered records into the database, respecting the foreign keys ordering.
+        """
+        for entity in self.TABLE_ORDER:
+            rows = self.buffers[entity]
+            if not rows:
+                continue
+
+            start = time.time()
+            processors = self.processors[entity]
+            if processors:
+                rows = [self.process_row(row, processors) for row in rows]
+            cursor = self.db_session.connection().connection.cursor()
+            try:
+                statement = self.upserts[entity] if self.upsert else self.inserts[entity]
+                execute_values(cursor, statement, rows, page_size=self.batch_size)
+            finally:
+                cursor.close()
+            self.write_times[entity] += time.time() - start
+            self.row_counts[entity] += len(rows)
+            self.buffers[entity] = []
+
+    @staticmethod
+    def get_insert(entity, dialect, upsert):
+        """
+        Get the multi-row insert statement of a table, taking the values positionally (in the order of the table
+        columns). In the upsert mode, the rows conflicting on the primary key update all the other columns.
+        :param entity: entity class (e.g. TaskEntity)
+        :param dialect: SQLAlchemy dialect of the database, for quoting the identifiers
+        :param upsert: True for the upsert statement
+        :return: SQL of the statement, with a single %s placeholder for the values (see psycopg2 execute_values)
+        """
+        table = entity.__table__
+        quote = dialect.identifier_preparer.quote
+        columns = ", ".join(quote(column.name) for column in table.columns)
+        statement = f"INSERT INTO {dialect.identifier_preparer.format_table(table)} ({columns}) VALUES %s"
+        if upsert:
+            primary_key = ", ".join(quote(column.name) for column in table.primary_key.columns)
+            updates = ", ".join(f"{quote(column.name)} = EXCLUDED.{quote(column.name)}"
+                                for column in table.columns if not column.primary_key)
+            statement += f" ON CONFLICT ({primary_key}) DO UPDATE SET {updates}"
+        return statement
+
+    @staticmethod
+    def get_processors(entity, dialect):
+        """
+        Get the bind processors of the JSON columns of a table, which serialize their values.
+        :param entity: entity class (e.g. TaskEntity)
+        :param dialect: SQLAlchemy dialect of the database
+        :return: list of tuples (column index, bind processor)
+        """
+        processors = []
+        for index, column in enumerate(entity.__table__.columns):
+            if isinstance(column.type, JSON):
+                processors.append((index, column.type.dialect_impl(dialect).bind_processor(dialect)))
+        return processors
+
+    @staticmethod
+    def process_row(row_tuple, processors):
+        """
+        Convert the values of a row tuple by the bind processors of their columns.
+        :param row_tuple: tuple containing the values in the order of the table columns
+        :param processors: list of tuples (column index, bind processor), see get_processors
+        :return: list of the converted values
+        """
+        row = list(row_tuple)
+        for index, processor in processors:
+            row[index] = processor(row[index])
+        return row
+
+    def clear(self):
+        """
+        Drop all the buffered records without writing them (e.g. after the transaction was rolled back).
+        """
+        self.buffers = {entity: [] for entity in self.TABLE_ORDER}
+
+    def get_statistics(self):
+        """
+        Get number of the written rows and the write time per table.
+        :return: dict {table name: (rows written, write time in seconds)}
+        """
+        return {entity.__tablename__: (self.row_counts[entity], self.write_times[entity])
+                for entity in self.TABLE_ORDER}
+
+    @staticmethod
+    def merge_statistics(writers):
+        """
+        Sum up the statistics of several writers (e.g. one per writer thread).
+        :param writers: list of BulkWriter objects
+        :return: dict {table name: (rows written, write time in seconds)}
+        """
+        statistics = {entity.__tablename__: (0, 0.0) for entity in BulkWriter.TABLE_ORDER}
+        for writer in writers:
+            for table, (rows, write_time) in writer.get_statistics().items():
+                statistics[table] = (statistics[table][0] + rows, statistics[table][1] + write_time)
+        return statistics
+
+    @staticmethod
+    def log_statistics(statistics):
+        """
+        Log number of the written rows and the write throughput per table. The write time of several writer threads
+        is summed up, so the throughput is per writer thread.
+        :param statistics: dict {table name: (rows written, write time in seconds)}, see get_statistics
+        """
+        for table, (rows, write_time) in statistics.items():
+            throughput = rows / write_time if write_time > 0 else 0.0
+            logger.info(f"Table {table}: {rows} rows written in {write_time:.3f} s "
+                        f"({throughput:.0f} rows/s).")
@@ -0,0 +1,114 @@
+import logging
+import threading
+
+# Set up logger
+logger = logging.getLogger(__name__)
+
+
+class ConcurrencyController:
+    """
+    An adaptive limit of the requests sent to Spark History Server (SHS) at the same time, based on the AIMD
+    (additive increase, multiplicative decrease) algorithm.
+
+    The limit starts at the minimum and doubles with every round of successful responses until the first overload is
+    detected (slow start). After that, every successful response raises the limit by 1/limit, i.e. by one request per
+    round trip of all the in-flight requests. A failed request (5xx, timeout, connection reset) or a response slower
+    than the latency threshold cuts the limit in half. The limit is cut at most once per latency threshold, so that a
+    burst of failures caused by the same overload is counted only once.
+    """
+    DECREASE_FACTOR = 0.5
+
+    def __init__(self, min_limit, max_limit, latency_threshold):
+        """
+        Create ConcurrencyController object
+        :param min_limit: minimum number of the in-flight requests
+        :param max_limit: maximum number of the in-flight requests
+        :param latency_threshold: response time (in seconds) above which SHS is considered to be overloaded
+        """
+        self.min_limit = max(min_limit, 1)
+        self.max_limit = max(max_limit, self.min_limit)
+        self.latency_threshold = latency_threshold
+
+        self.limit = float(self.min_limit)
+        self.slow_start = True
+        self.last_decrease = None
+        self.in_flight = 0
+        self.condition = threading.Condition()
+
+        self.success_count = 0
+        self.failure_count = 0
+        self.decrease_count = 0
+        self.peak_limit = self.limit
+
+    def get_limit(self):
+        """
+        Get the current limit of the in-flight requests.
+        :return: limit (int)
+        """
+        return int(self.limit)
+
+    def acquire(self):
+        """
+        Wait until the number of the in-flight requests is below the limit and register a new request.
+        """
+        with self.condition:
+            while self.in_flight >= int(self.limit):
+                self.condition.wait()
+            self.in_flight += 1
+
+    def release(self):
+        """
+        Unregister a finished request.
+        """
+        with self.condition:
+            self.in_flight -= 1
+            self.condition.notify_all()
+
+    def on_success(self, latency, now):
+        """
+        Record a successful response, adjusting the limit.
+        :param latency: response time in seconds
+        :param now: monotonic time of the response
+        """
+        with self.condition:
+            self.success_count += 1
+            if latency > self.latency_threshold:
+                self.decrease(now, f"slow response ({latency:.1f} s)")
+                return
+
+            self.limit = min(self.limit + (1.0 if self.slow_start else 1.0 / self.limit), float(self.max_limit))
+            self.peak_limit = max(self.peak_limit, self.limit)
+            self.condition.notify_all()
+
+    def on_failure(self, now):
+        """
+        Record a failed request (to be retried), adjusting the limit.
+        :param now: monotonic time of the failure
+        """
+        with self.condition:
+            self.failure_count += 1
+            self.decrease(now, "failed request")
+
+    def decrease(self, now, reason):
+        """
+        Cut the limit, unless it has already been cut within the last latency threshold. Must be called with the
+        condition held.
+        :param now: monotonic time of the event
+        :param reason: description of the event, for logging
+        """
+        self.slow_start = False
+        if self.last_decrease is not None and now - self.last_decrease < self.latency_threshold:
+            return
+
+        self.last_decrease = now
+        self.decrease_count += 1
+        self.limit = max(self.limit * self.DECREASE_FACTOR, float(self.min_limit))
+        logger.debug(f"Concurrency limit decreased to {int(self.limit)} ({reason}).")
+
+    def log_statistics(self):
+        """
+        Log the final limit and the number of the adjustments.
+        """
+        logger.info(f"Concurrency: final limit {int(self.limit)}, peak limit {int(self.peak_limit)}, "
+                    f"{self.success_count} responses, {self.failure_count} failed requests, "
+                    f"{self.decrease_count} decreases.")
@@ -1,23 +1,45 @@
-from concurrent.futures import as_completed
+from concurrent.futures import wait, FIRST_COMPLETED
 
 import datetime
+import json
 import requests
 import concurrent.futures
 import threading
 import configparser
 import logging
 import os
+import re
+import socket
+import time
 from sqlalchemy import func
+from sqlalchemy.orm import sessionmaker
 
 from db.entities.application import ApplicationEntity
+from db.entities.backfill_window import BackfillWindowEntity
 
 from db.entities.executor import ExecutorEntity
+from db.entities.fetch_state import FetchStateEntity
 from db.entities.job import JobEntity
+from db.entities.sql_execution import SqlExecutionEntity
+from db.entities.sql_plan_node import SqlPlanNodeEntity
 from db.entities.stage import StageEntity
 from db.entities.stage_statistics import StageStatisticsEntity
 from db.entities.stage_executor import StageExecutorEntity
 from db.entities.task import TaskEntity
+from history_fetcher.application_rows import ApplicationRows
+from history_fetcher.bulk_writer import BulkWriter
+from history_fetcher.concurrency_controller import ConcurrencyController
+from history_fetcher.event_log_parser import parse_event_log
+from history_fetcher.event_log_reader import EventLogReader
+from history_fetcher.fetch_metrics import FetchMetrics, timed_call
+from history_fetcher.lease_manager import LeaseManager
+from history_fetcher.request_planner import RequestPlanner
+from history_fetcher.response_cache import ResponseCache
+from history_fetcher.retry_policy import RetryPolicy
+from history_fetcher.row_transformer import STAGE_EXECUTOR_COLUMNS, transform_stage_detail, transform_task_page
+from history_fetcher.task_sampler import TaskSampler
 from history_fetcher.utils import Utils
+from history_fetcher.watermarks import Watermarks
 
 # suppress InsecureRequestWarning while not verifying the certificates
 requests.packages.urllib3.disable_warnings(requests.packages.urllib3.exceptions.InsecureRequestWarning)
@@ -33,245 +55,1344 @@ class DataFetcher:
     """
     A class responsible for fetching data from Spark History Server (SHS) to a database
     """
-    def __init__(self, db_session, test_mode=False):
+    # quantiles of the task summaries (stage statistics)
+    QUANTILES = "0.001,0.25,0.5,0.75,0.999"
+    SOURCE_NAME_PATTERN = re.compile(r"[a-zA-Z0-9\-_]+")
+    STAGE_EXECUTOR_KEY_INDEX = STAGE_EXECUTOR_COLUMNS.index('executor_key')
+
+    def __init__(self, db_session, test_mode=False, replay=False, sharded=False, incremental=False, source=None):
         """
         Create DataFetcher object
         :param db_session: database session
         :param test_mode: True for fetching a constant number of applications metadata from SHS. If False, all the
         non-processed applications will be fetched
+        :param replay: True for reading all the responses from the response cache instead of SHS (no network access)
+        :param sharded: True for sharing the applications with the other workers through the leases in the database
+        :param incremental: True for fetching also the running applications, incrementally (see fetch_all_data)
+        :param source: name of the History Server source (see get_source_names) to fetch from, or None for the History
+        Server of the history_fetcher section
+        :raises ValueError: if the source is not configured
         """
-        self.config = configparser.ConfigParser()
-        self.config.read(os.path.join(os.path.dirname(__file__), 'config.ini'))
+        self.config = self.read_config()
+        self.source = source
+        if source is None:
+            self.cluster = self.config.get('history_fetcher', 'cluster', fallback="default")
+            self.app_id_prefix = ""
+        else:
+            self.use_source_config(source)
+            self.cluster = source
+            self.app_id_prefix = self.get_app_id_prefix(source, self.config)
         self.base_url = self.config['history_fetcher']['base_url']
         self.verify_certificates = self.config.getboolean('security', 'verify_certificates')
 
         self.db_session = db_session
         self.test_mode = test_mode
 
-        self.utils = Utils()
-        self.stage_job_mapping = {}
+        self.utils = Utils(self.base_url, self.app_id_prefix)
+
+        self.decode_processes = self.config.getint('history_fetcher', 'decode_processes', fallback=0)
+        if self.decode_processes > 0:
+            self.decode_pool = concurrent.futures.ProcessPoolExecutor(max_workers=self.decode_processes)
+            # the workers are forked, start them right away before any other thread of the process is started
+            self.decode_pool.submit(int).result()
+        else:
+            self.decode_pool = None
+
+        self.app_concurrency = self.config.getint('history_fetcher', 'app_concurrency', fallback=4)
+        self.app_pool = concurrent.futures.ThreadPoolExecutor(max_workers=self.app_concurrency)
+
+        self.replay = replay
+        self.record_responses = self.config.getboolean('response_cache', 'record_responses', fallback=False)
+        if self.replay or self.record_responses:
+            self.response_cache = ResponseCache(self.config.get('response_cache', 'cache_dir'))
+        else:
+            self.response_cache = None
+        if self.replay:
+            self.record_responses = False
+
+        threadpool_size = self.config.getint('history_fetcher', 'threadpool_size')
+        self.http_engine = self.config.get('history_fetcher', 'http_engine', fallback="threads")
+        if self.replay:
+            # the cached responses are read from the disk by the thread pool, the asyncio engine is not needed
+            self.http_engine = "threads"
+        if self.http_engine not in ["threads", "asyncio"]:
+            raise ValueError(f"Unsupported http_engine: {self.http_engine}")
+
+        # the number of the in-flight requests adapts to the SHS response, up to the size of the http engine
+        max_concurrency = threadpool_size if self.http_engine == "threads" \
+            else self.config.getint('history_fetcher', 'async_concurrency', fallback=100)
+        self.controller = ConcurrencyController(self.config.getint('history_fetcher', 'min_concurrency', fallback=1),
+                                                max_concurrency,
+                                                self.config.getfloat('history_fetcher', 'latency_threshold',
+                                                                     fallback=30.0))
+        self.retry_policy = RetryPolicy(self.config.getint('history_fetcher', 'max_retries', fallback=5),
+                                        self.config.getfloat('history_fetcher', 'retry_backoff', fallback=0.5),
+                                        self.config.getfloat('history_fetcher', 'retry_max_backoff', fallback=30.0))
+        self.request_timeout = self.config.getfloat('history_fetcher', 'request_timeout', fallback=60.0)
+        self.fetch_sql = self.config.getboolean('history_fetcher', 'fetch_sql', fallback=True)
+        self.missing_urls = {}  # dict[app_id, List[url]], the urls which could not be fetched even after the retries
+        self.missing_urls_lock = threading.Lock()
+        self.metrics = FetchMetrics(self.source)
+        self.pruned_stage_count = 0  # stages whose requests were avoided by the RequestPlanner
+        self.avoided_request_count = 0  # requests of the pruned stages
+        self.pruned_stage_count_lock = threading.Lock()
+
+        if self.http_engine == "asyncio":
+            # aiohttp is only required when the asyncio engine is used
+            from history_fetcher.async_engine import AsyncHttpEngine
+            self.thread_pool = None
+            self.async_engine = AsyncHttpEngine(self.controller, self.retry_policy, self.request_timeout,
+                                                self.verify_certificates, on_missing=self.add_missing_url,
+                                                metrics=self.metrics)
+        else:
+            self.thread_pool = concurrent.futures.ThreadPoolExecutor(max_workers=threadpool_size)
+            self.async_engine = None
+        self.max_in_flight_requests = self.config.getint('history_fetcher', 'max_in_flight_requests',
+                                                         fallback=2 * threadpool_size)
+        self.max_buffered_bytes = self.config.getint('history_fetcher', 'max_buffered_mb', fallback=256) << 20
+        self.buffered_bytes = 0
+        self.buffered_bytes_lock = threading.Lock()
+
+        self.write_batch_size = self.config.getint('history_fetcher', 'write_batch_size', fallback=5000)
+        write_mode = self.config.get('history_fetcher', 'write_mode', fallback="insert")
+        if write_mode not in ["insert", "upsert"]:
+            raise ValueError(f"Unsupported write_mode: {write_mode}")
+        # the running applications are written repeatedly, by upserts
+        self.incremental = incremental
+        self.upsert = write_mode == "upsert" or incremental
+
+        # the fetched applications are written by the writer threads, each with its own database connection, while the
+        # next applications are being fetched. At most write_queue_size applications wait for (or are in) writing, no
+        # more applications are started while the queue is full.
+        writer_threads = max(self.config.getint('history_fetcher', 'writer_threads', fallback=1), 1)
+        self.write_queue_size = max(self.config.getint('history_fetcher', 'write_queue_size',
+                                                       fallback=self.app_concurrency), 1)
+        self.write_pool = concurrent.futures.ThreadPoolExecutor(max_workers=writer_threads,
+                                                                thread_name_prefix="writer")
+        # the task records of an application exceeding max_buffered_tasks are streamed to its writer thread page by
+        # page while the application is being fetched, instead of being held until the whole application is fetched
+        self.max_buffered_tasks = max(self.config.getint('history_fetcher', 'max_buffered_tasks', fallback=100000), 0)
+        self.write_session_factory = sessionmaker(bind=db_session.get_bind())
+        self.write_sessions = []  # list[(Session, BulkWriter)], one per writer thread
+        self.write_sessions_lock = threading.Lock()
+
+        # the newest endTime of the stored applications, kept in memory between the runs of the daemon mode
+        self.max_end_time = None
+        self.max_end_time_lock = threading.Lock()
+        self.stop_event = threading.Event()
+
+        if sharded:
+            self.worker_id = self.config.get('sharding', 'worker_id', fallback=f"{socket.gethostname()}-{os.getpid()}")
+            self.lease_manager = LeaseManager(db_session, self.worker_id,
+                                              self.config.getfloat('sharding', 'lease_duration', fallback=300.0),
+                                              self.config.getfloat('sharding', 'heartbeat_interval', fallback=60.0),
+                                              self.cluster)
+        else:
+            self.worker_id = None
+            self.lease_manager = None
+
+    @staticmethod
+    def read_config():
+        """
+        Read the configuration of History Fetcher.
+        :return: ConfigParser
+        """
+        config = configparser.ConfigParser()
+        config.read(os.path.join(os.path.dirname(__file__), 'config.ini'))
+        return config
+
+    @staticmethod
+    def get_source_names(config=None):
+        """
+        Get the names of the History Server sources, fetched concurrently into the same database. Each source is
+        configured by its own [source:<name>] section.
+        :param config: ConfigParser, the configuration of History Fetcher by default
+        :return: list of the source names, empty if only the History Server of the history_fetcher section is fetched
+        """
+        config = config or DataFetcher.read_config()
+        sources = config.get('history_fetcher', 'sources', fallback="")
+        return [source.strip() for source in sources.split(",") if source.strip()]
+
+    @staticmethod
+    def get_app_id_prefix(source, config=None):
+        """
+        Get the prefix of the application_id's of a History Server source. The applications of several History Servers
+        may share the same id, so they are prefixed by the name of the source, unless configured otherwise by its
+        app_id_prefix (e.g. empty for the applications stored before the sources were configured).
+        :param source: name of the source
+        :param config: ConfigParser, the configuration of History Fetcher by default
+        :return: prefix of the application_id's, e.g. "prod-"
+        """
+        config = config or DataFetcher.read_config()
+        return config.get(f"source:{source}", 'app_id_prefix', fallback=f"{source}-")
+
+    @staticmethod
+    def get_app_id_source(app_id, config=None):
+        """
+        Get the History Server source of an application_id: the source with the longest app_id_prefix the application_id
+        starts with, so that each application_id belongs to a single source, even if the prefix of a source is empty or
+        is a prefix of the prefix of another source (e.g. "a-" and "a-b-").
+        :param app_id: application_id (namespaced by the source)
+        :param config: ConfigParser, the configuration of History Fetcher by default
+        :raises ValueError: if the application_id matches no source, or several sources with the same prefix
+        :return: name of the source, or None if no sources are configured (the History Server of the history_fetcher
+        section)
+        """
+        config = config or DataFetcher.read_config()
+        sources = DataFetcher.get_source_names(config)
+        if not sources:
+            return None
+
+        prefixes = {source: DataFetcher.get_app_id_prefix(source, config) for source in sources}
+        matching = [source for source, prefix in prefixes.items() if app_id.startswith(prefix)]
+        if not matching:
+            raise ValueError(f"Application {app_id} does not belong to any of the sources {sources}")
+        longest = max(len(prefixes[source]) for source in matching)
+        matching = [source for source in matching if len(prefixes[source]) == longest]
+        if len(matching) > 1:
+            raise ValueError(f"Application {app_id} matches the same app_id_prefix of the sources {matching}")
+        return matching[0]
+
+    def use_source_config(self, source):
+        """
+        Apply the configuration of a History Server source: the options of its [source:<name>] section (e.g. base_url,
+        app_concurrency, threadpool_size) override those of the history_fetcher section, and verify_certificates
+        overrides that of the security section.
+        :param source: name of the source
+        :raises ValueError: if the source is not configured or its name is not valid
+        """
+        section = f"source:{source}"
+        if not self.SOURCE_NAME_PATTERN.fullmatch(source):
+            raise ValueError(f"Invalid source name: {source} (only letters, numbers, _ or - allowed)")
+        if not self.config.has_section(section):
+            raise ValueError(f"Source {source} is not configured, [{section}] section missing")
+        for option in self.config.options(section):
+            target = 'security' if option == 'verify_certificates' else 'history_fetcher'
+            self.config.set(target, option, self.config.get(section, option, raw=True))
+
+    def get_app_id(self, source_app_id):
+        """
+        Get the application_id stored in the database (namespaced by the source) of an application of SHS.
+        :param source_app_id: application id in SHS
+        :return: application_id
+        """
+        return f"{self.app_id_prefix}{source_app_id}"
+
+    def get_app_url(self, app_id):
+        """
+        Get the URL of an application in SHS.
+        :param app_id: application_id (namespaced by the source)
+        :return: URL of the application, e.g. https://history.server:port/api/v1/applications/<application id in SHS>
+        """
+        return f"{self.base_url}/{app_id[len(self.app_id_prefix):]}"
+
+    def add_source(self, app):
+        """
+        Namespace the application data of SHS by the source: replace the id by the application_id and add the
+        cluster.
+        :param app: application data (json), as returned by the applications endpoint
+        :return: the same application data
+        """
+        app['id'] = self.get_app_id(app['id'])
+        app['cluster'] = self.cluster
+        return app
+
+    def fetch_all_data(self, resume=False, retry_failed=False):
+        """
+        Fetch all the levels of data (Applications, Executors, SQL Executions, Jobs, Stages, Stage Statistics, Tasks)
+        from the SHS and store them in the database. Each application is fetched and committed as a separate unit, and
+        its progress is recorded in the fetch_state table. An application which cannot be fetched is rolled back and
+        quarantined (recorded as failed together with the error), without affecting the other applications.
+
+        Up to app_concurrency applications are fetched at the same time, each of them going through its own chain of
+        requests (environment, executors, SQL executions and jobs -> stages -> per-stage endpoints), so that a single
+        large application does not hold up the others. The fetched records are written into the database by the writer
+        threads (writer_threads, each with its own database connection) in the order in which the applications are
+        finished, while the next applications are being fetched. If write_queue_size fetched applications are waiting
+        for the writing, no more applications are started until the writers catch up. An application holding more than
+        max_buffered_tasks task records starts its writing while it is still being fetched, and its records are then
+        streamed to the writer page by page (see stream_application_rows).
+
+        After stop() is called, no more applications are started, the applications in progress are finished and the
+        rest stays pending in the fetch_state table (to be fetched with resume).
+
+        In the sharded mode, the new applications are only registered as pending, and the applications are then claimed
+        one by one from the fetch_state table (see LeaseManager), together with the other workers. The pending
+        applications and the applications whose lease expired are always claimed, regardless of resume.
+
+        In the incremental mode, the running applications are fetched as well. Each poll of a running application
+        fetches only the jobs and stages which are new or changed since its previous poll (see Watermarks), and the
+        stage details only of the stages which finished since. Once the application completes, it is finalized by a
+        last incremental poll, without being downloaded again.
+        :param resume: True for fetching also the applications left unfinished by the previous runs
+        :param retry_failed: True for fetching again the applications which failed in the previous runs
+        :return: list of the fetched application_id's
+        """
+        watermarks = None
+        if self.lease_manager is not None:
+            if retry_failed:
+                self.lease_manager.reset_failed()
+            self.get_new_applications()
+            apps = iter(self.lease_manager.claim_application, None)
+        else:
+            app_data = []
+            if resume:
+                app_data += self.get_applications_by_fetch_state([FetchStateEntity.PENDING,
+                                                                  FetchStateEntity.IN_PROGRESS])
+            if retry_failed:
+                app_data += self.get_applications_by_fetch_state([FetchStateEntity.FAILED])
+            app_data += self.get_new_applications()
+            if self.incremental:
+                running_app_data, watermarks = self.get_running_applications()
+                app_data += running_app_data
+            apps = iter(app_data)
+
+        return self.fetch_applications_data(apps, watermarks=watermarks)
+
+    def refetch_applications(self, app_ids=None, min_end_date=None, max_end_date=None):
+        """
+        Fetch again the given applications, or the applications which ended in the given time range, regardless of
+        whether they have been fetched before. The records are written by upserts (see BulkWriter), so the
+        applications which are already stored are updated in place, without truncating the database.
+        :param app_ids: list of application_id's (those of the other sources are skipped, see get_app_id_source), or
+        None for selecting the applications by the time range
+        :param min_end_date: only the applications which ended at this time or later (format 2020-01-01T01:01:01.123GMT
+        or 2020-01-01)
+        :param max_end_date: only the applications which ended at this time or earlier (same format)
+        :return: list of the fetched application_id's
+        """
+        if app_ids is not None:
+            app_data = []
+            # the applications of the other sources are refetched by their own DataFetchers
+            for app_id in [app_id for app_id in app_ids if self.get_app_id_source(app_id, self.config) == self.source]:
+                app = self.get_json(self.get_app_url(app_id))
+                if app is None:
+                    logger.warning(f"Application {app_id} not found.")
+                else:
+                    app_data.append(self.add_source(app))
+        else:
+            app_data = self.get_application_list(min_end_date=min_end_date, max_end_date=max_end_date)
+        logger.info(f"Refetching {len(app_data)} applications.")
+
+        upsert = self.upsert
+        self.upsert = True
+        try:
+            return self.fetch_applications_data(iter(app_data))
+        finally:
+            self.upsert = upsert
+
+    def fetch_backfill(self, start, end, retry_failed=False):
+        """
+        Fetch the applications which ended between start and end (e.g. the initial load), split into time windows of
+        window_hours. Each window lists only its own applications (minEndDate, maxEndDate), and the next window is
+        listed only after all the applications of the previous one have been started, so the memory does not depend on
+        the length of the backfill, while the applications of the consecutive windows are still fetched concurrently.
+
+        The progress is persisted in the backfill_window table: a window is completed once all its applications have
+        been stored or quarantined. Running the same backfill again skips the completed windows, and the applications
+        already stored by the previous runs.
+        :param start: start of the backfill (datetime, GMT)
+        :param end: end of the backfill (datetime, GMT)
+        :param retry_failed: True for fetching again the applications of the backfill which failed in the previous runs
+        :return: list of the fetched application_id's
+        """
+        window_size = datetime.timedelta(hours=self.config.getfloat('backfill', 'window_hours', fallback=24.0))
+        windows = self.get_backfill_windows(start, end, window_size)
+        pending_windows = [window for window in windows if window.status != BackfillWindowEntity.COMPLETED]
+        logger.info(f"Backfill {start} - {end}: {len(pending_windows)} of {len(windows)} windows to fetch.")
+
+        unfinished = {}  # dict[window_start, number of the applications not finished yet]
+        failed = {}  # dict[window_start, number of the failed applications]
+        known = {}  # dict[window_start, number of the applications fetched by the previous runs]
+        app_windows = {}  # dict[app_id, BackfillWindowEntity]
+
+        def get_window_applications():
+            for window in pending_windows:
+                app_data = self.get_application_list(
+                    min_end_date=self.format_time(window.window_start),
+                    max_end_date=self.format_time(window.window_end - datetime.timedelta(milliseconds=1)))
+                statuses = [FetchStateEntity.COMPLETED] + ([] if retry_failed else [FetchStateEntity.FAILED])
+                app_ids = [app['id'] for app in app_data]
+                # the applications stored (or quarantined) by the previous runs
+                known_states = dict(self.db_session.query(FetchStateEntity.app_id, FetchStateEntity.status)
+                                                   .filter(FetchStateEntity.app_id.in_(app_ids))
+                                                   .filter(FetchStateEntity.status.in_(statuses)))
+                app_data = [app for app in app_data if app['id'] not in known_states and app['id'] not in app_windows]
+                logger.info(f"Backfill window {window.window_start} - {window.window_end}: {len(app_data)} "
+                            f"applications to fetch ({len(known_states)} fetched before).")
+                known_failed = sum(1 for status in known_states.values() if status == FetchStateEntity.FAILED)
+                if not app_data:
+                    self.complete_backfill_window(window, len(known_states), known_failed)
+                    continue
+
+                for app in app_data:
+                    self.update_fetch_state(app, FetchStateEntity.PENDING)
+                    app_windows[app['id']] = window
+                self.db_session.commit()
+                unfinished[window.window_start] = len(app_data)
+                failed[window.window_start] = known_failed
+                known[window.window_start] = len(known_states)
+                yield from app_data
+
+        def on_finished(app_id, stored):
+            window = app_windows[app_id]
+            unfinished[window.window_start] -= 1
+            failed[window.window_start] += 0 if stored else 1
+            if unfinished[window.window_start] == 0:
+                app_count = known[window.window_start] + sum(1 for window_of_app in app_windows.values()
+                                                             if window_of_app is window)
+                self.complete_backfill_window(window, app_count, failed[window.window_start])
+
+        return self.fetch_applications_data(get_window_applications(), on_finished)
+
+    def get_backfill_windows(self, start, end, window_size):
+        """
+        Split the backfill into the time windows, and register the windows which are not known from the previous runs.
+        :param start: start of the backfill (datetime)
+        :param end: end of the backfill (datetime)
+        :param window_size: length of a window (timedelta)
+        :return: list of BackfillWindowEntity objects, oldest first
+        """
+        windows = []
+        window_start = start
+        while window_start < end:
+            window_end = min(window_start + window_size, end)
+            window = self.db_session.query(BackfillWindowEntity).get((self.cluster, window_start, window_end))
+            if window is None:
+                window = BackfillWindowEntity(BackfillWindowEntity.get_attributes(self.cluster, window_start,
+                                                                                  window_end,
+                                                                                  BackfillWindowEntity.PENDING))
+                self.db_session.add(window)
+            windows.append(window)
+            window_start = window_end
+        self.db_session.commit()
+        return windows
+
+    def complete_backfill_window(self, window, app_count, failed_count):
+        """
+        Mark a backfill window as completed.
+        :param window: BackfillWindowEntity object
+        :param app_count: number of the applications of the window (including those fetched by the previous runs)
+        :param failed_count: number of the applications of the window which failed
+        """
+        window.status = BackfillWindowEntity.COMPLETED
+        window.app_count = app_count
+        window.failed_count = failed_count
+        self.db_session.commit()
+        logger.info(f"Backfill window {window.window_start} - {window.window_end} completed: {app_count} applications "
+                    f"({failed_count} failed).")
 
-    def fetch_all_data(self):
+    def fetch_applications_data(self, apps, on_finished=None, watermarks=None):
         """
-        Fetch all the levels of data (Applications, Executors, Jobs, Stages, Stage Statistics, Tasks) from the SHS and
-        store them in the database
+        Fetch all the levels of data of the applications and store them in the database, up to app_concurrency
+        applications at the same time (see fetch_all_data).
+        :param apps: iterator of application data (json)
+        :param on_finished: optional function called with the application_id and the result of write_application_data
+        after each application is written
+        :param watermarks: optional dict {app_id: Watermarks} of the applications fetched incrementally
         :return: list of the fetched application_id's
         """
-        app_ids = self.fetch_applications()
-        self.fetch_executors(app_ids)
-        self.fetch_jobs(app_ids)
-        app_stage_mapping = self.fetch_stages(app_ids)
-        self.fetch_stage_executors(app_stage_mapping)
-        self.fetch_stage_statistics(app_stage_mapping)
-        self.fetch_tasks(app_stage_mapping)
+        watermarks = watermarks or {}
+        app_ids = []
+        failed_app_ids = []
+        in_progress = {}  # dict[future, ApplicationRows], being fetched
+        writing = {}  # dict[future, ApplicationRows], waiting for the writing or being written
+        all_submitted = False
+
+        while True:
+            while not all_submitted and len(in_progress) < self.app_concurrency \
+                    and len(writing) < self.write_queue_size and not self.stop_event.is_set():
+                app = next(apps, None)
+                if app is None:
+                    all_submitted = True
+                    break
+                app_rows = ApplicationRows(app)
+                app_rows.watermarks = watermarks.get(app_rows.app_id)
+                # the claimed applications are already in progress, the running applications stay running
+                if self.lease_manager is None and not app_rows.is_incremental():
+                    self.update_fetch_state(app, FetchStateEntity.IN_PROGRESS)
+                    self.db_session.commit()
+                in_progress[self.app_pool.submit(self.fetch_application_rows, app_rows)] = app_rows
+
+            if not in_progress and not writing:
+                break
+
+            done, _ = wait(list(in_progress) + list(writing), return_when=FIRST_COMPLETED)
+            for future in done:
+                if future in in_progress:
+                    app_rows = in_progress.pop(future)
+                    if app_rows.is_streamed():
+                        # the writing has already started, the fetch exception is passed through the stream
+                        writing[app_rows.write_future] = app_rows
+                    else:
+                        writing[self.write_pool.submit(self.write_application_data, app_rows,
+                                                       future.exception())] = app_rows
+                    continue
+                app_rows = writing.pop(future)
+                stored = future.result()
+                if stored:
+                    app_ids.append(app_rows.app_id)
+                elif stored is not None:
+                    failed_app_ids.append(app_rows.app_id)
+                if on_finished is not None:
+                    on_finished(app_rows.app_id, stored)
+
+        if failed_app_ids:
+            logger.warning(f"{len(failed_app_ids)} applications failed and were quarantined: {failed_app_ids}")
+        if self.is_stopped() and not all_submitted:
+            logger.info("Stopped, the remaining applications are left pending.")
+        logger.info(f"Request planner: avoided {self.avoided_request_count} requests of {self.pruned_stage_count} "
+                    f"stages which ran no tasks.")
+        BulkWriter.log_statistics(self.get_write_statistics())
+        if not self.replay:
+            self.controller.log_statistics()
+        self.report_metrics()
 
         return app_ids
 
-    def fetch_applications(self):
+    def fetch_event_logs(self, event_log_dir, resume=False, retry_failed=False):
         """
-        Fetch the applications data from SHS and store them in the database
-        :return: list of application id's
+        Read the applications from the Spark event logs found in a directory (instead of SHS) and store them in the
+        database. The event logs are parsed in a pool of processes, one event log per worker, and the records are
+        written by the writer threads in the order in which the event logs are finished. Each application is committed
+        and recorded in the fetch_state table the same way as in fetch_all_data.
+        :param event_log_dir: directory containing the event logs
+        :param resume: True for reading also the applications left unfinished by the previous runs
+        :param retry_failed: True for reading again the applications which failed in the previous runs
+        :return: list of the stored application_id's
+        """
+        statuses = [FetchStateEntity.COMPLETED]
+        statuses += [] if resume else [FetchStateEntity.PENDING, FetchStateEntity.IN_PROGRESS]
+        statuses += [] if retry_failed else [FetchStateEntity.FAILED]
+        known_app_ids = {state.app_id for state in self.db_session.query(FetchStateEntity.app_id)
+                                                                  .filter(FetchStateEntity.status.in_(statuses))}
+
+        readers = EventLogReader.find_event_logs(event_log_dir)
+        new_readers = [reader for reader in readers if reader.app_id not in known_app_ids]
+        if self.test_mode:
+            new_readers = new_readers[-self.config.getint('testing', 'apps_number'):]
+        logger.info(f"{len(new_readers)} new event logs found in {event_log_dir} "
+                    f"({len(readers) - len(new_readers)} skipped).")
+
+        task_limit = self.config.getint('history_fetcher', 'task_limit', fallback=2147483647)
+        task_sampling = self.get_task_sampling()
+        processes = self.config.getint('event_logs', 'processes', fallback=os.cpu_count())
+        app_ids = []
+        failed_app_ids = []
+        new_readers = iter(new_readers)
+        in_progress = {}  # dict[future, EventLogReader], being parsed
+        writing = {}  # dict[future, ApplicationRows], waiting for the writing or being written
+        all_submitted = False
+
+        with concurrent.futures.ProcessPoolExecutor(max_workers=processes) as process_pool:
+            while True:
+                # a couple of event logs per process are queued, the parsed ones are waiting in memory to be written
+                while not all_submitted and len(in_progress) < 2 * processes and len(writing) < self.write_queue_size:
+                    reader = next(new_readers, None)
+                    if reader is None:
+                        all_submitted = True
+                        break
+                    future = process_pool.submit(parse_event_log, reader.path, task_limit, task_sampling)
+                    in_progress[future] = reader
+
+                if not in_progress and not writing:
+                    break
+
+                done, _ = wait(list(in_progress) + list(writing), return_when=FIRST_COMPLETED)
+                for future in done:
+                    if future in writing:
+                        app_rows = writing.pop(future)
+                        if future.result():
+                            app_ids.append(app_rows.app_id)
+                        else:
+                            failed_app_ids.append(app_rows.app_id)
+                        continue
+                    reader = in_progress.pop(future)
+                    if future.exception() is None:
+                        app_rows = future.result()
+                    else:
+                        # the application is not known, it is quarantined under the id from the event log name
+                        app_rows = ApplicationRows({'id': reader.app_id, 'attempts': [{'endTime': None}]})
+                        app_rows.level = "event_log"
+                    writing[self.write_pool.submit(self.write_application_data, app_rows, future.exception())] = \
+                        app_rows
+
+        if failed_app_ids:
+            logger.warning(f"{len(failed_app_ids)} applications failed and were quarantined: {failed_app_ids}")
+        BulkWriter.log_statistics(self.get_write_statistics())
+        self.report_metrics()
+
+        return app_ids
+
+    def fetch_application_rows(self, app_rows):
+        """
+        Fetch all the levels of data of a single application from SHS (without writing them into the database), or
+        only the data changed since the previous poll if the application is fetched incrementally. Executed in the
+        application thread pool. If the records are streamed to the writer thread, the stream is ended once the
+        application is fetched (or failed).
+        :param app_rows: ApplicationRows object to be filled with the records of the application
+        :return: the filled ApplicationRows object
+        """
+        try:
+            self.fetch_application_levels(app_rows)
+        except Exception as ex:
+            if app_rows.is_streamed():
+                app_rows.end_stream(ex)
+            raise
+        if app_rows.is_streamed():
+            app_rows.end_stream()
+        return app_rows
+
+    def fetch_application_levels(self, app_rows):
+        """
+        Fetch all the levels of data of a single application (see fetch_application_rows).
+        :param app_rows: ApplicationRows object to be filled with the records of the application
+        """
+        app_ids = [app_rows.app_id]
+        # the application record of a running application is stored by its first poll
+        if not app_rows.is_incremental() or app_rows.watermarks.is_first_poll():
+            app_rows.level = "applications"
+            self.fetch_applications([app_rows.app], app_rows)
+        app_rows.level = "executors"
+        self.fetch_executors(app_ids, app_rows)
+        app_rows.level = "sql"
+        job_sql_mapping = self.fetch_sql_executions(app_ids, app_rows) if self.fetch_sql else {}
+        app_rows.level = "jobs"
+        stage_job_mapping = self.fetch_jobs(app_ids, app_rows, app_rows.watermarks, job_sql_mapping)
+        app_rows.level = "stages"
+        planner = self.fetch_stages(app_ids, stage_job_mapping, app_rows, app_rows.watermarks)
+        app_rows.level = "stage_details"
+        statistics_stages, task_stages = self.fetch_stage_details(planner, app_rows)
+        # the pruned stages would have needed the same fallback requests as the planned ones
+        planner.set_fallbacks(bool(statistics_stages), bool(task_stages))
+        planner.log_statistics()
+        self.add_pruned_stages(planner.get_pruned_count(), planner.get_avoided_request_count())
+        # the fallback for SHS versions not including the task summaries or the tasks in the stage detail
+        app_rows.level = "stage_statistics"
+        self.fetch_stage_statistics(planner.get_stages(statistics_stages), app_rows)
+        app_rows.level = "tasks"
+        self.fetch_tasks(planner.get_stages(task_stages), planner, app_rows)
+
+    def stream_application_rows(self, rows):
+        """
+        Hand the buffered records of an application over to its writer thread, once the application holds more than
+        max_buffered_tasks task records. The writing of the application is started by the first hand-over, the next
+        ones follow each stage detail or page of tasks, so that the memory held by the application stays bounded.
+        Called from the thread fetching the application.
+        :param rows: object collecting the records (BulkWriter or ApplicationRows)
+        """
+        if not isinstance(rows, ApplicationRows):
+            return
+        if not rows.is_streamed():
+            if rows.task_count <= self.max_buffered_tasks:
+                return
+            logger.debug(f"Application {rows.app_id} holds {rows.task_count} task records, streaming them to the "
+                         f"writer.")
+            rows.start_stream(max_chunks=2)
+            rows.write_future = self.write_pool.submit(self.write_application_data, rows)
+        rows.hand_over()
+
+    def get_write_session(self):
+        """
+        Get the database session and the BulkWriter of the current writer thread, created on the first use. Each
+        writer thread writes its applications within its own connection.
+        :return: tuple (Session, BulkWriter)
+        """
+        if not hasattr(thread_local, "write_session"):
+            thread_local.write_session = self.write_session_factory()
+            thread_local.bulk_writer = BulkWriter(thread_local.write_session, self.write_batch_size)
+            with self.write_sessions_lock:
+                self.write_sessions.append((thread_local.write_session, thread_local.bulk_writer))
+        # the write mode may be switched between the runs (see refetch_applications)
+        thread_local.bulk_writer.upsert = self.upsert
+        return thread_local.write_session, thread_local.bulk_writer
+
+    def get_write_statistics(self):
+        """
+        Get number of the written rows and the write time per table, summed up over the writer threads.
+        :return: dict {table name: (rows written, write time in seconds)}
+        """
+        with self.write_sessions_lock:
+            writers = [writer for _, writer in self.write_sessions]
+        return BulkWriter.merge_statistics(writers)
+
+    def write_application_data(self, app_rows, fetch_exception=None):
+        """
+        Write the fetched records of a single application into the database and commit them. If the fetching or the
+        writing failed, or if some of its responses could not be fetched even after the retries, the application is
+        rolled back and marked as failed in the fetch_state table. Executed in the writer thread pool, using the
+        database session of the writer thread.
+        A streamed application (see stream_application_rows) is written chunk by chunk while it is being fetched, within
+        a single transaction.
+        :param app_rows: ApplicationRows object with the records of the application
+        :param fetch_exception: exception raised while fetching the application, or None (passed through the stream for
+        a streamed application)
+        :return: True if the application was stored successfully, False if it failed, None if it was skipped (its
+        lease was lost to another worker in the sharded mode, or the poll of a running application failed and is
+        repeated by the next poll)
+        """
+        db_session, writer = self.get_write_session()
+        app_id = app_rows.app_id
+        # the lease is checked (and locked) within the same transaction as the records are written in
+        if self.lease_manager is not None and not self.lease_manager.holds_lease(app_id, db_session):
+            logger.warning(f"Lease of application {app_id} lost to another worker, the application is skipped.")
+            db_session.rollback()
+            app_rows.discard_stream()
+            self.pop_missing_urls(app_id)
+            return None
+        try:
+            if app_rows.is_streamed():
+                for rows, tuples in app_rows.get_chunks():
+                    self.add_application_rows(app_rows, rows, tuples, writer)
+                fetch_exception = app_rows.fetch_exception
+            if fetch_exception is not None:
+                raise fetch_exception
+            # an incomplete application must not be stored as completed
+            missing_urls = self.pop_missing_urls(app_id)
+            if missing_urls:
+                raise IOError(f"{len(missing_urls)} responses missing after {self.retry_policy.max_retries} retries: "
+                              f"{', '.join(missing_urls)}")
+
+            self.add_application_rows(app_rows, *app_rows.take(), writer)
+            if app_rows.is_incremental() and not app_rows.watermarks.is_first_poll():
+                # the application record was stored by a previous poll, only the summary has changed
+                self.update_application_summary(app_rows.app, db_session)
+            writer.flush()
+
+            if app_rows.is_incremental() and app_rows.is_running():
+                self.update_fetch_state(app_rows.app, FetchStateEntity.RUNNING, level=app_rows.level,
+                                        watermarks=app_rows.watermarks.get_attributes(), db_session=db_session)
+                db_session.commit()
+                logger.info(f"Polled running application {app_id}.")
+                return True
+
+            self.update_fetch_state(app_rows.app, FetchStateEntity.COMPLETED, level=app_rows.level,
+                                    db_session=db_session)
+            db_session.commit()
+            self.update_max_end_time(app_rows.app)
+            logger.info(f"Fetched application {app_id}.")
+            return True
+        except Exception as ex:
+            logger.exception(f"Could not fetch application {app_id} (level {app_rows.level}): {ex}")
+            db_session.rollback()
+            writer.clear()
+            app_rows.discard_stream()
+            self.pop_missing_urls(app_id)
+            if app_rows.is_incremental() and app_rows.is_running():
+                # the next poll starts from the same watermarks
+                self.update_fetch_state(app_rows.app, FetchStateEntity.RUNNING, level=app_rows.level, error=str(ex),
+                                        watermarks=app_rows.watermarks.get_attributes(next_poll=False),
+                                        db_session=db_session)
+                db_session.commit()
+                return None
+            if self.lease_manager is None or self.lease_manager.holds_lease(app_id, db_session):
+                self.update_fetch_state(app_rows.app, FetchStateEntity.FAILED, level=app_rows.level, error=str(ex),
+                                        db_session=db_session)
+            db_session.commit()
+            return False
+
+    @staticmethod
+    def update_application_summary(app, db_session):
+        """
+        Update the application record by the application summary (e.g. when a running application completes).
+        :param app: application data (json), as returned by the applications endpoint
+        :param db_session: database session of the writer thread
+        """
+        db_session.query(ApplicationEntity) \
+                  .filter(ApplicationEntity.app_id == app['id']) \
+                  .update({ApplicationEntity.end_time: app['attempts'][0]['endTime'],
+                           ApplicationEntity.duration: app['attempts'][0]['duration'],
+                           ApplicationEntity.completed: app['attempts'][0]['completed']},
+                          synchronize_session=False)
+
+    def add_application_rows(self, app_rows, rows, tuples, writer):
+        """
+        Pass the records of an application (all of them, or a chunk of a streamed application) to the writer, the
+        parent records first.
+        :param app_rows: ApplicationRows object of the application
+        :param rows: dict {entity: list of the attribute dictionaries}
+        :param tuples: dict {entity: list of the row tuples}
+        :param writer: BulkWriter of the writer thread
+        """
+        for entity in [ApplicationEntity, ExecutorEntity, SqlExecutionEntity, SqlPlanNodeEntity, JobEntity,
+                       StageEntity]:
+            for attributes in rows.get(entity, []):
+                writer.add(entity, attributes)
+        self.add_missing_executors(app_rows, tuples.get(StageExecutorEntity, []), writer)
+        for entity in [StageExecutorEntity, StageStatisticsEntity, TaskEntity]:
+            for attributes in rows.get(entity, []):
+                writer.add(entity, attributes)
+            writer.add_tuples(entity, tuples.get(entity, []))
+
+    def add_missing_executors(self, app_rows, stage_executors, writer):
+        """
+        In some rare cases, in History Server, a Stage might contain an Executor which is not in the executors
+        endpoint. If so, add the key to the Executor table to avoid DB Integrity Violation. The executors are looked up
+        in the executor key index of the application, without querying the database.
+        :param app_rows: ApplicationRows object of the application
+        :param stage_executors: list of the row tuples of the stage_executors
+        :param writer: BulkWriter of the writer thread
+        """
+        for stage_executor in stage_executors:
+            executor_key = stage_executor[self.STAGE_EXECUTOR_KEY_INDEX]
+            if executor_key not in app_rows.executor_keys:
+                app_rows.executor_keys.add(executor_key)
+                writer.add(ExecutorEntity, {"executor_key": executor_key, "app_id": app_rows.app_id})
+
+    def get_new_applications(self):
+        """
+        Get the list of the applications which have not been processed yet from SHS and register them as pending in
+        the fetch_state table. The applications already known from the previous runs are skipped (except for the test
+        mode), use resume or retry_failed for fetching them again.
+        :return: list of application data (json)
         """
         if self.test_mode:
             limit = self.config.getint('testing', 'apps_number')
             logger.info(f"Test mode active. Fetching {limit} applications.")
-            app_data = self.get_json(f"{self.base_url}?status=completed&limit={limit}")
+            app_data = self.get_application_list(limit=limit)
         else:
             time_filter = self.get_time_filter()
-            app_data = self.get_json(f"{self.base_url}?status=completed&minEndDate={time_filter}")
-            logger.info(f"Time filter: >= {time_filter}. {len(app_data)} new application records found.")
+            app_data = self.get_application_list(min_end_date=time_filter)
+
+            app_ids = [app['id'] for app in app_data]
+            known_app_ids = {state.app_id for state in self.db_session.query(FetchStateEntity.app_id)
+                                                                      .filter(FetchStateEntity.app_id.in_(app_ids))}
+            app_data = [app for app in app_data if app['id'] not in known_app_ids]
+            logger.info(f"Time filter: >= {time_filter}. {len(app_data)} new application records found "
+                        f"({len(known_app_ids)} known from the previous runs skipped).")
+
+        if self.lease_manager is not None:
+            registered = self.lease_manager.register_applications(app_data)
+            logger.info(f"{registered} applications registered ({len(app_data) - registered} registered by the other "
+                        f"workers).")
+            return app_data
+
+        for app in app_data:
+            self.update_fetch_state(app, FetchStateEntity.PENDING)
+        self.db_session.commit()
+        return app_data
+
+    def get_running_applications(self):
+        """
+        Get the applications to be fetched incrementally: the running applications, and the applications tracked by
+        the previous polls which are not running anymore (to be finalized). The tracked applications which disappeared
+        from SHS are marked as failed.
+        :return: tuple (list of application data (json), dict {app_id: Watermarks})
+        """
+        tracked = {state.app_id: state for state in self.db_session.query(FetchStateEntity)
+                                                                   .filter(FetchStateEntity.cluster == self.cluster)
+                                                                   .filter(FetchStateEntity.status ==
+                                                                           FetchStateEntity.RUNNING)}
+        app_data = [self.add_source(app) for app in self.get_json(f"{self.base_url}?status=running") or []]
+        # a running application may be known only if it has been tracked (or in progress) before
+        known_app_ids = {state.app_id for state in self.db_session.query(FetchStateEntity.app_id)
+                                                                  .filter(FetchStateEntity.app_id.in_(
+                                                                      [app['id'] for app in app_data]))
+                                                                  .filter(FetchStateEntity.status !=
+                                                                          FetchStateEntity.RUNNING)}
+        app_data = [app for app in app_data if app['id'] not in known_app_ids]
+        running_count = len(app_data)
+
+        watermarks = {}
+        for app in app_data:
+            state = tracked.pop(app['id'], None)
+            watermarks[app['id']] = Watermarks() if state is None else \
+                Watermarks(state.job_watermark, state.stage_watermark, state.completion_watermark)
+
+        for app_id, state in tracked.items():
+            app = self.get_json(self.get_app_url(app_id))
+            if app is None:
+                if not self.pop_missing_urls(app_id):
+                    logger.warning(f"Tracked application {app_id} not found anymore.")
+                    self.update_fetch_state(state.app_summary, FetchStateEntity.FAILED, error="Not found in SHS")
+                continue
+            app_data.append(self.add_source(app))
+            watermarks[app_id] = Watermarks(state.job_watermark, state.stage_watermark, state.completion_watermark)
+        self.db_session.commit()
+
+        logger.info(f"{running_count} running applications found, {len(app_data) - running_count} tracked "
+                    f"applications to finalize.")
+        return app_data, watermarks
+
+    def get_application_list(self, min_end_date=None, limit=None, max_end_date=None):
+        """
+        Get the list of the completed applications from SHS, newest first, namespaced by the source (see add_source).
+        In the replay mode, the list is composed of all the application lists found in the response cache.
+        :param min_end_date: only the applications which ended at this time or later (format 2020-01-01T01:01:01.123GMT)
+        :param limit: maximum number of the applications
+        :param max_end_date: only the applications which ended at this time or earlier (same format)
+        :return: list of application data (json)
+        """
+        if not self.replay:
+            query = "status=completed"
+            query += f"&minEndDate={min_end_date}" if min_end_date is not None else ""
+            query += f"&maxEndDate={max_end_date}" if max_end_date is not None else ""
+            query += f"&limit={limit}" if limit is not None else ""
+            return [self.add_source(app) for app in self.get_json(f"{self.base_url}?{query}") or []]
+
+        apps_by_id = {}
+        for url in self.response_cache.get_urls():
+            if url.startswith(f"{self.base_url}?"):
+                for app in self.get_json(url) or []:
+                    apps_by_id[app['id']] = app
+        app_data = sorted(apps_by_id.values(), key=lambda app: app['attempts'][0]['endTime'], reverse=True)
+
+        # the timestamps share the same format, so they can be compared as strings
+        if min_end_date is not None:
+            app_data = [app for app in app_data if app['attempts'][0]['endTime'] >= min_end_date]
+        if max_end_date is not None:
+            app_data = [app for app in app_data if app['attempts'][0]['endTime'] <= max_end_date]
+        app_data = app_data[:limit] if limit is not None else app_data
+        return [self.add_source(app) for app in app_data]
+
+    def get_applications_by_fetch_state(self, statuses):
+        """
+        Get the applications of the source recorded in the fetch_state table with one of the given statuses.
+        :param statuses: list of the statuses (e.g. [FetchStateEntity.FAILED])
+        :return: list of application data (json)
+        """
+        states = self.db_session.query(FetchStateEntity) \
+                                .filter(FetchStateEntity.cluster == self.cluster) \
+                                .filter(FetchStateEntity.status.in_(statuses)) \
+                                .order_by(FetchStateEntity.end_time) \
+                                .all()
+        logger.info(f"{len(states)} applications with status {statuses} found.")
+        return [state.app_summary for state in states]
+
+    def update_fetch_state(self, app, status, level=None, error=None, watermarks=None, db_session=None):
+        """
+        Insert or update the fetch_state record of the application (within the current transaction).
+        :param app: application data (json)
+        :param status: one of FetchStateEntity.PENDING, IN_PROGRESS, COMPLETED, FAILED, RUNNING
+        :param level: the level being fetched
+        :param error: error message if the fetching failed
+        :param watermarks: watermarks of the last poll of a running application
+        :param db_session: database session of the transaction, the main session by default
+        """
+        db_session = db_session or self.db_session
+        fetch_state_attributes = FetchStateEntity.get_attributes(app, status, level, error, self.worker_id, watermarks)
+        db_session.merge(FetchStateEntity(fetch_state_attributes))
+
+    def fetch_applications(self, app_data, rows):
+        """
+        Fetch the environment data of the applications from SHS and add the application records
+        :param app_data: list of application data (json), as returned by the applications endpoint
+        :param rows: object collecting the records (BulkWriter or ApplicationRows)
+        :return: list of application id's
+        """
         logger.debug("Fetching application data...")
 
         # apps in cluster mode contain attemptId, client mode applications don't. The environment URLs then differ.
         env_urls = []
         for app in app_data:
             if 'attemptId' in app['attempts'][0]:
-                env_urls.append(f"{self.base_url}/{app['id']}/{app['attempts'][0]['attemptId']}/environment")
+                env_urls.append(f"{self.get_app_url(app['id'])}/{app['attempts'][0]['attemptId']}/environment")
                 app['mode'] = "cluster"
             else:
-                env_urls.append(f"{self.base_url}/{app['id']}/environment")
+                env_urls.append(f"{self.get_app_url(app['id'])}/environment")
                 app['mode'] = "client"
 
-        env_data = self.get_jsons_parallel(env_urls)
+        apps_by_id = {app['id']: app for app in app_data}
         app_ids = []
 
-        for app in app_data:
-            app_ids.append(app['id'])
-            app_env_data = env_data[app['id']].result()
-            app_attributes = ApplicationEntity.get_attributes(app, app_env_data)
-            self.db_session.add(ApplicationEntity(app_attributes))
-            self.db_session.flush()
-        logger.info(f"Fetched {len(app_data)} applications.")
+        for app_id, app_env_data in self.get_jsons_parallel(env_urls):
+            app_ids.append(app_id)
+            app_attributes = ApplicationEntity.get_attributes(apps_by_id[app_id], app_env_data)
+            rows.add(ApplicationEntity, app_attributes)
+        logger.debug(f"Fetched {len(app_data)} applications.")
         return app_ids
 
-    def fetch_executors(self, app_ids):
+    def fetch_executors(self, app_ids, rows):
         """
         For each application being fetched, fetch data about all the executors.
         :param app_ids: list of application_id's to process
+        :param rows: object collecting the records (BulkWriter or ApplicationRows)
         """
         logger.debug(f"Fetching executors data...")
-        urls = [f"{self.base_url}/{app_id}/allexecutors" for app_id in app_ids]
-        executors_data = self.get_jsons_parallel(urls)
+        urls = [f"{self.get_app_url(app_id)}/allexecutors" for app_id in app_ids]
         executor_count = 0
 
-        for app_id, executors_per_app in executors_data.items():
-            if not executors_per_app.result():
+        for app_id, executors_per_app in self.get_jsons_parallel(urls):
+            if not executors_per_app:
                 continue
 
-            for executor in executors_per_app.result():
+            for executor in executors_per_app:
                 executor_attributes = ExecutorEntity.get_attributes(app_id, executor)
-                self.db_session.add(ExecutorEntity(executor_attributes))
-                self.db_session.flush()
+                rows.add(ExecutorEntity, executor_attributes)
 
-            executor_count += len(executors_per_app.result())
-        logger.info(f"Fetched {executor_count} executors.")
+            executor_count += len(executors_per_app)
+        logger.debug(f"Fetched {executor_count} executors.")
 
-    def fetch_jobs(self, app_ids):
+    def fetch_sql_executions(self, app_ids, rows):
+        """
+        For each application being fetched, fetch data about all the Spark SQL executions, including their plan
+        descriptions and the metrics of the nodes of their physical plans. The executions are listed in pages of
+        sql_page_size executions, the next pages of all the applications are requested in parallel, until a page is
+        not full. SHS versions without the sql endpoint return no executions.
+        :param app_ids: list of application_id's to process
+        :param rows: object collecting the records (BulkWriter or ApplicationRows)
+        :return: dictionary {job_key: sql_key} mapping the jobs to the SQL executions which ran them
+        """
+        logger.debug(f"Fetching SQL executions data...")
+        page_size = max(self.config.getint('history_fetcher', 'sql_page_size', fallback=100), 1)
+        offsets = {app_id: 0 for app_id in app_ids}
+        job_sql_mapping = {}
+        execution_count = 0
+        node_count = 0
+
+        while offsets:
+            urls = [f"{self.get_app_url(app_id)}/sql?details=true&planDescription=true&offset={offset}"
+                    f"&length={page_size}" for app_id, offset in offsets.items()]
+            next_offsets = {}
+            for app_id, executions in self.get_jsons_parallel(urls):
+                if not executions:  # the last page might be empty
+                    continue
+
+                for execution in executions:
+                    sql_attributes = SqlExecutionEntity.get_attributes(app_id, execution)
+                    rows.add(SqlExecutionEntity, sql_attributes)
+                    self.map_jobs_to_sql_execution(job_sql_mapping, SqlExecutionEntity.get_job_ids(execution),
+                                                   sql_attributes['sql_key'], app_id)
+
+                    child_node_ids = {}  # dict[node_id, List[node_id]], an edge leads from a child to its parent
+                    for edge in execution.get('edges') or []:
+                        child_node_ids.setdefault(edge['toId'], []).append(edge['fromId'])
+                    for node in execution.get('nodes') or []:
+                        rows.add(SqlPlanNodeEntity, SqlPlanNodeEntity.get_attributes(
+                            sql_attributes['sql_key'], node, child_node_ids.get(node['nodeId'], [])))
+                    node_count += len(execution.get('nodes') or [])
+
+                execution_count += len(executions)
+                if len(executions) == page_size:
+                    next_offsets[app_id] = offsets[app_id] + page_size
+            offsets = next_offsets
+        logger.debug(f"Fetched {execution_count} SQL executions with {node_count} plan nodes.")
+
+        return job_sql_mapping
+
+    def fetch_jobs(self, app_ids, rows, watermarks=None, job_sql_mapping=None):
         """
         For each application being fetched, fetch data about all the jobs.
         :param app_ids: list of application_id's to process
+        :param rows: object collecting the records (BulkWriter or ApplicationRows)
+        :param watermarks: Watermarks of a running application, only the jobs changed since its previous poll are added
+        :param job_sql_mapping: dictionary {job_key: sql_key} mapping the jobs to the SQL executions which ran them
+        :return: dictionary {stage_key: job_key} mapping the stages to the corresponding jobs
         """
         logger.debug(f"Fetching jobs data...")
-        urls = [f"{self.base_url}/{app_id}/jobs" for app_id in app_ids]
-        jobs_data = self.get_jsons_parallel(urls)
+        urls = [f"{self.get_app_url(app_id)}/jobs" for app_id in app_ids]
+        stage_job_mapping = {}
         job_count = 0
 
-        for app_id, jobs_per_app in jobs_data.items():
-            if not jobs_per_app.result():  # job list might be empty
+        for app_id, jobs_per_app in self.get_jsons_parallel(urls):
+            if not jobs_per_app:  # job list might be empty
                 continue
 
-            for job in jobs_per_app.result():
-                job_attributes = JobEntity.get_attributes(app_id, job)
-                self.map_jobs_to_stages(job['stageIds'], job_attributes['job_key'], app_id)
-                self.db_session.add(JobEntity(job_attributes))
-                self.db_session.flush()
+            for job in jobs_per_app:
+                job_attributes = JobEntity.get_attributes(app_id, job, job_sql_mapping)
+                self.map_jobs_to_stages(stage_job_mapping, job['stageIds'], job_attributes['job_key'], app_id)
+                if watermarks is None or watermarks.is_job_changed(job):
+                    rows.add(JobEntity, job_attributes)
+
+            job_count += len(jobs_per_app)
+        logger.debug(f"Fetched {job_count} jobs.")
 
-            job_count += len(jobs_per_app.result())
-        logger.info(f"Fetched {job_count} jobs.")
+        return stage_job_mapping
 
-    def fetch_stages(self, app_ids):
+    def fetch_stages(self, app_ids, stage_job_mapping, rows, watermarks=None):
         """
         For each application being fetched, fetch data about all the stages
         :param app_ids: list of application_id's to process
-        :return: dictionary {application_id: List[stage_id]} mapping stages to the corresponding applications
+        :param stage_job_mapping: dictionary {stage_key: job_key} mapping the stages to the corresponding jobs
+        :param rows: object collecting the records (BulkWriter or ApplicationRows)
+        :param watermarks: Watermarks of a running application, only the stages changed since its previous poll are
+        added, and the per-stage requests are planned only for the changed stages which have finished
+        :return: RequestPlanner with the per-stage requests planned
         """
         logger.debug(f"Fetching stages data...")
-        urls = [f"{self.base_url}/{app_id}/stages" for app_id in app_ids]
-        stages_data = self.get_jsons_parallel(urls)
-        app_stage_mapping = {}  # dict[application_id, List[stage_id]]
+        urls = [f"{self.get_app_url(app_id)}/stages" for app_id in app_ids]
+        planner = RequestPlanner(self.get_task_limit(self.get_task_sampling()), self.get_task_page_size())
         stage_count = 0
 
-        for app_id, stages_per_app in stages_data.items():
-            if not stages_per_app.result():  # the stage list might be empty
+        for app_id, stages_per_app in self.get_jsons_parallel(urls):
+            if not stages_per_app:  # the stage list might be empty
                 continue
 
-            app_stage_mapping[app_id] = []
-
-            for stage in stages_per_app.result():
-                stage_attributes = StageEntity.get_attributes(app_id, stage, self.stage_job_mapping)
-                app_stage_mapping[app_id].append(stage_attributes['stage_id'])
-                if stage_attributes['attempt_id'] == 0:
-                    self.db_session.add(StageEntity(stage_attributes))
-                    self.db_session.flush()
+            for stage in stages_per_app:
+                stage_attributes = StageEntity.get_attributes(app_id, stage, stage_job_mapping)
+                if stage_attributes['attempt_id'] != 0:
+                    continue
+                if watermarks is None:
+                    rows.add(StageEntity, stage_attributes)
+                    planner.add_stage(app_id, stage)
+                elif watermarks.is_stage_changed(stage):
+                    rows.add(StageEntity, stage_attributes)
+                    # the tasks of the stages in progress are fetched once the stages finish
+                    if stage.get('completionTime') is not None:
+                        planner.add_stage(app_id, stage)
 
-            stage_count += len(stages_per_app.result())
-        logger.info(f"Fetched {stage_count} stages.")
+            stage_count += len(stages_per_app)
+        logger.debug(f"Fetched {stage_count} stages.")
 
-        return app_stage_mapping
+        return planner
 
-    def fetch_stage_executors(self, app_stage_mapping):
+    def fetch_stage_details(self, planner, rows):
         """
-        For each application and each stage being fetched, fetch data about usage of Executors within each Stage.
-        :param app_stage_mapping: dictionary {application_id: List[stage_id]} mapping the stages to the corresponding
-        applications
-        :param app_stage_mapping:
+        For each application and each stage being fetched, fetch the stage detail, which contains the usage of the
+        Executors within the Stage, the tasks and (on SHS 3.4 and newer, with withSummaries) the Task Summary / Stage
+        Statistics. A single request per stage thus feeds all the three tables, instead of downloading the tasks twice
+        (with the stage detail and with the task list). The responses are decoded and transformed in the decode process
+        pool if it is configured. The stages are requested in the order planned by the RequestPlanner (largest first).
+        :param planner: RequestPlanner with the planned stages
+        :param rows: object collecting the records (BulkWriter or ApplicationRows)
+        :return: tuple (list of (app_id, stage_id) of the stages without the stage statistics in the detail, list of
+        (app_id, stage_id) of the stages without the tasks in the detail)
         """
-        logger.info(f"Fetching stage_executor data...")
-        urls = [f"{self.base_url}/{app_id}/stages/{stage_id}/0"
-                for app_id, stage_list in app_stage_mapping.items() for stage_id in stage_list]
+        logger.debug(f"Fetching stage details...")
+        sampling = self.get_task_sampling()
+        task_limit = self.get_task_limit(sampling)
+
+        # the quantiles are intentionally hardcoded to avoid unexpected issues after modifying them
+        stages = {}  # dict[url, (app_id, stage_id)]
+        url_transforms = {}  # dict[url, (transform, args)]
+        for app_id, stage_id in planner.get_stages():
+            url = f"{self.get_app_url(app_id)}/stages/{stage_id}/0?withSummaries=true&quantiles={self.QUANTILES}"
+            stages[url] = (app_id, stage_id)
+            url_transforms[url] = (transform_stage_detail, (f"{app_id}_{stage_id}", app_id, task_limit))
 
-        stage_data = self.get_jsons_parallel(urls, key="stage_key")
+        statistics_stages = []  # List[(app_id, stage_id)]
+        task_stages = []  # List[(app_id, stage_id)]
         stage_executor_count = 0
+        task_count = 0
 
-        for stage_key, stage_future in stage_data.items():
-            stage_json = stage_future.result()
-            if not stage_json:
+        for url, stage_detail_rows in self.get_transformed_responses(url_transforms):
+            if stage_detail_rows is None:
                 continue
 
-            app_id = self.utils.get_app_id_from_stage_key(stage_key)
-            executors_per_app = self.get_executors_per_app(app_id)
-            executor_summary = stage_json['executorSummary']
-            for executor_id, stage_executor_dict in executor_summary.items():
+            app_id, stage_id = stages[url]
+            stage_key = f"{app_id}_{stage_id}"
+            stage_executors, stage_statistics, task_rows = stage_detail_rows
+
+            rows.add_tuples(StageExecutorEntity, stage_executors)
+            stage_executor_count += len(stage_executors)
 
-                stage_executor_attributes = StageExecutorEntity.get_attributes(stage_key, executor_id, app_id, stage_executor_dict)
+            if stage_statistics is not None:
+                rows.add(StageStatisticsEntity, stage_statistics)
+            else:
+                statistics_stages.append((app_id, stage_id))
 
-                # in some rare cases, in History Server, a Stage might contain an Executor which is not in the executors
-                # endpoint. If so, add the key to the Executor table to skip it to avoid DB Integrity Violation
-                executor_key = f"{app_id}_{executor_id}"
-                if executor_key not in executors_per_app:
-                    self.db_session.add(ExecutorEntity({"executor_key": executor_key, "app_id": app_id}))
-                    self.db_session.flush()
-                    executors_per_app.append(executor_key)
+            if task_rows is None:
+                task_stages.append((app_id, stage_id))
+            elif sampling is None:
+                rows.add_tuples(TaskEntity, task_rows)
+                task_count += len(task_rows)
+            else:
+                sampler = TaskSampler(stage_key, **sampling)
+                sampler.add_tuples(task_rows)
+                rows.add_tuples(TaskEntity, sampler.get_rows())
+                task_count += len(task_rows)
+            self.stream_application_rows(rows)
+        logger.debug(f"Fetched {len(url_transforms)} stage details with {stage_executor_count} stage_executors and "
+                     f"{task_count} tasks.")
 
-                self.db_session.add(StageExecutorEntity(stage_executor_attributes))
-                self.db_session.flush()
-                stage_executor_count += 1
-        logger.info(f"Fetched {stage_executor_count} stage_executors.")
+        return statistics_stages, task_stages
 
-    def fetch_stage_statistics(self, app_stage_mapping):
+    def fetch_stage_statistics(self, stages, rows):
         """
-        For each application and each stage being fetched, fetch data about Task Summary / Stage Statistics.
-        :param app_stage_mapping: dictionary {application_id: List[stage_id]} mapping the stages to the corresponding
-        applications
+        For each stage being fetched, fetch data about Task Summary / Stage Statistics.
+        :param stages: list of (app_id, stage_id) of the stages
+        :param rows: object collecting the records (BulkWriter or ApplicationRows)
         """
-        logger.info(f"Fetching stage statistics data...")
+        logger.debug(f"Fetching stage statistics data...")
 
         # the quantiles are intentionally hardcoded to avoid unexpected issues after modifying them
-        urls = [f"{self.base_url}/{app_id}/stages/{stage_id}/0/taskSummary?quantiles=0.001,0.25,0.5,0.75,0.999"
-                for app_id, stage_list in app_stage_mapping.items() for stage_id in stage_list]
+        urls = [f"{self.get_app_url(app_id)}/stages/{stage_id}/0/taskSummary?quantiles={self.QUANTILES}"
+                for app_id, stage_id in stages]
 
-        stage_statistics_data = self.get_jsons_parallel(urls, key="stage_key")
         stage_stat_count = 0
 
-        for stage_key, stage_statistics_future in stage_statistics_data.items():
-            stage_statistics = stage_statistics_future.result()
+        for stage_key, stage_statistics in self.get_jsons_parallel(urls, key="stage_key"):
             if not stage_statistics:  # the endpoint might be empty
                 continue
 
             stage_stat_count += 1
             stage_statistics_attributes = StageStatisticsEntity.get_attributes(stage_key, stage_statistics)
-            self.db_session.add(StageStatisticsEntity(stage_statistics_attributes))
-            self.db_session.flush()
-        logger.info(f"Fetched {stage_stat_count} stage statistics records.")
+            rows.add(StageStatisticsEntity, stage_statistics_attributes)
+        logger.debug(f"Fetched {stage_stat_count} stage statistics records.")
 
-    def fetch_tasks(self, app_stage_mapping):
+    def fetch_tasks(self, stages, planner, rows):
         """
-        For each application and each stage being fetched, fetch detailed data about tasks. The number of tasks being
+        For each stage being fetched, fetch detailed data about tasks. The number of tasks being
         fetched is read from the config file.
-        :param app_stage_mapping: dictionary {application_id: List[stage_id]} mapping the stages to the corresponding
-        applications
+
+        The task list of each stage is fetched in pages of task_page_size tasks, so that a stage with hundreds of
+        thousands of tasks does not produce a single huge response. The pages are planned from the number of tasks of
+        the stage and fetched in parallel. A stage may list more task attempts than its number of tasks (retried or
+        speculative tasks), so the pages following a full last page are fetched until a page is not full.
+
+        With the sample strategy of task sampling, all the tasks are fetched, and only the tasks selected by TaskSampler
+        are stored (together with their sampling weights). Otherwise, the top task_limit tasks by runtime are stored.
+        The tasks of a large application are handed over to the writer thread page by page (see
+        stream_application_rows).
+        :param stages: list of (app_id, stage_id) of the stages, in the order in which they should be requested
+        :param planner: RequestPlanner with the numbers of tasks of the stages
+        :param rows: object collecting the records (BulkWriter or ApplicationRows)
         """
         logger.debug(f"Fetching tasks data...")
-        task_limit = self.config.getint('history_fetcher', 'task_limit', fallback=2147483647)
-        urls = [f"{self.base_url}/{app_id}/stages/{stage_id}/0/taskList?length={task_limit}&sortBy=-runtime"
-                for app_id, stage_list in app_stage_mapping.items() for stage_id in stage_list]
-        tasks_data = self.get_jsons_parallel(urls, key="stage_key")
+        sampling = self.get_task_sampling()
+        task_limit = self.get_task_limit(sampling)
+        page_size = self.get_task_page_size()
+
+        pages = {}  # dict[url, (app_id, stage_id, offset, length)]
+        for app_id, stage_id in stages:
+            planned_tasks = min(max(planner.get_task_count(app_id, stage_id), 1), task_limit)
+            for offset in range(0, planned_tasks, page_size):
+                pages.update([self.get_task_page(app_id, stage_id, offset, min(page_size, task_limit - offset))])
         task_count = 0
+        samplers = {}  # dict[stage_key, TaskSampler]
 
-        for stage_key, tasks_future in tasks_data.items():
-            tasks = tasks_future.result()
-            if not tasks:
-                continue
+        while pages:
+            next_pages = {}
+            url_transforms = {url: (transform_task_page, (f"{app_id}_{stage_id}", app_id))
+                        for url, (app_id, stage_id, offset, length) in pages.items()}
+            for url, task_rows in self.get_transformed_responses(url_transforms):
+                if not task_rows:
+                    continue
 
-            app_id = self.utils.get_app_id_from_stage_key(stage_key)
+                app_id, stage_id, offset, length = pages[url]
+                if sampling is None:
+                    rows.add_tuples(TaskEntity, task_rows)
+                    self.stream_application_rows(rows)
+                else:
+                    stage_key = f"{app_id}_{stage_id}"
+                    if stage_key not in samplers:
+                        samplers[stage_key] = TaskSampler(stage_key, **sampling)
+                    samplers[stage_key].add_tuples(task_rows)
+                task_count += len(task_rows)
 
-            for task in tasks:
-                tasks_attributes = TaskEntity.get_attributes(stage_key, task, app_id)
-                self.db_session.add(TaskEntity(tasks_attributes))
-                self.db_session.flush()
+                # a full page which was planned as the last one, more task attempts may follow
+                next_offset = offset + length
+                if len(task_rows) == length and next_offset < task_limit:
+                    next_url, next_page = self.get_task_page(app_id, stage_id, next_offset,
+                                                             min(page_size, task_limit - next_offset))
+                    if next_url not in pages:
+                        next_pages[next_url] = next_page
+            pages = next_pages
 
-            task_count += len(tasks)
-        logger.info(f"Fetched {task_count} tasks.")
+        if sampling is not None:
+            sampled_count = 0
+            for sampler in samplers.values():
+                sampled_rows = sampler.get_rows()
+                rows.add_tuples(TaskEntity, sampled_rows)
+                sampled_count += len(sampled_rows)
+                self.stream_application_rows(rows)
+            logger.debug(f"Fetched {task_count} tasks, {sampled_count} sampled.")
+        else:
+            logger.debug(f"Fetched {task_count} tasks.")
+
+    def add_pruned_stages(self, count, request_count):
+        """
+        Account the stages pruned by a RequestPlanner (called from the application threads).
+        :param count: number of the pruned stages
+        :param request_count: number of the requests of the pruned stages, which were avoided
+        """
+        with self.pruned_stage_count_lock:
+            self.pruned_stage_count += count
+            self.avoided_request_count += request_count
+
+    def get_task_limit(self, sampling):
+        """
+        Get the maximum number of the tasks per stage which should be fetched.
+        :param sampling: configuration of the task sampling, as returned by get_task_sampling
+        :return: task_limit for the top strategy, unlimited for sampling (the sample needs all the tasks of the stage)
+        """
+        if sampling is not None:
+            return 2147483647
+        return self.config.getint('history_fetcher', 'task_limit', fallback=2147483647)
+
+    def get_task_page_size(self):
+        """
+        Get the number of the tasks per page of the task list.
+        :return: task_page_size
+        """
+        return max(self.config.getint('history_fetcher', 'task_page_size', fallback=1000), 1)
+
+    def get_task_sampling(self):
+        """
+        Get the configuration of the task sampling.
+        :raises ValueError: if the task_sampling strategy is not supported
+        :return: dictionary of the TaskSampler arguments, or None for the top strategy (no sampling)
+        """
+        strategy = self.config.get('history_fetcher', 'task_sampling', fallback="top")
+        if strategy not in ["top", "sample"]:
+            raise ValueError(f"Unsupported task_sampling: {strategy}")
+        if strategy == "top":
+            return None
+        return {
+            'top_n': self.config.getint('history_fetcher', 'task_sample_top_n', fallback=20),
+            'sample_size': self.config.getint('history_fetcher', 'task_sample_size', fallback=100),
+            'stratify_by_executor': self.config.getboolean('history_fetcher', 'task_sample_by_executor',
+                                                           fallback=False),
+        }
+
+    def get_transformed_responses(self, url_transforms):
+        """
+        Fetch the responses and turn them into records by the transformation functions. The responses are decoded and
+        transformed in the decode process pool if it is configured, otherwise in the calling thread.
+        :param url_transforms: dictionary {url: (transform, args)} of the URLs to fetch, the transformation function of
+        each response is called as transform(body, *args)
+        :return: generator of tuples (url, result of the transformation or None if the response could not be fetched or
+        decoded)
+        """
+        if self.decode_pool is None:
+            for url, body in self.get_jsons_parallel(url_transforms, key="url", raw=True):
+                transform, args = url_transforms[url]
+                if body is not None:
+                    yield url, self.get_transformed(url, timed_call, transform, body, *args)
+            return
+
+        # a few responses per process are queued, so that the processes are kept busy while the memory stays bounded
+        pending = {}  # dict[future, url]
+        for url, body in self.get_jsons_parallel(url_transforms, key="url", raw=True):
+            transform, args = url_transforms[url]
+            if body is not None:
+                pending[self.decode_pool.submit(timed_call, transform, body, *args)] = url
+            while len(pending) >= 2 * self.decode_processes:
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    yield pending[future], self.get_transformed(pending.pop(future), future.result)
+        for future in concurrent.futures.as_completed(pending):
+            yield pending[future], self.get_transformed(pending[future], future.result)
+
+    def get_transformed(self, url, transform, *args):
+        """
+        Run the transformation of a response, logging an invalid response and recording it as missing the same way as
+        parse_response.
+        :param url: URL of the response
+        :param transform: function returning a tuple (result of the transformation, transformation time)
+        :param args: arguments of the function
+        :return: result of the transformation or None if the response is not a valid json
+        """
+        try:
+            result, decode_time = transform(*args)
+        except ValueError as e:
+            logger.warning(f"Could not open {url}: {e}")
+            self.add_missing_url(url, repr(e))
+            return None
+        self.metrics.observe_decode(url, decode_time)
+        return result
+
+    def get_task_page(self, app_id, stage_id, offset, length):
+        """
+        Get the URL of a page of the task list of a stage (tasks sorted by runtime descending).
+        :param app_id: application_id
+        :param stage_id: stage_id
+        :param offset: index of the first task of the page
+        :param length: number of tasks of the page
+        :return: tuple (URL, tuple (app_id, stage_id, offset, length))
+        """
+        url = f"{self.get_app_url(app_id)}/stages/{stage_id}/0/taskList?offset={offset}&length={length}&sortBy=-runtime"
+        return url, (app_id, stage_id, offset, length)
 
     def get_http_session(self):
         """
@@ -288,75 +1409,340 @@ class DataFetcher:
         :param url: URL
         :return: json payload or None if not able to get the json
         """
+        payload, size = self.get_json_with_size(url)
+        return payload
+
+    def get_json_with_size(self, url):
+        """
+        Get the json payload from the specified URL, together with the size of the response body.
+        :param url: URL
+        :return: tuple (json payload or None if not able to get the json, response size in bytes)
+        """
+        if self.async_engine is not None:
+            body = self.async_engine.submit(url).result()
+        else:
+            body = self.get_body(url)
+        return self.parse_response(url, body), len(body) if body is not None else 0
+
+    def get_body(self, url):
+        """
+        Get the raw response body from the specified URL (threads engine), or from the response cache in the replay
+        mode. Server errors, timeouts and connection errors are retried according to the retry policy. The URL is
+        recorded as missing if all the attempts fail, or if the request fails by a non-retryable error.
+        :param url: URL
+        :return: response body (bytes) or None if not able to get the response
+        """
+        if self.replay:
+            return self.response_cache.load(url)
+
+        attempt = 0
+        while True:
+            body, error, retryable = self.get_body_once(url)
+            if not retryable or not self.retry_policy.can_retry(attempt):
+                break
+            time.sleep(self.retry_policy.get_delay(attempt))
+            attempt += 1
+
+        if error is not None:
+            logger.warning(f"Could not open {url} after {attempt + 1} attempts: {error}")
+            self.add_missing_url(url, error)
+        return body
+
+    def get_body_once(self, url):
+        """
+        Send a single request (threads engine), waiting for a free slot under the adaptive concurrency limit. A missing
+        resource (HTTP 404, e.g. the sql endpoint of an older SHS) is not an error, the response body is None then.
+        :param url: URL
+        :return: tuple (response body or None, description of the error or None, True if the error is retryable)
+        """
         http_session = self.get_http_session()
+        self.controller.acquire()
+        start = time.monotonic()
         try:
             logger.trace(f">>> REQ: {url}")
-            response = http_session.get(url, verify=self.verify_certificates)
+            response = http_session.get(url, verify=self.verify_certificates, timeout=self.request_timeout)
             logger.trace(f"<<< RSP: {url}")
-            return response.json()
+            if self.retry_policy.is_retryable_status(response.status_code):
+                self.controller.on_failure(time.monotonic())
+                self.metrics.observe_request(url, time.monotonic() - start, len(response.content), failed=True)
+                return None, f"HTTP {response.status_code}", True
+            self.controller.on_success(time.monotonic() - start, time.monotonic())
+            self.metrics.observe_request(url, time.monotonic() - start, len(response.content))
+            if response.status_code == 404:
+                return None, None, False
+            if response.status_code >= 400:
+                return None, f"HTTP {response.status_code}", False
+            return response.content, None, False
+        except (requests.exceptions.ConnectionError, requests.exceptions.Timeout,
+                requests.exceptions.ChunkedEncodingError) as e:
+            self.controller.on_failure(time.monotonic())
+            self.metrics.observe_request(url, time.monotonic() - start, 0, failed=True)
+            return None, repr(e), True
+        except Exception as e:
+            return None, repr(e), False
+        finally:
+            self.controller.release()
+
+    def add_missing_url(self, url, reason):
+        """
+        Record a URL which could not be fetched even after all the retries.
+        :param url: URL
+        :param reason: description of the last error
+        """
+        with self.missing_urls_lock:
+            self.missing_urls.setdefault(self.utils.get_app_id_from_url(url), []).append(url)
+
+    def pop_missing_urls(self, app_id):
+        """
+        Take the URLs of the given application which could not be fetched.
+        :param app_id: application_id
+        :return: list of URLs
+        """
+        with self.missing_urls_lock:
+            return self.missing_urls.pop(app_id, [])
+
+    def parse_response(self, url, body):
+        """
+        Decode the json payload of a response, and store the response in the cache if the responses are recorded.
+        :param url: URL of the request
+        :param body: response body (bytes) or None
+        :return: json payload or None if the body is not a valid json (the URL is recorded as missing then)
+        """
+        if body is None:
+            return None
+        self.record_response(url, body)
+        try:
+            payload, decode_time = timed_call(json.loads, body)
         except Exception as e:
             logger.warning(f"Could not open {url}: {e}")
+            self.add_missing_url(url, repr(e))
             return None
+        self.metrics.observe_decode(url, decode_time)
+        return payload
 
-    def get_jsons_parallel(self, urls, key="app_id"):
+    def record_response(self, url, body):
         """
-        Open multiple HTTP connections and collect the responses in parallel
-        :param urls: a list of endpoints that should be processed
-        :param key: "app_id" or "stage_key"
-        :raises ValueError: if key is not in ["app_id", "stage_key"]
-        :return: dictionary {application_id: payload} for key == "app_id" or dictionary {stage_key: payload} for
-        key == "stage_key"
+        Store the response in the cache if the responses are recorded.
+        :param url: URL of the request
+        :param body: response body (bytes) or None
         """
-        if key not in ["app_id", "stage_key"]:
+        if self.record_responses and body is not None:
+            self.response_cache.store(url, body)
+
+    def get_jsons_parallel(self, urls, key="app_id", raw=False):
+        """
+        Open multiple HTTP connections and yield the responses in the order in which they are received. At most
+        max_in_flight_requests requests are pending at a time, and no new requests are sent while the received but not
+        yet consumed payloads exceed max_buffered_mb, so the memory usage does not depend on the number of the urls.
+        :param urls: an iterable of endpoints that should be processed
+        :param key: "app_id", "stage_key" or "url"
+        :param raw: True for yielding the raw response bodies (bytes) instead of the decoded payloads
+        :raises ValueError: if key is not in ["app_id", "stage_key", "url"]
+        :return: generator of tuples (application_id, payload) for key == "app_id", (stage_key, payload) for
+        key == "stage_key" or (url, payload) for key == "url"
+        """
+        if key not in ["app_id", "stage_key", "url"]:
             logger.error(f"Unsupported key: {key}")
             raise ValueError(f"Unsupported key: {key}")
 
-        threadpool_size = self.config.getint('history_fetcher', 'threadpool_size')
-        executor = concurrent.futures.ThreadPoolExecutor(max_workers=threadpool_size)
-
-        if key == "stage_key":
-            result = {self.utils.get_stage_key_from_url(url): executor.submit(self.get_json, url) for url in urls}
+        if key == "url":
+            get_key = str
         else:
-            result = {self.utils.get_app_id_from_url(url): executor.submit(self.get_json, url) for url in urls}
+            get_key = self.utils.get_stage_key_from_url if key == "stage_key" else self.utils.get_app_id_from_url
+        urls = iter(urls)
+        in_flight = {}  # dict[future, url]
+        all_submitted = False
 
-        # wait until all the data are received
-        for i in as_completed(result.values()):
-            pass
+        try:
+            while True:
+                # at least one request is always allowed, so that the loop cannot stall on the buffer limit
+                while not all_submitted and len(in_flight) < self.max_in_flight_requests \
+                        and (not in_flight or self.buffered_bytes < self.max_buffered_bytes):
+                    url = next(urls, None)
+                    if url is None:
+                        all_submitted = True
+                        break
+                    in_flight[self.submit_request(url)] = url
 
-        return result
+                if not in_flight:
+                    return
+
+                done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+                for future in done:
+                    url = in_flight.pop(future)
+                    body = self.release_buffered(future)
+                    if raw:
+                        self.record_response(url, body)
+                        yield get_key(url), body
+                    else:
+                        yield get_key(url), self.parse_response(url, body)
+        finally:
+            # the consumer stopped early, drop the remaining responses
+            for future in in_flight:
+                if not future.cancel():
+                    self.release_buffered(future)
+
+    def submit_request(self, url):
+        """
+        Send a request using the configured http engine, without waiting for the response. The size of the response is
+        accounted to the bytes buffered by get_jsons_parallel.
+        :param url: URL
+        :return: concurrent.futures.Future with the response body (bytes) or None
+        """
+        if self.async_engine is not None:
+            return self.async_engine.submit(url, on_received=self.add_buffered_bytes)
+        return self.thread_pool.submit(self.get_body_buffered, url)
+
+    def get_body_buffered(self, url):
+        """
+        Get the response body from the specified URL and account its size to the bytes buffered by
+        get_jsons_parallel.
+        :param url: URL
+        :return: response body (bytes) or None
+        """
+        body = self.get_body(url)
+        self.add_buffered_bytes(len(body) if body is not None else 0)
+        return body
+
+    def add_buffered_bytes(self, size):
+        """
+        Account a received response to the bytes buffered by get_jsons_parallel.
+        :param size: response size in bytes
+        """
+        with self.buffered_bytes_lock:
+            self.buffered_bytes += size
+
+    def release_buffered(self, future):
+        """
+        Take the response body out of a finished request and subtract its size from the buffered bytes.
+        :param future: finished future returned by submit_request
+        :return: response body (bytes) or None
+        """
+        body = future.result()
+        with self.buffered_bytes_lock:
+            self.buffered_bytes -= len(body) if body is not None else 0
+        return body
+
+    def report_metrics(self):
+        """
+        Report the fetch metrics: log the JSON summary, and write the summary file and the Prometheus textfile if
+        configured.
+        """
+        self.metrics.set_table_statistics(self.get_write_statistics())
+        self.metrics.report(self.get_metrics_file('summary_file'), self.get_metrics_file('prometheus_textfile'))
+
+    def get_metrics_file(self, option):
+        """
+        Get the path of a metrics file. Each source writes its own files, named by the source (e.g.
+        sparkscope.prod.prom for sparkscope.prom).
+        :param option: 'summary_file' or 'prometheus_textfile'
+        :return: path of the file, or None if it is not configured
+        """
+        path = self.config.get('metrics', option, fallback=None)
+        if not path or self.source is None:
+            return path
+        root, extension = os.path.splitext(path)
+        return f"{root}.{self.source}{extension}"
+
+    def close(self):
+        """
+        Release the resources (threads, connections) held by the DataFetcher.
+        """
+        self.app_pool.shutdown(wait=True)
+        self.write_pool.shutdown(wait=True)
+        for write_session, _ in self.write_sessions:
+            write_session.close()
+        if self.thread_pool is not None:
+            self.thread_pool.shutdown(wait=True)
+        if self.async_engine is not None:
+            self.async_engine.close()
+        if self.decode_pool is not None:
+            self.decode_pool.shutdown(wait=True)
+        if self.lease_manager is not None:
+            self.lease_manager.stop()
 
     def get_time_filter(self):
         """
         Get timestamp, one millisecond newer than the endTime of the newest application found in the database.
         If no applications are found in the database (the initial load), 1970-01-01T00:00:00.001GMT should be returned.
-        Used as a delta-logic criterion.
+        Used as a delta-logic criterion, separately for each source (cluster). The database is queried only once,
+        then the newest endTime is kept up to date in memory as the applications are stored.
+        :return: timestamp in format 2020-01-01T01:01:01.123GMT
+        """
+        if self.max_end_time is None:
+            # the running applications (incremental mode) have no endTime yet
+            max_date = self.db_session.query(func.max(ApplicationEntity.end_time)) \
+                                      .filter(ApplicationEntity.cluster == self.cluster) \
+                                      .filter(ApplicationEntity.completed.isnot(False))[0][0]
+            self.max_end_time = max_date if max_date is not None else datetime.datetime(1970, 1, 1, 0, 0, 0, 0)
+        return self.format_time(self.max_end_time + datetime.timedelta(milliseconds=1))
+
+    @staticmethod
+    def format_time(timestamp):
+        """
+        Format a timestamp for the time filters of SHS.
+        :param timestamp: datetime (GMT)
         :return: timestamp in format 2020-01-01T01:01:01.123GMT
         """
-        max_date = self.db_session.query(func.max(ApplicationEntity.end_time))[0][0]
-        if max_date is None:
-            max_date = datetime.datetime(1970, 1, 1, 0, 0, 0, 0)
         fmt = "%Y-%m-%dT%H:%M:%S.%f"  # example: 2020-10-23T12:34:56.012345
-        time_filter_preformatted = (max_date + datetime.timedelta(milliseconds=1)).strftime(fmt)
-        return f"{time_filter_preformatted[:-3]}GMT"
+        return f"{timestamp.strftime(fmt)[:-3]}GMT"
+
+    def update_max_end_time(self, app):
+        """
+        Update the newest endTime of the stored applications (used by get_time_filter) by a newly stored application.
+        Called by the writer threads.
+        :param app: application data (json)
+        """
+        end_time = app['attempts'][0]['endTime']
+        if self.max_end_time is None or end_time is None:
+            return
+        end_time = datetime.datetime.strptime(end_time.replace("GMT", ""), "%Y-%m-%dT%H:%M:%S.%f")
+        with self.max_end_time_lock:
+            self.max_end_time = max(self.max_end_time, end_time)
+
+    def stop(self):
+        """
+        Stop fetching: no more applications are started, the applications in progress are finished.
+        """
+        self.stop_event.set()
+
+    def is_stopped(self):
+        """
+        Check if stop() has been called.
+        :return: True if the fetching is being stopped
+        """
+        return self.stop_event.is_set()
+
+    def wait(self, timeout):
+        """
+        Wait for the given time, or until stop() is called.
+        :param timeout: time in seconds
+        """
+        self.stop_event.wait(timeout)
+
+    @staticmethod
+    def map_jobs_to_sql_execution(job_sql_mapping, job_ids, sql_key, app_id):
+        """
+        Map the jobs to the SQL execution which ran them. Add new data to the dictionary {job_key: sql_key}.
+        Note: job_key is formed as {application_id}_{job_id}
+        :param job_sql_mapping: dictionary {job_key: sql_key} to be extended
+        :param job_ids: list of job_id's run by the SQL execution
+        :param sql_key: sql_key of the SQL execution
+        :param app_id: application_id
+        """
+        for job_id in job_ids:
+            job_sql_mapping[f"{app_id}_{job_id}"] = sql_key
 
-    def map_jobs_to_stages(self, stage_ids, job_key, app_id):
+    @staticmethod
+    def map_jobs_to_stages(stage_job_mapping, stage_ids, job_key, app_id):
         """
         Map the job_key to the corresponding job_key. Add new data to the dictionary {stage_key: job_key}.
         Note: stage_key is formed as {application_id}_{stage_id}
+        :param stage_job_mapping: dictionary {stage_key: job_key} to be extended
         :param stage_ids: list of stage_id's
         :param job_key: job_key
         :param app_id: application_id
         :return:
         """
         for stage_id in stage_ids:
-            self.stage_job_mapping[f"{app_id}_{stage_id}"] = job_key
-
-    def get_executors_per_app(self, app_id):
-        """
-        Get list of executor keys per application.
-        :param app_id: application_id (string)
-        :return: list of executor_keys
-        """
-        executors = self.db_session.query(ExecutorEntity).filter_by(app_id=app_id).all()
-        return [executor.executor_key for executor in executors]
-
+            stage_job_mapping[f"{app_id}_{stage_id}"] = job_key
@@ -0,0 +1,651 @@
+import datetime
+import json
+import logging
+
+from db.entities.application import ApplicationEntity
+from db.entities.executor import ExecutorEntity
+from db.entities.job import JobEntity
+from db.entities.stage import StageEntity
+from db.entities.stage_executor import StageExecutorEntity, STAGE_EXECUTOR_EXTRACTOR
+from db.entities.stage_statistics import StageStatisticsEntity
+from db.entities.task import TaskEntity, TASK_EXTRACTOR
+from history_fetcher.application_rows import ApplicationRows
+from history_fetcher.event_log_reader import EventLogReader
+from history_fetcher.task_sampler import TaskSampler
+from history_fetcher.utils import get_prop
+
+# Set up logger
+logger = logging.getLogger(__name__)
+
+
+def parse_event_log(path, task_limit, task_sampling=None):
+    """
+    Parse a Spark event log into the records of the application. Executed in the process pool, one event log per
+    worker.
+    :param path: path of the event log file, or of the rolling event log directory
+    :param task_limit: maximum number of the tasks (sorted by executor_run_time descending) per stage
+    :param task_sampling: dictionary of the TaskSampler arguments, or None for storing the top task_limit tasks
+    :return: ApplicationRows object with the records of the application
+    """
+    parser = EventLogParser()
+    for line in EventLogReader(path).read_lines():
+        if line.strip():
+            parser.process_event(json.loads(line))
+    return parser.get_application_rows(task_limit, task_sampling)
+
+
+class EventLogParser:
+    """
+    A class responsible for turning the events of a Spark event log into the same records as DataFetcher produces.
+
+    The events are processed one by one, as they are read. The parser aggregates them into the same json documents as
+    Spark History Server (SHS) returns from its REST API (applications, environment, allexecutors, jobs, stages, stage
+    details, taskSummary and taskList), so the records are created by the same get_attributes() methods and row
+    extractors (see RowExtractor). Only the first attempt of each stage is stored, as DataFetcher does.
+    """
+    # the quantiles are intentionally the same as the ones requested from SHS by DataFetcher
+    QUANTILES = [0.001, 0.25, 0.5, 0.75, 0.999]
+
+    def __init__(self):
+        """
+        Create EventLogParser object
+        """
+        self.app = None
+        self.app_start_time = None
+        self.environment = {}
+        self.executors = {}  # dict[executor_id, executor json]
+        self.jobs = {}  # dict[job_id, job json]
+        self.job_stages = {}  # dict[job_id, set of stage_ids]
+        self.stage_infos = {}  # dict[stage_id, latest Stage Info]
+        self.stages = {}  # dict[(stage_id, attempt_id), stage json]
+        self.stage_indices = {}  # dict[(stage_id, attempt_id), set of the indices of the succeeded tasks]
+        self.stage_executors = {}  # dict[stage_id, dict[executor_id, stage_executor json]] (first attempts only)
+        self.tasks = {}  # dict[stage_id, List[task json]] (first attempts only)
+        self.scheduling_pools = {}  # dict[stage_id, pool name]
+        self.task_cpus = 1
+
+        self.handlers = {
+            "SparkListenerApplicationStart": self.on_application_start,
+            "SparkListenerApplicationEnd": self.on_application_end,
+            "SparkListenerEnvironmentUpdate": self.on_environment_update,
+            "SparkListenerBlockManagerAdded": self.on_block_manager_added,
+            "SparkListenerExecutorAdded": self.on_executor_added,
+            "SparkListenerExecutorRemoved": self.on_executor_removed,
+            "SparkListenerJobStart": self.on_job_start,
+            "SparkListenerJobEnd": self.on_job_end,
+            "SparkListenerStageSubmitted": self.on_stage_submitted,
+            "SparkListenerStageCompleted": self.on_stage_completed,
+            "SparkListenerTaskEnd": self.on_task_end,
+            "SparkListenerStageExecutorMetrics": self.on_stage_executor_metrics
+        }
+
+    def process_event(self, event):
+        """
+        Process a single event of the event log. The events not needed for the records are ignored.
+        :param event: event (json)
+        """
+        handler = self.handlers.get(event.get("Event"))
+        if handler is not None:
+            handler(event)
+
+    @staticmethod
+    def format_time(timestamp):
+        """
+        Format an event log timestamp the same way as SHS does.
+        :param timestamp: milliseconds since the epoch, or None
+        :return: timestamp in format 2020-01-01T01:01:01.123GMT, or None
+        """
+        if timestamp is None:
+            return None
+        time = datetime.datetime(1970, 1, 1) + datetime.timedelta(milliseconds=timestamp)
+        return f"{time.strftime('%Y-%m-%dT%H:%M:%S.%f')[:-3]}GMT"
+
+    @staticmethod
+    def merge_peak_metrics(peak_metrics, metrics):
+        """
+        Update the peak values of the executor metrics (e.g. JVMHeapMemory) by the new values.
+        :param peak_metrics: dictionary {metric: peak value}, updated in place
+        :param metrics: dictionary {metric: value} or None
+        """
+        for metric, value in (metrics or {}).items():
+            if value > peak_metrics.get(metric, -1):
+                peak_metrics[metric] = value
+
+    def on_application_start(self, event):
+        """
+        Process the SparkListenerApplicationStart event.
+        :param event: event (json)
+        """
+        self.app = {
+            'id': event["App ID"],
+            'name': event["App Name"],
+            'attempts': [{
+                'startTime': self.format_time(event["Timestamp"]),
+                'endTime': None,
+                'duration': None,
+                'sparkUser': event["User"],
+                'completed': False
+            }]
+        }
+        self.app_start_time = event["Timestamp"]
+        if event.get("App Attempt ID") is not None:
+            self.app['attempts'][0]['attemptId'] = event["App Attempt ID"]
+
+    def on_application_end(self, event):
+        """
+        Process the SparkListenerApplicationEnd event.
+        :param event: event (json)
+        """
+        attempt = self.app['attempts'][0]
+        attempt['endTime'] = self.format_time(event["Timestamp"])
+        attempt['duration'] = event["Timestamp"] - self.app_start_time
+        attempt['completed'] = True
+
+    def on_environment_update(self, event):
+        """
+        Process the SparkListenerEnvironmentUpdate event.
+        :param event: event (json)
+        """
+        jvm_information = event.get("JVM Information", {})
+        spark_properties = event.get("Spark Properties", {})
+        self.environment = {
+            'runtime': {
+                'javaVersion': jvm_information.get("Java Version"),
+                'javaHome': jvm_information.get("Java Home"),
+                'scalaVersion': jvm_information.get("Scala Version")
+            },
+            'sparkProperties': sorted([key, value] for key, value in spark_properties.items()),
+            'systemProperties': sorted([key, value] for key, value in event.get("System Properties", {}).items())
+        }
+        self.task_cpus = int(spark_properties.get("spark.task.cpus", 1))
+
+    def get_executor(self, executor_id, timestamp):
+        """
+        Get the executor json, creating it when the executor is seen for the first time.
+        :param executor_id: executor id (e.g. "driver" or "1")
+        :param timestamp: time of the event (milliseconds since the epoch)
+        :return: executor json
+        """
+        if executor_id not in self.executors:
+            self.executors[executor_id] = {
+                'id': executor_id, 'hostPort': None, 'isActive': True, 'rddBlocks': 0, 'memoryUsed': 0,
+                'diskUsed': 0, 'totalCores': 0, 'maxTasks': 0, 'activeTasks': 0, 'failedTasks': 0,
+                'completedTasks': 0, 'totalTasks': 0, 'totalDuration': 0, 'totalGCTime': 0, 'totalInputBytes': 0,
+                'totalShuffleRead': 0, 'totalShuffleWrite': 0, 'isBlacklisted': False, 'maxMemory': 0,
+                'addTime': self.format_time(timestamp), 'executorLogs': {}, 'memoryMetrics': {},
+                'blacklistedInStages': [], 'peakMemoryMetrics': {}
+            }
+        return self.executors[executor_id]
+
+    def on_block_manager_added(self, event):
+        """
+        Process the SparkListenerBlockManagerAdded event.
+        :param event: event (json)
+        """
+        block_manager = event["Block Manager ID"]
+        executor = self.get_executor(block_manager["Executor ID"], event.get("Timestamp"))
+        executor['hostPort'] = f"{block_manager['Host']}:{block_manager['Port']}"
+        executor['maxMemory'] = event["Maximum Memory"]
+        executor['memoryMetrics'] = {
+            'usedOnHeapStorageMemory': 0,
+            'usedOffHeapStorageMemory': 0,
+            'totalOnHeapStorageMemory': event.get("Maximum Onheap Memory"),
+            'totalOffHeapStorageMemory': event.get("Maximum Offheap Memory")
+        }
+
+    def on_executor_added(self, event):
+        """
+        Process the SparkListenerExecutorAdded event.
+        :param event: event (json)
+        """
+        executor_info = event["Executor Info"]
+        executor = self.get_executor(event["Executor ID"], event["Timestamp"])
+        executor['addTime'] = self.format_time(event["Timestamp"])
+        executor['hostPort'] = executor['hostPort'] or executor_info["Host"]
+        executor['totalCores'] = executor_info["Total Cores"]
+        executor['maxTasks'] = executor_info["Total Cores"] // self.task_cpus
+        executor['executorLogs'] = executor_info.get("Log Urls", {})
+
+    def on_executor_removed(self, event):
+        """
+        Process the SparkListenerExecutorRemoved event.
+        :param event: event (json)
+        """
+        executor = self.get_executor(event["Executor ID"], event["Timestamp"])
+        executor['isActive'] = False
+        executor['removeTime'] = self.format_time(event["Timestamp"])
+        executor['removeReason'] = event.get("Removed Reason")
+
+    def on_job_start(self, event):
+        """
+        Process the SparkListenerJobStart event.
+        :param event: event (json)
+        """
+        job_id = event["Job ID"]
+        stage_infos = event.get("Stage Infos", [])
+        self.job_stages[job_id] = set(event["Stage IDs"])
+        pool = (event.get("Properties") or {}).get("spark.scheduler.pool", "default")
+        for stage_info in stage_infos:
+            self.stage_infos.setdefault(stage_info["Stage ID"], stage_info)
+            self.scheduling_pools[stage_info["Stage ID"]] = pool
+
+        self.jobs[job_id] = {
+            'jobId': job_id,
+            'submissionTime': self.format_time(event.get("Submission Time")),
+            'completionTime': None,
+            'stageIds': event["Stage IDs"],
+            'status': "RUNNING",
+            'numTasks': sum(stage_info["Number of Tasks"] for stage_info in stage_infos),
+            'killedTasksSummary': {}
+        }
+
+    def on_job_end(self, event):
+        """
+        Process the SparkListenerJobEnd event.
+        :param event: event (json)
+        """
+        job = self.jobs[event["Job ID"]]
+        job['completionTime'] = self.format_time(event.get("Completion Time"))
+        job['status'] = "SUCCEEDED" if event["Job Result"]["Result"] == "JobSucceeded" else "FAILED"
+
+    def get_stage(self, stage_info):
+        """
+        Get the stage json of a stage attempt, creating it when the attempt is seen for the first time.
+        :param stage_info: Stage Info of the event (json)
+        :return: stage json
+        """
+        stage_id, attempt_id = stage_info["Stage ID"], stage_info["Stage Attempt ID"]
+        self.stage_infos[stage_id] = stage_info
+        if (stage_id, attempt_id) not in self.stages:
+            self.stages[(stage_id, attempt_id)] = {
+                'status': "ACTIVE", 'stageId': stage_id, 'attemptId': attempt_id,
+                'numTasks': stage_info["Number of Tasks"], 'numActiveTasks': 0, 'numCompleteTasks': 0,
+                'numFailedTasks': 0, 'numKilledTasks': 0, 'numCompletedIndices': 0, 'executorRunTime': 0,
+                'executorCpuTime': 0, 'submissionTime': None, 'firstTaskLaunchedTime': None, 'completionTime': None,
+                'inputBytes': 0, 'inputRecords': 0, 'outputBytes': 0, 'outputRecords': 0, 'shuffleReadBytes': 0,
+                'shuffleReadRecords': 0, 'shuffleWriteBytes': 0, 'shuffleWriteRecords': 0, 'memoryBytesSpilled': 0,
+                'diskBytesSpilled': 0, 'name': stage_info["Stage Name"], 'details': stage_info.get("Details"),
+                'schedulingPool': self.scheduling_pools.get(stage_id, "default"),
+                'rddIds': [rdd["RDD ID"] for rdd in stage_info.get("RDD Info", [])],
+                'accumulatorUpdates': [], 'killedTasksSummary': {}
+            }
+            self.stage_indices[(stage_id, attempt_id)] = set()
+        return self.stages[(stage_id, attempt_id)]
+
+    def on_stage_submitted(self, event):
+        """
+        Process the SparkListenerStageSubmitted event.
+        :param event: event (json)
+        """
+        stage = self.get_stage(event["Stage Info"])
+        stage['submissionTime'] = self.format_time(event["Stage Info"].get("Submission Time"))
+
+    def on_stage_completed(self, event):
+        """
+        Process the SparkListenerStageCompleted event.
+        :param event: event (json)
+        """
+        stage_info = event["Stage Info"]
+        stage = self.get_stage(stage_info)
+        stage['submissionTime'] = self.format_time(stage_info.get("Submission Time"))
+        stage['completionTime'] = self.format_time(stage_info.get("Completion Time"))
+        stage['failureReason'] = stage_info.get("Failure Reason")
+        stage['status'] = "FAILED" if stage_info.get("Failure Reason") is not None else "COMPLETE"
+        stage['accumulatorUpdates'] = self.get_accumulator_updates(stage_info.get("Accumulables"), ["value"])
+
+    def on_stage_executor_metrics(self, event):
+        """
+        Process the SparkListenerStageExecutorMetrics event.
+        :param event: event (json)
+        """
+        if event["Stage Attempt ID"] != 0:
+            return
+        stage_executor = self.get_stage_executor(event["Stage ID"], event["Executor ID"])
+        self.merge_peak_metrics(stage_executor['peakMemoryMetrics'], event.get("Executor Metrics"))
+
+    def get_stage_executor(self, stage_id, executor_id):
+        """
+        Get the stage_executor json of the first attempt of a stage, creating it when seen for the first time.
+        :param stage_id: stage id
+        :param executor_id: executor id
+        :return: stage_executor json
+        """
+        stage_executors = self.stage_executors.setdefault(stage_id, {})
+        if executor_id not in stage_executors:
+            stage_executors[executor_id] = {
+                'taskTime': 0, 'failedTasks': 0, 'succeededTasks': 0, 'killedTasks': 0, 'inputBytes': 0,
+                'inputRecords': 0, 'outputBytes': 0, 'outputRecords': 0, 'shuffleRead': 0, 'shuffleReadRecords': 0,
+                'shuffleWrite': 0, 'shuffleWriteRecords': 0, 'memoryBytesSpilled': 0, 'diskBytesSpilled': 0,
+                'isBlacklistedForStage': False, 'peakMemoryMetrics': {}
+            }
+        return stage_executors[executor_id]
+
+    @staticmethod
+    def get_accumulator_updates(accumulables, fields):
+        """
+        Convert the Accumulables of an event into the accumulatorUpdates of SHS. The internal accumulators and the SQL
+        metrics are left out as SHS does, and each accumulator is encoded as a json string (the accumulator_updates
+        columns are arrays of strings).
+        :param accumulables: list of Accumulables (json) or None
+        :param fields: fields of the accumulators besides id and name ("update", "value")
+        :return: list of json strings
+        """
+        return [json.dumps(dict({'id': acc["ID"], 'name': acc.get("Name")},
+                                **{field: str(acc.get(field.capitalize())) for field in fields}))
+                for acc in accumulables or [] if not acc.get("Internal", False) and acc.get("Metadata") != "sql"]
+
+    @staticmethod
+    def get_task_metrics(metrics):
+        """
+        Convert the Task Metrics of an event into the taskMetrics json of SHS.
+        :param metrics: Task Metrics (json) or None
+        :return: taskMetrics json or None
+        """
+        if not metrics:
+            return None
+        shuffle_read = metrics.get("Shuffle Read Metrics", {})
+        shuffle_write = metrics.get("Shuffle Write Metrics", {})
+        return {
+            'executorDeserializeTime': metrics.get("Executor Deserialize Time", 0),
+            'executorDeserializeCpuTime': metrics.get("Executor Deserialize CPU Time", 0),
+            'executorRunTime': metrics.get("Executor Run Time", 0),
+            'executorCpuTime': metrics.get("Executor CPU Time", 0),
+            'resultSize': metrics.get("Result Size", 0),
+            'jvmGcTime': metrics.get("JVM GC Time", 0),
+            'resultSerializationTime': metrics.get("Result Serialization Time", 0),
+            'memoryBytesSpilled': metrics.get("Memory Bytes Spilled", 0),
+            'diskBytesSpilled': metrics.get("Disk Bytes Spilled", 0),
+            'peakExecutionMemory': metrics.get("Peak Execution Memory", 0),
+            'inputMetrics': {
+                'bytesRead': get_prop(metrics, "Input Metrics", "Bytes Read") or 0,
+                'recordsRead': get_prop(metrics, "Input Metrics", "Records Read") or 0
+            },
+            'outputMetrics': {
+                'bytesWritten': get_prop(metrics, "Output Metrics", "Bytes Written") or 0,
+                'recordsWritten': get_prop(metrics, "Output Metrics", "Records Written") or 0
+            },
+            'shuffleReadMetrics': {
+                'remoteBlocksFetched': shuffle_read.get("Remote Blocks Fetched", 0),
+                'localBlocksFetched': shuffle_read.get("Local Blocks Fetched", 0),
+                'fetchWaitTime': shuffle_read.get("Fetch Wait Time", 0),
+                'remoteBytesRead': shuffle_read.get("Remote Bytes Read", 0),
+                'remoteBytesReadToDisk': shuffle_read.get("Remote Bytes Read To Disk", 0),
+                'localBytesRead': shuffle_read.get("Local Bytes Read", 0),
+                'recordsRead': shuffle_read.get("Total Records Read", 0)
+            },
+            'shuffleWriteMetrics': {
+                'bytesWritten': shuffle_write.get("Shuffle Bytes Written", 0),
+                'writeTime': shuffle_write.get("Shuffle Write Time", 0),
+                'recordsWritten': shuffle_write.get("Shuffle Records Written", 0)
+            }
+        }
+
+    @staticmethod
+    def get_task_status(end_reason):
+        """
+        Get the task status and error message from the Task End Reason of an event.
+        :param end_reason: Task End Reason (json)
+        :return: tuple (status, error message or None)
+        """
+        reason = end_reason.get("Reason")
+        if reason == "Success":
+            return "SUCCESS", None
+        if reason == "TaskKilled":
+            return "KILLED", end_reason.get("Kill Reason")
+        return "FAILED", end_reason.get("Full Stack Trace") or end_reason.get("Description") or reason
+
+    def on_task_end(self, event):
+        """
+        Process the SparkListenerTaskEnd event.
+        :param event: event (json)
+        """
+        info = event["Task Info"]
+        stage_id, attempt_id = event["Stage ID"], event["Stage Attempt ID"]
+        status, error_message = self.get_task_status(event.get("Task End Reason", {}))
+        metrics = self.get_task_metrics(event.get("Task Metrics"))
+        duration = info["Finish Time"] - info["Launch Time"] if info.get("Finish Time") else 0
+
+        # aggregate the task into its stage attempt, executor and stage_executor, as SHS does
+        stage = self.stages.get((stage_id, attempt_id))
+        if stage is None:  # the stage attempt was not submitted in the log, e.g. a truncated log
+            stage_info = self.stage_infos.get(stage_id, {"Stage ID": stage_id, "Stage Name": "", "Number of Tasks": 0})
+            stage = self.get_stage(dict(stage_info, **{"Stage Attempt ID": attempt_id}))
+        launch_time = self.format_time(info["Launch Time"])
+        if stage['firstTaskLaunchedTime'] is None or launch_time < stage['firstTaskLaunchedTime']:
+            stage['firstTaskLaunchedTime'] = launch_time
+        executor = self.get_executor(info["Executor ID"], info["Launch Time"])
+        self.merge_peak_metrics(executor['peakMemoryMetrics'], event.get("Task Executor Metrics"))
+        stage_executor = self.get_stage_executor(stage_id, info["Executor ID"]) if attempt_id == 0 else {}
+
+        counter = {"SUCCESS": ('numCompleteTasks', 'succeededTasks'), "FAILED": ('numFailedTasks', 'failedTasks'),
+                   "KILLED": ('numKilledTasks', 'killedTasks')}[status]
+        stage[counter[0]] += 1
+        stage_executor[counter[1]] = stage_executor.get(counter[1], 0) + 1
+        stage_executor['taskTime'] = stage_executor.get('taskTime', 0) + duration
+        if status == "SUCCESS":
+            self.stage_indices[(stage_id, attempt_id)].add(info["Index"])
+            stage['numCompletedIndices'] = len(self.stage_indices[(stage_id, attempt_id)])
+            executor['completedTasks'] += 1
+        elif status == "FAILED":
+            executor['failedTasks'] += 1
+        executor['totalTasks'] += 1
+        executor['totalDuration'] += duration
+
+        if metrics is not None:
+            shuffle_read_bytes = metrics['shuffleReadMetrics']['remoteBytesRead'] + \
+                metrics['shuffleReadMetrics']['localBytesRead']
+            for target, key, value in [
+                (stage, 'executorRunTime', metrics['executorRunTime']),
+                (stage, 'executorCpuTime', metrics['executorCpuTime']),
+                (stage, 'inputBytes', metrics['inputMetrics']['bytesRead']),
+                (stage, 'inputRecords', metrics['inputMetrics']['recordsRead']),
+                (stage, 'outputBytes', metrics['outputMetrics']['bytesWritten']),
+                (stage, 'outputRecords', metrics['outputMetrics']['recordsWritten']),
+                (stage, 'shuffleReadBytes', shuffle_read_bytes),
+                (stage, 'shuffleReadRecords', metrics['shuffleReadMetrics']['recordsRead']),
+                (stage, 'shuffleWriteBytes', metrics['shuffleWriteMetrics']['bytesWritten']),
+                (stage, 'shuffleWriteRecords', metrics['shuffleWriteMetrics']['recordsWritten']),
+                (stage, 'memoryBytesSpilled', metrics['memoryBytesSpilled']),
+                (stage, 'diskBytesSpilled', metrics['diskBytesSpilled']),
+                (stage_executor, 'inputBytes', metrics['inputMetrics']['bytesRead']),
+                (stage_executor, 'inputRecords', metrics['inputMetrics']['recordsRead']),
+                (stage_executor, 'outputBytes', metrics['outputMetrics']['bytesWritten']),
+                (stage_executor, 'outputRecords', metrics['outputMetrics']['recordsWritten']),
+                (stage_executor, 'shuffleRead', shuffle_read_bytes),
+                (stage_executor, 'shuffleReadRecords', metrics['shuffleReadMetrics']['recordsRead']),
+                (stage_executor, 'shuffleWrite', metrics['shuffleWriteMetrics']['bytesWritten']),
+                (stage_executor, 'shuffleWriteRecords', metrics['shuffleWriteMetrics']['recordsWritten']),
+                (stage_executor, 'memoryBytesSpilled', metrics['memoryBytesSpilled']),
+                (stage_executor, 'diskBytesSpilled', metrics['diskBytesSpilled']),
+                (executor, 'totalGCTime', metrics['jvmGcTime']),
+                (executor, 'totalInputBytes', metrics['inputMetrics']['bytesRead']),
+                (executor, 'totalShuffleRead', shuffle_read_bytes),
+                (executor, 'totalShuffleWrite', metrics['shuffleWriteMetrics']['bytesWritten'])
+            ]:
+                target[key] = target.get(key, 0) + value
+
+        if attempt_id != 0:
+            return
+
+        getting_result_time = info["Finish Time"] - info["Getting Result Time"] \
+            if info.get("Getting Result Time") else 0
+        scheduler_delay = 0
+        if metrics is not None:
+            scheduler_delay = max(0, duration - metrics['executorRunTime'] - metrics['executorDeserializeTime'] -
+                                  metrics['resultSerializationTime'] - getting_result_time)
+        self.tasks.setdefault(stage_id, []).append({
+            'taskId': info["Task ID"],
+            'index': info["Index"],
+            'attempt': info["Attempt"],
+            'launchTime': launch_time,
+            'duration': duration,
+            'executorId': info["Executor ID"],
+            'host': info["Host"],
+            'status': status,
+            'errorMessage': error_message,
+            'taskLocality': info["Locality"],
+            'speculative': info["Speculative"],
+            'accumulatorUpdates': self.get_accumulator_updates(info.get("Accumulables"), ["update", "value"]),
+            'taskMetrics': metrics,
+            'schedulerDelay': scheduler_delay,
+            'gettingResultTime': getting_result_time
+        })
+
+    def get_stage_statistics(self, stage_id):
+        """
+        Compute the taskSummary json of the first attempt of a stage from its succeeded tasks, the same way as SHS
+        does (the value of the quantile q is the element at min(q * count, count - 1) of the sorted values).
+        :param stage_id: stage id
+        :return: taskSummary json or None if the stage has no succeeded tasks
+        """
+        tasks = [task for task in self.tasks.get(stage_id, []) if task['status'] == "SUCCESS" and task['taskMetrics']]
+        if not tasks:
+            return None
+
+        def quantiles(*prop_list):
+            return self.get_quantiles(get_prop(task, *prop_list) or 0 for task in tasks)
+
+        def sum_quantiles(*props):
+            return self.get_quantiles(sum(task['taskMetrics']['shuffleReadMetrics'][prop] for prop in props)
+                                      for task in tasks)
+
+        return {
+            'quantiles': self.QUANTILES,
+            'executorDeserializeTime': quantiles('taskMetrics', 'executorDeserializeTime'),
+            'executorDeserializeCpuTime': quantiles('taskMetrics', 'executorDeserializeCpuTime'),
+            'executorRunTime': quantiles('taskMetrics', 'executorRunTime'),
+            'executorCpuTime': quantiles('taskMetrics', 'executorCpuTime'),
+            'resultSize': quantiles('taskMetrics', 'resultSize'),
+            'jvmGcTime': quantiles('taskMetrics', 'jvmGcTime'),
+            'resultSerializationTime': quantiles('taskMetrics', 'resultSerializationTime'),
+            'gettingResultTime': quantiles('gettingResultTime'),
+            'schedulerDelay': quantiles('schedulerDelay'),
+            'peakExecutionMemory': quantiles('taskMetrics', 'peakExecutionMemory'),
+            'memoryBytesSpilled': quantiles('taskMetrics', 'memoryBytesSpilled'),
+            'diskBytesSpilled': quantiles('taskMetrics', 'diskBytesSpilled'),
+            'inputMetrics': {
+                'bytesRead': quantiles('taskMetrics', 'inputMetrics', 'bytesRead'),
+                'recordsRead': quantiles('taskMetrics', 'inputMetrics', 'recordsRead')
+            },
+            'outputMetrics': {
+                'bytesWritten': quantiles('taskMetrics', 'outputMetrics', 'bytesWritten'),
+                'recordsWritten': quantiles('taskMetrics', 'outputMetrics', 'recordsWritten')
+            },
+            'shuffleReadMetrics': {
+                'readBytes': sum_quantiles('remoteBytesRead', 'localBytesRead'),
+                'readRecords': quantiles('taskMetrics', 'shuffleReadMetrics', 'recordsRead'),
+                'remoteBlocksFetched': quantiles('taskMetrics', 'shuffleReadMetrics', 'remoteBlocksFetched'),
+                'localBlocksFetched': quantiles('taskMetrics', 'shuffleReadMetrics', 'localBlocksFetched'),
+                'fetchWaitTime': quantiles('taskMetrics', 'shuffleReadMetrics', 'fetchWaitTime'),
+                'remoteBytesRead': quantiles('taskMetrics', 'shuffleReadMetrics', 'remoteBytesRead'),
+                'remoteBytesReadToDisk': quantiles('taskMetrics', 'shuffleReadMetrics', 'remoteBytesReadToDisk'),
+                'totalBlocksFetched': sum_quantiles('remoteBlocksFetched', 'localBlocksFetched')
+            },
+            'shuffleWriteMetrics': {
+                'writeBytes': quantiles('taskMetrics', 'shuffleWriteMetrics', 'bytesWritten'),
+                'writeRecords': quantiles('taskMetrics', 'shuffleWriteMetrics', 'recordsWritten'),
+                'writeTime': quantiles('taskMetrics', 'shuffleWriteMetrics', 'writeTime')
+            }
+        }
+
+    def get_quantiles(self, values):
+        """
+        Get the quantiles of the values.
+        :param values: non-empty iterable of numbers
+        :return: list of the values at QUANTILES (floats)
+        """
+        values = sorted(values)
+        return [float(values[min(int(q * len(values)), len(values) - 1)]) for q in self.QUANTILES]
+
+    def get_jobs(self):
+        """
+        Complete the job jsons by the task and stage counts of their stages.
+        :return: list of job jsons
+        """
+        for job_id, job in self.jobs.items():
+            attempts = [stage for (stage_id, attempt_id), stage in self.stages.items()
+                        if stage_id in self.job_stages[job_id]]
+            submitted = {stage['stageId'] for stage in attempts}
+            skipped = [stage_id for stage_id in self.job_stages[job_id] if stage_id not in submitted]
+            job.update({
+                'numActiveTasks': 0,
+                'numCompletedTasks': sum(stage['numCompleteTasks'] for stage in attempts),
+                'numSkippedTasks': sum(get_prop(self.stage_infos, stage_id, "Number of Tasks") or 0
+                                       for stage_id in skipped),
+                'numFailedTasks': sum(stage['numFailedTasks'] for stage in attempts),
+                'numKilledTasks': sum(stage['numKilledTasks'] for stage in attempts),
+                'numCompletedIndices': sum(stage['numCompletedIndices'] for stage in attempts),
+                'numActiveStages': 0,
+                'numCompletedStages': len({stage['stageId'] for stage in attempts if stage['status'] == "COMPLETE"}),
+                'numSkippedStages': len(skipped),
+                'numFailedStages': len([stage for stage in attempts if stage['status'] == "FAILED"])
+            })
+        return list(self.jobs.values())
+
+    def get_stages(self):
+        """
+        Get the stage jsons of all the stage attempts, including the skipped stages (never submitted).
+        :return: list of stage jsons
+        """
+        stages = list(self.stages.values())
+        submitted = {stage_id for stage_id, attempt_id in self.stages}
+        for stage_id, stage_info in self.stage_infos.items():
+            if stage_id not in submitted:
+                stage = dict(self.get_stage(stage_info), status="SKIPPED", numTasks=stage_info["Number of Tasks"])
+                self.stages[(stage_id, stage_info["Stage Attempt ID"])] = stage
+                stages.append(stage)
+        return stages
+
+    def get_application_rows(self, task_limit, task_sampling=None):
+        """
+        Create the records of the application from the processed events.
+        :param task_limit: maximum number of the tasks (sorted by executor_run_time descending) per stage
+        :param task_sampling: dictionary of the TaskSampler arguments, or None for storing the top task_limit tasks
+        :raises ValueError: if the event log does not contain a finished application
+        :return: ApplicationRows object with the records of the application
+        """
+        if self.app is None or not self.app['attempts'][0]['completed']:
+            raise ValueError("The event log does not contain a finished application")
+
+        app_id = self.app['id']
+        self.app['mode'] = "cluster" if 'attemptId' in self.app['attempts'][0] else "client"
+        rows = ApplicationRows(self.app)
+        rows.level = "event_log"
+        rows.add(ApplicationEntity, ApplicationEntity.get_attributes(self.app, self.environment))
+
+        for executor in self.executors.values():
+            rows.add(ExecutorEntity, ExecutorEntity.get_attributes(app_id, executor))
+
+        stage_job_mapping = {}
+        for job in self.get_jobs():
+            rows.add(JobEntity, JobEntity.get_attributes(app_id, job))
+            for stage_id in job['stageIds']:
+                stage_job_mapping[f"{app_id}_{stage_id}"] = f"{app_id}_{job['jobId']}"
+
+        for stage in self.get_stages():
+            if stage['attemptId'] != 0:
+                continue
+            stage_id = stage['stageId']
+            stage_key = f"{app_id}_{stage_id}"
+            rows.add(StageEntity, StageEntity.get_attributes(app_id, stage, stage_job_mapping))
+
+            rows.add_tuples(StageExecutorEntity,
+                            [STAGE_EXECUTOR_EXTRACTOR.extract(stage_executor, stage_key, executor_id, app_id)
+                             for executor_id, stage_executor in self.stage_executors.get(stage_id, {}).items()])
+
+            stage_statistics = self.get_stage_statistics(stage_id)
+            if stage_statistics is not None:
+                rows.add(StageStatisticsEntity, StageStatisticsEntity.get_attributes(stage_key, stage_statistics))
+
+            if task_sampling is not None:
+                sampler = TaskSampler(stage_key, **task_sampling)
+                for task in self.tasks.get(stage_id, []):
+                    sampler.add(TASK_EXTRACTOR.extract(task, stage_key, app_id))
+                rows.add_tuples(TaskEntity, sampler.get_rows())
+                continue
+
+            tasks = sorted(self.tasks.get(stage_id, []),
+                           key=lambda task: get_prop(task, 'taskMetrics', 'executorRunTime') or 0, reverse=True)
+            rows.add_tuples(TaskEntity, [TASK_EXTRACTOR.extract(task, stage_key, app_id)
+                                         for task in tasks[:task_limit]])
+        return rows
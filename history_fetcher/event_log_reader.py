@@ -0,0 +1,196 @@
+import logging
+import os
+import re
+import struct
+
+# Set up logger
+logger = logging.getLogger(__name__)
+
+
+class EventLogReader:
+    """
+    A class responsible for finding Spark event logs in a directory and reading them line by line.
+
+    Both the single-file event logs (<app_id>[_<attempt_id>][.<codec>]) and the rolling event log directories
+    (eventlog_v2_<app_id>[_<attempt_id>] containing events_<index>_<app_id>[_<attempt_id>][.<codec>] files) are
+    supported. The files can be compressed by any of the codecs Spark uses for the event logs: lz4, zstd or snappy
+    (the latter requires the lz4, zstandard or python-snappy package respectively). The event logs of the
+    applications still in progress are skipped.
+    """
+    ROLLING_PREFIX = "eventlog_v2_"
+    IN_PROGRESS_SUFFIX = ".inprogress"
+    CODECS = ["lz4", "zstd", "snappy"]
+    CHUNK_SIZE = 1 << 20
+
+    # YARN application id followed by the attempt id, e.g. application_1600000000000_0001_1
+    YARN_ATTEMPT_PATTERN = re.compile(r"^(application_\d+_\d+)_(\d+)$")
+
+    LZ4_MAGIC = b"LZ4Block"
+    LZ4_METHOD_RAW = 0x10
+    SNAPPY_MAGIC = b"\x82SNAPPY\x00"
+
+    def __init__(self, path):
+        """
+        Create EventLogReader object
+        :param path: path of the event log file, or of the rolling event log directory
+        """
+        self.path = path
+        self.name = os.path.basename(path.rstrip(os.sep))
+        self.app_id, self.attempt_id = self.get_app_id_and_attempt(self.name)
+
+    @classmethod
+    def find_event_logs(cls, directory):
+        """
+        Find the event logs of the finished applications in a directory. If there are more attempts of the same
+        application, only the last one is returned (as History Server does).
+        :param directory: directory containing the event logs
+        :return: list of EventLogReader objects, sorted by application_id
+        """
+        readers = {}  # dict[app_id, EventLogReader]
+        for name in sorted(os.listdir(directory)):
+            path = os.path.join(directory, name)
+            if name.startswith(".") or name.endswith(cls.IN_PROGRESS_SUFFIX):
+                continue
+            if os.path.isdir(path) and (not name.startswith(cls.ROLLING_PREFIX) or cls.is_rolling_in_progress(path)):
+                continue
+
+            reader = cls(path)
+            previous = readers.get(reader.app_id)
+            if previous is None or (reader.attempt_id or 0) > (previous.attempt_id or 0):
+                readers[reader.app_id] = reader
+        return [readers[app_id] for app_id in sorted(readers)]
+
+    @classmethod
+    def is_rolling_in_progress(cls, path):
+        """
+        Check if a rolling event log directory belongs to an application still in progress.
+        :param path: path of the rolling event log directory
+        :return: True if the application has not finished yet
+        """
+        return any(name.startswith("appstatus_") and name.endswith(cls.IN_PROGRESS_SUFFIX)
+                   for name in os.listdir(path))
+
+    @classmethod
+    def get_app_id_and_attempt(cls, name):
+        """
+        Get application_id and attempt_id from the name of an event log.
+        :param name: name of the event log file or of the rolling event log directory
+        :return: tuple (application_id, attempt_id or None)
+        """
+        if name.startswith(cls.ROLLING_PREFIX):
+            name = name[len(cls.ROLLING_PREFIX):]
+        name, codec = cls.split_codec(name)
+
+        parse = cls.YARN_ATTEMPT_PATTERN.match(name)
+        if parse is not None:
+            return parse.group(1), int(parse.group(2))
+        return name, None
+
+    @classmethod
+    def split_codec(cls, name):
+        """
+        Split the codec extension from the name of an event log file.
+        :param name: file name
+        :return: tuple (name without the codec extension, codec or None)
+        """
+        root, extension = os.path.splitext(name)
+        if extension[1:] in cls.CODECS:
+            return root, extension[1:]
+        return name, None
+
+    def get_files(self):
+        """
+        Get the files of the event log in the order in which they should be read. A rolling event log is read from
+        its last compacted file (if any) on.
+        :return: list of file paths
+        """
+        if not os.path.isdir(self.path):
+            return [self.path]
+
+        events_files = []  # List[(index, name)]
+        for name in os.listdir(self.path):
+            if name.startswith("events_"):
+                events_files.append((int(name.split("_")[1]), name))
+        events_files.sort()
+
+        compacted = [i for i, (index, name) in enumerate(events_files) if name.endswith(".compact")]
+        if compacted:
+            events_files = events_files[compacted[-1]:]
+        return [os.path.join(self.path, name) for index, name in events_files]
+
+    def read_lines(self):
+        """
+        Read the event log line by line, decompressing it on the fly.
+        :return: generator of lines (bytes)
+        """
+        for path in self.get_files():
+            name, codec = self.split_codec(os.path.basename(path).replace(".compact", ""))
+            with open(path, "rb") as f:
+                if codec is None:
+                    yield from f
+                    continue
+
+                remainder = b""
+                for chunk in self.decompress(f, codec):
+                    lines = (remainder + chunk).split(b"\n")
+                    remainder = lines.pop()
+                    yield from lines
+                if remainder:
+                    yield remainder
+
+    def decompress(self, f, codec):
+        """
+        Decompress a file written by the given Spark compression codec.
+        :param f: file opened in the binary mode
+        :param codec: "lz4", "zstd" or "snappy"
+        :return: generator of the decompressed chunks (bytes)
+        """
+        if codec == "zstd":
+            import zstandard
+            reader = zstandard.ZstdDecompressor().stream_reader(f, read_across_frames=True)
+            return iter(lambda: reader.read(self.CHUNK_SIZE), b"")
+        if codec == "lz4":
+            return self.decompress_lz4_blocks(f)
+        return self.decompress_snappy_blocks(f)
+
+    def decompress_lz4_blocks(self, f):
+        """
+        Decompress the LZ4 block stream written by Spark (LZ4BlockOutputStream of lz4-java): each block has a header
+        with the magic, the compression method, the compressed and decompressed lengths and a checksum.
+        :param f: file opened in the binary mode
+        :return: generator of the decompressed blocks (bytes)
+        """
+        import lz4.block
+        header_size = len(self.LZ4_MAGIC) + 13
+        while True:
+            header = f.read(header_size)
+            if len(header) < header_size:
+                return
+            if not header.startswith(self.LZ4_MAGIC):
+                raise ValueError(f"Invalid lz4 block in {f.name}")
+
+            token = header[len(self.LZ4_MAGIC)]
+            compressed_length, decompressed_length, checksum = struct.unpack("<iii", header[len(self.LZ4_MAGIC) + 1:])
+            data = f.read(compressed_length)
+            if token & 0xF0 == self.LZ4_METHOD_RAW:
+                yield data
+            elif decompressed_length > 0:
+                yield lz4.block.decompress(data, uncompressed_size=decompressed_length)
+
+    def decompress_snappy_blocks(self, f):
+        """
+        Decompress the snappy stream written by Spark (SnappyOutputStream of snappy-java): a header with the magic and
+        the versions, followed by the compressed blocks prefixed by their length.
+        :param f: file opened in the binary mode
+        :return: generator of the decompressed blocks (bytes)
+        """
+        import snappy
+        header = f.read(len(self.SNAPPY_MAGIC) + 8)
+        if not header.startswith(self.SNAPPY_MAGIC):
+            raise ValueError(f"Invalid snappy stream in {f.name}")
+
+        while True:
+            length = f.read(4)
+            if len(length) < 4:
+                return
+            yield snappy.uncompress(f.read(struct.unpack(">i", length)[0]))
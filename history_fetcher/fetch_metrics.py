@@ -0,0 +1,241 @@
+import bisect
+import json
+import logging
+import os
+import re
+import threading
+import time
+from urllib.parse import urlsplit
+
+# Set up logger
+logger = logging.getLogger(__name__)
+
+
+def timed_call(function, *args):
+    """
+    Call a function and measure its duration. A module-level function, so that it can be executed in a process pool.
+    :param function: function to call
+    :param args: arguments of the function
+    :return: tuple (result of the function, duration in seconds)
+    """
+    start = time.perf_counter()
+    result = function(*args)
+    return result, time.perf_counter() - start
+
+
+class FetchMetrics:
+    """
+    A class collecting the metrics of History Fetcher per endpoint type of Spark History Server (SHS): the number of
+    requests and failed requests, a histogram of the response times, the received bytes, the time spent decoding the
+    responses, and the rows written into the database (and the time spent writing them) for the table filled by the
+    endpoint.
+
+    The metrics are cumulative since the DataFetcher was created. They are reported as a JSON summary and optionally
+    written in the Prometheus text format, e.g. for the textfile collector of node_exporter. The metrics of a History
+    Server source are labeled by its cluster.
+    """
+    ENDPOINTS = ["applications", "environment", "allexecutors", "sql", "jobs", "stages", "stage_detail", "taskSummary",
+                 "taskList", "other"]
+
+    # the endpoint type filling each table (stage_statistics and task only fall back to taskSummary and taskList if
+    # they are not included in the stage detail)
+    TABLE_ENDPOINTS = {
+        "application": "environment",
+        "executor": "allexecutors",
+        "sql_execution": "sql",
+        "sql_plan_node": "sql",
+        "job": "jobs",
+        "stage": "stages",
+        "stage_executor": "stage_detail",
+        "stage_statistics": "stage_detail",
+        "task": "stage_detail",
+    }
+
+    # upper bounds of the response time histogram buckets (in seconds)
+    LATENCY_BUCKETS = [0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0]
+
+    STAGE_DETAIL_PATTERN = re.compile(r"/stages/\d+/\d+$")
+
+    def __init__(self, cluster=None):
+        """
+        Create FetchMetrics object
+        :param cluster: name of the History Server source, added as a label of the metrics if set
+        """
+        self.cluster = cluster
+        self.start_time = time.time()
+        self.lock = threading.Lock()
+        self.metrics = {endpoint: self.get_empty_metrics() for endpoint in self.ENDPOINTS}
+
+    def get_empty_metrics(self):
+        """
+        Get the initial metrics of an endpoint type.
+        :return: dict (metric: value)
+        """
+        return {
+            'requests': 0,
+            'failed_requests': 0,
+            'latency_buckets': [0] * (len(self.LATENCY_BUCKETS) + 1),  # the last bucket is +Inf
+            'latency_seconds': 0.0,
+            'bytes_received': 0,
+            'decoded_responses': 0,
+            'decode_seconds': 0.0,
+            'rows_written': 0,
+            'write_seconds': 0.0,
+        }
+
+    @classmethod
+    def get_endpoint(cls, url):
+        """
+        Get the endpoint type of a URL.
+        :param url: URL of SHS REST API
+        :return: one of ENDPOINTS
+        """
+        path = urlsplit(url).path.rstrip("/")
+        endpoint = path.rsplit("/", 1)[-1]
+        if endpoint in cls.ENDPOINTS:
+            return endpoint
+        if cls.STAGE_DETAIL_PATTERN.search(path):
+            return "stage_detail"
+        return "other"
+
+    def observe_request(self, url, latency, size, failed=False):
+        """
+        Record a single request sent to SHS (each retry is a separate request).
+        :param url: URL of the request
+        :param latency: response time in seconds
+        :param size: size of the response body in bytes
+        :param failed: True if the request failed (server error, timeout, connection error)
+        """
+        bucket = bisect.bisect_left(self.LATENCY_BUCKETS, latency)
+        with self.lock:
+            metrics = self.metrics[self.get_endpoint(url)]
+            metrics['requests'] += 1
+            metrics['failed_requests'] += 1 if failed else 0
+            metrics['latency_buckets'][bucket] += 1
+            metrics['latency_seconds'] += latency
+            metrics['bytes_received'] += size
+
+    def observe_decode(self, url, duration):
+        """
+        Record the decoding (and the transformation) of a response.
+        :param url: URL of the request
+        :param duration: decoding time in seconds
+        """
+        with self.lock:
+            metrics = self.metrics[self.get_endpoint(url)]
+            metrics['decoded_responses'] += 1
+            metrics['decode_seconds'] += duration
+
+    def set_table_statistics(self, table_statistics):
+        """
+        Set the rows written into the database and the write time of the tables, assigned to the endpoint types which
+        fill the tables.
+        :param table_statistics: dict {table name: (rows written, write time in seconds)}
+        """
+        with self.lock:
+            for metrics in self.metrics.values():
+                metrics['rows_written'] = 0
+                metrics['write_seconds'] = 0.0
+            for table, (rows, write_time) in table_statistics.items():
+                metrics = self.metrics[self.TABLE_ENDPOINTS.get(table, "other")]
+                metrics['rows_written'] += rows
+                metrics['write_seconds'] += write_time
+
+    def get_summary(self):
+        """
+        Get the summary of the metrics, omitting the endpoint types without any activity.
+        :return: dict, serializable to json
+        """
+        elapsed = time.time() - self.start_time
+        endpoints = {}
+        with self.lock:
+            for endpoint, metrics in self.metrics.items():
+                if not metrics['requests'] and not metrics['decoded_responses'] and not metrics['rows_written']:
+                    continue
+                requests = metrics['requests']
+                endpoints[endpoint] = {
+                    'requests': requests,
+                    'failed_requests': metrics['failed_requests'],
+                    'latency_histogram': {
+                        str(bound): count for bound, count in zip(self.LATENCY_BUCKETS + ["+Inf"],
+                                                                  metrics['latency_buckets'])
+                    },
+                    'latency_avg_seconds': round(metrics['latency_seconds'] / requests, 6) if requests else None,
+                    'bytes_received': metrics['bytes_received'],
+                    'decode_seconds': round(metrics['decode_seconds'], 6),
+                    'rows_written': metrics['rows_written'],
+                    'write_seconds': round(metrics['write_seconds'], 6),
+                    'bytes_per_second': round(metrics['bytes_received'] / elapsed) if elapsed > 0 else None,
+                    'rows_per_second': round(metrics['rows_written'] / elapsed) if elapsed > 0 else None,
+                }
+        summary = {'elapsed_seconds': round(elapsed, 3), 'endpoints': endpoints}
+        return summary if self.cluster is None else dict(cluster=self.cluster, **summary)
+
+    def get_prometheus_text(self):
+        """
+        Get the metrics in the Prometheus text exposition format.
+        :return: str
+        """
+        counters = [
+            ("requests_total", "Requests sent to Spark History Server.", 'requests'),
+            ("failed_requests_total", "Failed requests (server errors, timeouts, connection errors).",
+             'failed_requests'),
+            ("response_bytes_total", "Bytes received from Spark History Server.", 'bytes_received'),
+            ("decode_seconds_total", "Time spent decoding the responses.", 'decode_seconds'),
+            ("rows_written_total", "Rows written into the database.", 'rows_written'),
+            ("write_seconds_total", "Time spent writing the rows into the database.", 'write_seconds'),
+        ]
+        lines = []
+        cluster_label = "" if self.cluster is None else f'cluster="{self.cluster}",'
+        with self.lock:
+            for name, description, key in counters:
+                lines.append(f"# HELP sparkscope_fetch_{name} {description}")
+                lines.append(f"# TYPE sparkscope_fetch_{name} counter")
+                for endpoint, metrics in self.metrics.items():
+                    lines.append(f'sparkscope_fetch_{name}{{{cluster_label}endpoint="{endpoint}"}} {metrics[key]}')
+
+            name = "sparkscope_fetch_request_duration_seconds"
+            lines.append(f"# HELP {name} Response time of Spark History Server.")
+            lines.append(f"# TYPE {name} histogram")
+            for endpoint, metrics in self.metrics.items():
+                cumulative = 0
+                for bound, count in zip(self.LATENCY_BUCKETS + ["+Inf"], metrics['latency_buckets']):
+                    cumulative += count
+                    lines.append(f'{name}_bucket{{{cluster_label}endpoint="{endpoint}",le="{bound}"}} {cumulative}')
+                lines.append(f'{name}_sum{{{cluster_label}endpoint="{endpoint}"}} {metrics["latency_seconds"]}')
+                lines.append(f'{name}_count{{{cluster_label}endpoint="{endpoint}"}} {metrics["requests"]}')
+
+        lines.append("# HELP sparkscope_fetch_last_run_timestamp_seconds Time of the last report of the metrics.")
+        lines.append("# TYPE sparkscope_fetch_last_run_timestamp_seconds gauge")
+        timestamp_labels = "" if self.cluster is None else f'{{cluster="{self.cluster}"}}'
+        lines.append(f"sparkscope_fetch_last_run_timestamp_seconds{timestamp_labels} {time.time():.3f}")
+        return "\n".join(lines) + "\n"
+
+    def report(self, summary_file=None, prometheus_file=None):
+        """
+        Log the JSON summary of the metrics, and write it (and the Prometheus metrics) into files if configured. The
+        files are replaced atomically, so that a collector never reads a partially written file.
+        :param summary_file: path of the JSON summary file, or None
+        :param prometheus_file: path of the Prometheus textfile (should end with .prom), or None
+        """
+        summary = json.dumps(self.get_summary())
+        logger.info(f"Fetch metrics: {summary}")
+        try:
+            if summary_file:
+                self.write_file(summary_file, summary + "\n")
+            if prometheus_file:
+                self.write_file(prometheus_file, self.get_prometheus_text())
+        except OSError as e:
+            logger.warning(f"Could not write the fetch metrics: {e}")
+
+    @staticmethod
+    def write_file(path, content):
+        """
+        Write a file atomically (write a temporary file and rename it).
+        :param path: file path
+        :param content: str
+        """
+        temp_path = f"{path}.{os.getpid()}.tmp"
+        with open(temp_path, "w") as f:
+            f.write(content)
+        os.replace(temp_path, path)
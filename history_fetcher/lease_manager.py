@@ -0,0 +1,145 @@
+import datetime
+import logging
+import threading
+
+from sqlalchemy import and_, func, or_
+from sqlalchemy.dialects.postgresql import insert
+
+from db.entities.fetch_state import FetchStateEntity
+
+# Set up logger
+logger = logging.getLogger(__name__)
+
+
+class LeaseManager:
+    """
+    A class responsible for sharing the applications between several History Fetcher workers (processes on one or more
+    hosts) through the leases in the fetch_state table.
+
+    Every worker registers the new applications found in SHS as pending (the applications registered by another worker
+    are skipped). The workers then claim the pending applications one by one using SELECT ... FOR UPDATE SKIP LOCKED, so
+    that no application is claimed by two workers at once. A claimed application is leased to the worker for
+    lease_duration seconds, and the lease is extended by a heartbeat thread while the worker is alive. The applications
+    whose lease expired (e.g. after a crash of their worker) can be claimed by any worker again. Only the applications
+    of the cluster (History Server source) of the LeaseManager are claimed.
+    """
+    def __init__(self, db_session, worker_id, lease_duration, heartbeat_interval, cluster=None):
+        """
+        Create LeaseManager object
+        :param db_session: database session used for claiming the applications
+        :param worker_id: unique id of the worker
+        :param lease_duration: duration of a lease (in seconds)
+        :param heartbeat_interval: interval of extending the leases (in seconds), should be well below lease_duration
+        :param cluster: name of the History Server source whose applications are claimed
+        """
+        self.db_session = db_session
+        self.worker_id = worker_id
+        self.cluster = cluster
+        self.lease_duration = datetime.timedelta(seconds=lease_duration)
+        self.heartbeat_interval = heartbeat_interval
+        self.stop_event = threading.Event()
+        self.heartbeat_thread = threading.Thread(target=self.run_heartbeat, name="lease-heartbeat", daemon=True)
+        self.heartbeat_thread.start()
+        logger.info(f"Running as worker {self.worker_id}.")
+
+    def register_applications(self, app_data):
+        """
+        Register the applications as pending, unless they are already registered (e.g. by another worker).
+        :param app_data: list of application data (json)
+        :return: number of the newly registered applications
+        """
+        registered = 0
+        for app in app_data:
+            attributes = FetchStateEntity.get_attributes(app, FetchStateEntity.PENDING)
+            statement = insert(FetchStateEntity.__table__).values(**attributes).on_conflict_do_nothing()
+            registered += self.db_session.execute(statement).rowcount
+        self.db_session.commit()
+        return registered
+
+    def reset_failed(self):
+        """
+        Make the failed (quarantined) applications pending again, so that they can be claimed by any worker.
+        """
+        reset = self.db_session.query(FetchStateEntity) \
+                               .filter(FetchStateEntity.cluster == self.cluster) \
+                               .filter(FetchStateEntity.status == FetchStateEntity.FAILED) \
+                               .update({FetchStateEntity.status: FetchStateEntity.PENDING}, synchronize_session=False)
+        self.db_session.commit()
+        logger.info(f"{reset} failed applications made pending again.")
+
+    def claim_application(self):
+        """
+        Claim the oldest pending application, or an application whose lease expired, and lease it to this worker.
+        The rows locked by the other workers are skipped.
+        :return: application data (json), or None if there is no application to claim
+        """
+        lease_expired = or_(FetchStateEntity.lease_expires_at.is_(None), FetchStateEntity.lease_expires_at < func.now())
+        state = self.db_session.query(FetchStateEntity) \
+                               .filter(FetchStateEntity.cluster == self.cluster) \
+                               .filter(or_(FetchStateEntity.status == FetchStateEntity.PENDING,
+                                           and_(FetchStateEntity.status == FetchStateEntity.IN_PROGRESS,
+                                                lease_expired))) \
+                               .order_by(FetchStateEntity.end_time) \
+                               .with_for_update(skip_locked=True) \
+                               .first()
+        if state is None:
+            self.db_session.commit()
+            return None
+
+        if state.status == FetchStateEntity.IN_PROGRESS:
+            logger.info(f"Lease of application {state.app_id} (worker {state.worker_id}) expired, claiming it.")
+        app = state.app_summary
+        state.status = FetchStateEntity.IN_PROGRESS
+        state.worker_id = self.worker_id
+        state.lease_expires_at = func.now() + self.lease_duration
+        self.db_session.commit()
+        return app
+
+    def holds_lease(self, app_id, db_session=None):
+        """
+        Check if this worker still holds the lease of the application. The fetch_state record is locked until the end
+        of the current transaction, so that the lease cannot be claimed by another worker before the application is
+        committed.
+        :param app_id: application_id
+        :param db_session: database session of the transaction writing the application, the claiming session by
+        default
+        :return: True if the application is leased to this worker
+        """
+        db_session = db_session or self.db_session
+        state = db_session.query(FetchStateEntity) \
+                          .filter(FetchStateEntity.app_id == app_id) \
+                          .with_for_update() \
+                          .first()
+        return state is not None and state.status == FetchStateEntity.IN_PROGRESS and state.worker_id == self.worker_id
+
+    def heartbeat(self):
+        """
+        Extend the leases of all the applications being fetched by this worker.
+        :return: number of the extended leases
+        """
+        table = FetchStateEntity.__table__
+        statement = table.update() \
+                         .where(and_(table.c.worker_id == self.worker_id,
+                                     table.c.status == FetchStateEntity.IN_PROGRESS)) \
+                         .values(lease_expires_at=func.now() + self.lease_duration)
+        # a separate connection, the session is used by the main thread
+        with self.db_session.get_bind().begin() as connection:
+            return connection.execute(statement).rowcount
+
+    def run_heartbeat(self):
+        """
+        Extend the leases every heartbeat_interval seconds, until stopped. Executed in the heartbeat thread.
+        """
+        while not self.stop_event.wait(self.heartbeat_interval):
+            try:
+                extended = self.heartbeat()
+                logger.debug(f"Extended {extended} leases.")
+            except Exception as ex:
+                logger.warning(f"Could not extend the leases: {ex}")
+
+    def stop(self):
+        """
+        Stop the heartbeat thread.
+        """
+        self.stop_event.set()
+        self.heartbeat_thread.join()
@@ -1,9 +1,13 @@
+from concurrent.futures import ThreadPoolExecutor
+
 from db.base import Session, engine, Base
 from history_fetcher.data_fetcher import DataFetcher
 import time
 import logging.config
 import argparse
+import datetime
 import os
+import signal
 from logger.logger import SparkscopeLogger
 
 # Set up logger
@@ -19,22 +23,168 @@ arg_parser = argparse.ArgumentParser()
 arg_parser.add_argument("--test-mode", action="store_true", help="fetch some defined number of apps from the history "
                                                                  "server, regardless of what has been processed before")
 arg_parser.add_argument("--truncate", action="store_true", help="truncate the database before fetching new data")
+arg_parser.add_argument("--resume", action="store_true", help="fetch also the applications left unfinished by the "
+                                                              "previous runs")
+arg_parser.add_argument("--replay", action="store_true", help="read the History Server responses from the response "
+                                                              "cache instead of the network")
+arg_parser.add_argument("--event-log-dir", metavar="DIR", help="read the applications from the Spark event logs in DIR "
+                                                                "instead of the History Server")
+arg_parser.add_argument("--retry-failed", action="store_true", help="fetch again the applications which failed "
+                                                                    "(were quarantined) in the previous runs")
+arg_parser.add_argument("--daemon", action="store_true", help="keep running and poll the History Server for new "
+                                                              "applications, until terminated by SIGTERM or SIGINT")
+arg_parser.add_argument("--refetch", metavar="APP_ID", nargs="+", help="fetch again the given applications, updating "
+                                                                        "their records in the database")
+arg_parser.add_argument("--refetch-range", metavar=("FROM", "TO"), nargs=2, help="fetch again the applications which "
+                                                                                 "ended between FROM and TO (e.g. "
+                                                                                 "2020-01-01 2020-01-31), updating "
+                                                                                 "their records in the database")
+arg_parser.add_argument("--backfill", metavar=("FROM", "TO"), nargs=2, type=datetime.datetime.fromisoformat,
+                        help="fetch the applications which ended between FROM and TO (e.g. 2020-01-01 2020-07-01) "
+                             "window by window, resuming the windows left unfinished by the previous runs")
+arg_parser.add_argument("--incremental", action="store_true", help="fetch also the running applications, fetching "
+                                                                   "only the data changed since the previous poll")
+arg_parser.add_argument("--sharded", action="store_true", help="run as one of several workers sharing the "
+                                                               "applications through the leases in the database")
+arg_parser.add_argument("--source", metavar="NAME", nargs="+", help="fetch only from the given History Server sources "
+                                                                    "(all the configured sources by default)")
 args = arg_parser.parse_args()
+if args.sharded and args.event_log_dir:
+    arg_parser.error("--sharded cannot be combined with --event-log-dir")
+if (args.refetch or args.refetch_range) and (args.sharded or args.daemon or args.event_log_dir):
+    arg_parser.error("--refetch and --refetch-range cannot be combined with --sharded, --daemon or --event-log-dir")
+if args.backfill and (args.sharded or args.daemon or args.event_log_dir or args.refetch or args.refetch_range):
+    arg_parser.error("--backfill cannot be combined with --sharded, --daemon, --event-log-dir, --refetch or "
+                     "--refetch-range")
+if args.incremental and (args.sharded or args.replay or args.event_log_dir or args.refetch or args.refetch_range or
+                         args.backfill):
+    arg_parser.error("--incremental cannot be combined with --sharded, --replay, --event-log-dir, --refetch, "
+                     "--refetch-range or --backfill")
+if args.backfill and args.backfill[0] >= args.backfill[1]:
+    arg_parser.error("--backfill FROM must be earlier than TO")
+
+# the event logs do not come from any History Server source
+sources = [] if args.event_log_dir else DataFetcher.get_source_names()
+if args.source:
+    if args.event_log_dir:
+        arg_parser.error("--source cannot be combined with --event-log-dir")
+    unknown_sources = [source for source in args.source if source not in sources]
+    if unknown_sources:
+        arg_parser.error(f"unknown sources {unknown_sources}, configured sources: {sources}")
+    sources = args.source
+if args.refetch and sources:
+    # each application belongs to a single source, by the app_id_prefix of the source
+    for app_id in args.refetch:
+        try:
+            app_source = DataFetcher.get_app_id_source(app_id)
+        except ValueError as e:
+            arg_parser.error(str(e))
+        if app_source not in sources:
+            arg_parser.error(f"application {app_id} belongs to the source {app_source}, not to any of the sources "
+                             f"{sources}")
 
 if args.truncate:
-    session.execute('''TRUNCATE TABLE application CASCADE''')
+    session.execute('''TRUNCATE TABLE application, fetch_state, backfill_window CASCADE''')
     logger.info("Truncated the database")
     session.commit()
 
 start = time.time()
 
-data_fetcher = DataFetcher(session, test_mode=args.test_mode)
+# one DataFetcher (with its own pools, database session and time filter) per History Server source
+data_fetchers = [DataFetcher(Session(), test_mode=args.test_mode, replay=args.replay, sharded=args.sharded,
+                             incremental=args.incremental, source=source) for source in sources or [None]]
+
+
+def stop(signum, frame):
+    """
+    Signal handler: let the applications in progress finish, then exit.
+    """
+    logger.info(f"Received signal {signum}, stopping after the applications in progress are finished.")
+    for data_fetcher in data_fetchers:
+        data_fetcher.stop()
+
+
+def run_all(function):
+    """
+    Run a function with each DataFetcher, concurrently if several History Server sources are fetched.
+    :param function: function taking a DataFetcher and returning a list of the stored application_id's
+    :return: list of the stored application_id's of all the sources
+    """
+    if len(data_fetchers) == 1:
+        return function(data_fetchers[0])
+    with ThreadPoolExecutor(max_workers=len(data_fetchers), thread_name_prefix="source") as source_pool:
+        return [app_id for app_ids in source_pool.map(function, data_fetchers) for app_id in app_ids]
+
+
+def fetch(data_fetcher):
+    """
+    Fetch the applications of a single source, in the mode given by the arguments.
+    :param data_fetcher: DataFetcher of the source
+    :return: list of the stored application_id's
+    """
+    if args.backfill:
+        app_ids = data_fetcher.fetch_backfill(args.backfill[0], args.backfill[1], retry_failed=args.retry_failed)
+    elif args.refetch:
+        app_ids = data_fetcher.refetch_applications(app_ids=args.refetch)
+    elif args.refetch_range:
+        app_ids = data_fetcher.refetch_applications(min_end_date=args.refetch_range[0],
+                                                    max_end_date=args.refetch_range[1])
+    elif args.event_log_dir:
+        app_ids = data_fetcher.fetch_event_logs(args.event_log_dir, resume=args.resume,
+                                                retry_failed=args.retry_failed)
+    else:
+        app_ids = data_fetcher.fetch_all_data(resume=args.resume, retry_failed=args.retry_failed)
+    data_fetcher.db_session.commit()
+    return app_ids
+
+
+def run_daemon(data_fetcher):
+    """
+    Poll History Server for the new applications until stopped. The pools, the connections and the in-memory state of
+    DataFetcher are kept between the polls. The poll interval doubles (up to max_poll_interval) after each poll which
+    found no new applications, and is reset to poll_interval once new applications are found.
+    :param data_fetcher: DataFetcher of the source
+    :return: empty list, the applications are reported by each poll
+    """
+    session = data_fetcher.db_session
+    poll_interval = data_fetcher.config.getfloat('daemon', 'poll_interval', fallback=10)
+    max_poll_interval = data_fetcher.config.getfloat('daemon', 'max_poll_interval', fallback=300)
+    interval = poll_interval
+    first_poll = True
+    while not data_fetcher.is_stopped():
+        try:
+            # the applications left unfinished by the previous runs are picked up by the first poll
+            app_ids = data_fetcher.fetch_all_data(resume=first_poll,
+                                                  retry_failed=first_poll and args.retry_failed)
+            session.commit()
+            logger.info(f"Poll of cluster {data_fetcher.cluster} finished: saved {len(app_ids)} applications.")
+        except Exception as ex:
+            logger.exception(f"Caught an exception: {ex}")
+            session.rollback()
+            app_ids = []
+        first_poll = False
+
+        interval = poll_interval if app_ids else min(interval * 2, max_poll_interval)
+        if not data_fetcher.is_stopped():
+            logger.debug(f"Next poll in {interval:.0f} seconds.")
+            data_fetcher.wait(interval)
+    logger.info("Daemon stopped.")
+    return []
+
 
 try:
-    app_ids = data_fetcher.fetch_all_data()
-    session.commit()
-    end = time.time()
-    logger.info(f"""
+    if args.daemon:
+        signal.signal(signal.SIGTERM, stop)
+        signal.signal(signal.SIGINT, stop)
+        run_all(run_daemon)
+    else:
+        if args.backfill:
+            # an interrupted backfill is resumed by running it again
+            signal.signal(signal.SIGTERM, stop)
+            signal.signal(signal.SIGINT, stop)
+        app_ids = run_all(fetch)
+        end = time.time()
+        logger.info(f"""
     ====================================================================================================================
     Finished: Saved {len(app_ids)} applications metadata into database.
     List of the application_id's: {app_ids}
@@ -43,8 +193,12 @@ try:
     """)
 except Exception as ex:
     logger.exception(f"Caught an exception: {ex}")
-    session.rollback()
+    for data_fetcher in data_fetchers:
+        data_fetcher.db_session.rollback()
 finally:
+    for data_fetcher in data_fetchers:
+        data_fetcher.close()
+        data_fetcher.db_session.close()
     session.close()
 
 
@@ -0,0 +1,134 @@
+import logging
+import math
+
+# Set up logger
+logger = logging.getLogger(__name__)
+
+
+class RequestPlanner:
+    """
+    A class responsible for planning the per-stage requests (stage detail, and the task summary and the task list if
+    needed) from the already fetched stage list.
+
+    The stages which did not run any task (skipped stages, or stages which never launched a task) are pruned, as their
+    per-stage endpoints contain no data. The cost of the requests of a stage is estimated by its number of tasks (the
+    tasks make up most of the stage detail and of the task list), and the stages are scheduled largest-first, so that
+    a huge stage does not start last and stretch the tail of the fetching (longest processing time first).
+
+    The requests avoided by the pruning are counted as the requests which would have been sent for the pruned stages:
+    the stage detail (carrying the stage executors, the task summary and the tasks), and the fallback requests of the
+    task summary and of the pages of the task list only if the History Server does not include them in the stage
+    detail (as found from the details of the planned stages, see set_fallbacks).
+    """
+    def __init__(self, task_limit=2147483647, task_page_size=1000):
+        """
+        Create RequestPlanner object
+        :param task_limit: maximum number of the tasks per stage which are fetched
+        :param task_page_size: number of the tasks per page of the task list
+        """
+        self.task_limit = task_limit
+        self.task_page_size = max(task_page_size, 1)
+        self.costs = {}  # dict[(app_id, stage_id), cost]
+        self.task_counts = {}  # dict[(app_id, stage_id), number of tasks]
+        self.skipped_count = 0
+        self.without_tasks_count = 0
+        self.pruned_task_counts = []  # List[number of tasks of a pruned stage]
+        self.statistics_fallback = False  # True if the task summary is requested separately from the stage detail
+        self.task_fallback = False  # True if the task list is requested separately from the stage detail
+
+    @staticmethod
+    def get_launched_tasks(stage):
+        """
+        Get the number of the tasks launched by a stage attempt (including the failed, killed and running ones).
+        :param stage: stage data (json), as returned by the stages endpoint
+        :return: number of the launched tasks
+        """
+        return sum(stage.get(key) or 0 for key in ['numActiveTasks', 'numCompleteTasks', 'numFailedTasks',
+                                                   'numKilledTasks'])
+
+    def add_stage(self, app_id, stage):
+        """
+        Plan the requests of a stage (attempt 0), unless they can be pruned.
+        :param app_id: application_id
+        :param stage: stage data (json), as returned by the stages endpoint
+        :return: True if the requests of the stage are planned, False if they are pruned
+        """
+        if stage['status'] == "SKIPPED":
+            self.skipped_count += 1
+            self.pruned_task_counts.append(stage['numTasks'])
+            return False
+        launched_tasks = self.get_launched_tasks(stage)
+        if launched_tasks == 0:
+            self.without_tasks_count += 1
+            self.pruned_task_counts.append(stage['numTasks'])
+            return False
+
+        self.costs[(app_id, stage['stageId'])] = launched_tasks
+        self.task_counts[(app_id, stage['stageId'])] = stage['numTasks']
+        return True
+
+    def set_fallbacks(self, statistics_fallback, task_fallback):
+        """
+        Record which fallback requests the History Server needs, as found from the details of the planned stages.
+        :param statistics_fallback: True if the stage details do not include the task summary
+        :param task_fallback: True if the stage details do not include the tasks
+        """
+        self.statistics_fallback = statistics_fallback
+        self.task_fallback = task_fallback
+
+    def get_request_count(self, task_count):
+        """
+        Get the number of the per-stage requests of a stage: the stage detail, and the task summary and the pages of
+        the task list (at least one page, as the task list is requested even for a stage without tasks) if they are
+        requested as fallbacks.
+        :param task_count: number of the tasks of the stage
+        :return: number of the requests
+        """
+        request_count = 1
+        if self.statistics_fallback:
+            request_count += 1
+        if self.task_fallback:
+            planned_tasks = min(max(task_count or 0, 1), self.task_limit)
+            request_count += math.ceil(planned_tasks / self.task_page_size)
+        return request_count
+
+    def get_avoided_request_count(self):
+        """
+        Get the number of the per-stage requests avoided by the pruning.
+        :return: number of the requests which would have been sent for the pruned stages
+        """
+        return sum(self.get_request_count(task_count) for task_count in self.pruned_task_counts)
+
+    def get_stages(self, stages=None):
+        """
+        Get the planned stages, largest first.
+        :param stages: optional iterable of (app_id, stage_id) restricting the result (e.g. the stages whose data is
+        still missing), all the planned stages by default
+        :return: list of tuples (app_id, stage_id), sorted by the estimated cost descending
+        """
+        stages = self.costs.keys() if stages is None else [stage for stage in stages if stage in self.costs]
+        return sorted(stages, key=lambda stage: self.costs[stage], reverse=True)
+
+    def get_task_count(self, app_id, stage_id):
+        """
+        Get the number of the tasks of a planned stage.
+        :param app_id: application_id
+        :param stage_id: stage_id
+        :return: number of the tasks
+        """
+        return self.task_counts.get((app_id, stage_id), 0)
+
+    def get_pruned_count(self):
+        """
+        Get the number of the pruned stages.
+        :return: number of the stages whose requests were not planned
+        """
+        return self.skipped_count + self.without_tasks_count
+
+    def log_statistics(self):
+        """
+        Log the number of the planned and of the pruned stages, and the number of the requests avoided by the pruning.
+        """
+        logger.debug(f"Planned the requests of {len(self.costs)} stages, {self.get_pruned_count()} stages pruned "
+                     f"({self.skipped_count} skipped, {self.without_tasks_count} without tasks), "
+                     f"{self.get_avoided_request_count()} requests avoided.")
@@ -0,0 +1,85 @@
+import gzip
+import hashlib
+import logging
+import os
+import threading
+
+from logger.logger import SparkscopeLogger
+
+# Set up logger
+logger = logging.getLogger(__name__)
+
+
+class ResponseCache:
+    """
+    An on-disk cache of the raw responses of Spark History Server (SHS), keyed by URL.
+
+    Each response body is stored gzip-compressed in a directory sharded by the first two characters of the SHA-1 hash
+    of the URL (e.g. <cache_dir>/3f/3fa4...e1.json.gz). The URLs of all the stored responses are listed in the
+    index.tsv file, so that the cache can be browsed without knowing the URLs in advance.
+    """
+    INDEX_FILE = "index.tsv"
+
+    def __init__(self, cache_dir):
+        """
+        Create ResponseCache object
+        :param cache_dir: directory where the responses are stored
+        """
+        self.cache_dir = cache_dir
+        os.makedirs(self.cache_dir, exist_ok=True)
+        self.index_lock = threading.Lock()
+
+    def get_path(self, url):
+        """
+        Get the path of the file holding the response of the given URL.
+        :param url: URL
+        :return: file path
+        """
+        url_hash = hashlib.sha1(url.encode("utf-8")).hexdigest()
+        return os.path.join(self.cache_dir, url_hash[:2], f"{url_hash}.json.gz")
+
+    def store(self, url, body):
+        """
+        Store the response body of the given URL, replacing the previous one.
+        :param url: URL
+        :param body: response body (bytes)
+        """
+        path = self.get_path(url)
+        is_new = not os.path.exists(path)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+
+        # write into a temporary file first, so that an interrupted run never leaves a truncated response behind
+        tmp_path = f"{path}.{threading.get_ident()}.tmp"
+        with gzip.open(tmp_path, "wb", compresslevel=6) as f:
+            f.write(body)
+        os.replace(tmp_path, path)
+
+        if is_new:
+            with self.index_lock:
+                with open(os.path.join(self.cache_dir, self.INDEX_FILE), "a") as index:
+                    index.write(f"{os.path.basename(path)[:-8]}\t{url}\n")
+
+    def load(self, url):
+        """
+        Load the response body of the given URL.
+        :param url: URL
+        :return: response body (bytes) or None if the response is not cached
+        """
+        try:
+            with gzip.open(self.get_path(url), "rb") as f:
+                return f.read()
+        except FileNotFoundError:
+            logger.warning(f"Response of {url} not found in the cache.")
+            return None
+
+    def get_urls(self):
+        """
+        Get the URLs of all the cached responses.
+        :return: list of URLs
+        """
+        try:
+            with open(os.path.join(self.cache_dir, self.INDEX_FILE)) as index:
+                urls = [line.rstrip("\n").split("\t", 1)[1] for line in index if "\t" in line]
+                return list(dict.fromkeys(urls))
+        except FileNotFoundError:
+            return []
@@ -0,0 +1,44 @@
+import random
+
+
+class RetryPolicy:
+    """
+    A policy for retrying the failed requests to Spark History Server (SHS), using an exponential backoff with full
+    jitter: the n-th retry waits a random time between 0 and min(max_backoff, backoff * 2^n) seconds, so that the
+    requests failed by the same overload are not retried all at once.
+    """
+    def __init__(self, max_retries, backoff, max_backoff):
+        """
+        Create RetryPolicy object
+        :param max_retries: maximum number of retries per URL
+        :param backoff: base of the backoff (in seconds)
+        :param max_backoff: maximum backoff (in seconds)
+        """
+        self.max_retries = max(max_retries, 0)
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+
+    @staticmethod
+    def is_retryable_status(status):
+        """
+        Check if a response with the given HTTP status should be retried (server errors and throttling).
+        :param status: HTTP status code
+        :return: True if the request should be retried
+        """
+        return status >= 500 or status == 429
+
+    def can_retry(self, attempt):
+        """
+        Check if another attempt is allowed.
+        :param attempt: number of the failed attempt, starting from 0
+        :return: True if the request can be retried
+        """
+        return attempt < self.max_retries
+
+    def get_delay(self, attempt):
+        """
+        Get the time to wait before the next attempt.
+        :param attempt: number of the failed attempt, starting from 0
+        :return: delay in seconds
+        """
+        return random.uniform(0, min(self.max_backoff, self.backoff * 2 ** attempt))
@@ -0,0 +1,132 @@
+import types
+
+
+class Field:
+    """
+    A required value of the json, given by its path (e.g. Field('taskMetrics', 'executorRunTime')). Missing value
+    raises KeyError, as the json is not valid then.
+    """
+    def __init__(self, *path):
+        self.path = path
+
+
+class OptionalField(Field):
+    """
+    An optional value of the json, given by its path. None if any of the keys of the path is missing (or null), the
+    same as get_prop.
+    """
+
+
+class Arg:
+    """
+    An argument of the extractor (e.g. Arg('app_id')).
+    """
+    def __init__(self, name):
+        self.name = name
+
+
+class Const:
+    """
+    A constant value.
+    """
+    def __init__(self, value):
+        self.value = value
+
+
+class Key:
+    """
+    A key composed of several parts joined by an underscore (e.g. Key(Arg('app_id'), Field('id')) for
+    <app_id>_<executor id>).
+    """
+    def __init__(self, *parts):
+        self.parts = parts
+
+
+class RowExtractor:
+    """
+    A class responsible for turning the json of SHS into the row tuples of a table, in the order of the table columns
+    (the same order as BulkWriter uses).
+
+    The extractor is declared by a field mapping {column: Field / OptionalField / Arg / Const / Key}, and compiled
+    once into a single Python function, which reads each nested object of the json once and builds the tuple directly,
+    without the intermediate attribute dict and without the recursive get_prop calls. The columns not included in the
+    mapping are NULL.
+    """
+    # the replacement of a missing nested object, read-only as it is shared by all the rows
+    EMPTY = types.MappingProxyType({})
+
+    def __init__(self, entity, fields, args):
+        """
+        Create RowExtractor object and compile the extractor function
+        :param entity: entity class (e.g. TaskEntity)
+        :param fields: dict {column: field}, the field mapping
+        :param args: list of the names of the arguments of the extractor (following the json)
+        :raises ValueError: if the mapping contains an unknown column or argument
+        """
+        self.columns = [column.name for column in entity.__table__.columns]
+        unknown_columns = set(fields) - set(self.columns)
+        if unknown_columns:
+            raise ValueError(f"Unknown columns of {entity.__tablename__}: {sorted(unknown_columns)}")
+        self.args = list(args)
+        self.constants = {}
+        self.variables = {}  # dict[path of a nested object, (variable name, statement)]
+
+        expressions = [self.get_expression(fields[column]) if column in fields else "None" for column in self.columns]
+        statements = [statement for name, statement in self.variables.values()]
+        self.source = "\n".join([f"def extract(obj, {', '.join(self.args)}):"] +
+                                [f"    {statement}" for statement in statements] +
+                                ["    return ("] +
+                                [f"        {expression}," for expression in expressions] +
+                                ["    )"])
+
+        namespace = dict(self.constants, _EMPTY=self.EMPTY)
+        exec(compile(self.source, f"<{entity.__tablename__} extractor>", "exec"), namespace)
+        self.extract = namespace['extract']
+
+    def get_expression(self, field):
+        """
+        Get the Python expression of a field.
+        :param field: Field, OptionalField, Arg, Const or Key
+        :raises ValueError: if the field is not valid
+        :return: str
+        """
+        if isinstance(field, OptionalField):
+            return f"{self.get_variable(field.path[:-1])}.get({field.path[-1]!r})"
+        if isinstance(field, Field):
+            return "obj" + "".join(f"[{key!r}]" for key in field.path)
+        if isinstance(field, Arg):
+            if field.name not in self.args:
+                raise ValueError(f"Unknown argument: {field.name}")
+            return field.name
+        if isinstance(field, Const):
+            name = f"_const{len(self.constants)}"
+            self.constants[name] = field.value
+            return name
+        if isinstance(field, Key):
+            parts = [self.get_expression(part) for part in field.parts]
+            return f"'{'_'.join(['%s'] * len(parts))}' % ({', '.join(parts)},)"
+        raise ValueError(f"Unsupported field: {field}")
+
+    def get_variable(self, path):
+        """
+        Get the variable holding a nested object of the json (read once per row), or an empty mapping if it is
+        missing.
+        :param path: tuple of the keys of the nested object, empty for the json itself
+        :return: name of the variable
+        """
+        if not path:
+            return "obj"
+        if path not in self.variables:
+            parent = self.get_variable(path[:-1])
+            name = f"_obj{len(self.variables)}"
+            self.variables[path] = (name, f"{name} = {parent}.get({path[-1]!r}) or _EMPTY")
+        return self.variables[path][0]
+
+    def get_attributes(self, obj, *args):
+        """
+        Extract a row as a key-value dict.
+        :param obj: json
+        :param args: arguments of the extractor
+        :return: dict (column: value)
+        """
+        return dict(zip(self.columns, self.extract(obj, *args)))
@@ -0,0 +1,72 @@
+import json
+
+from db.entities.stage_executor import STAGE_EXECUTOR_EXTRACTOR
+from db.entities.stage_statistics import StageStatisticsEntity
+from db.entities.task import TASK_EXTRACTOR
+from history_fetcher.utils import get_prop
+
+# orjson decodes the large payloads several times faster than json, it is used if it is installed
+try:
+    import orjson
+    loads = orjson.loads
+except ImportError:
+    loads = json.loads
+
+# the row tuples contain the values in the order of the table columns, the same order as BulkWriter uses
+TASK_COLUMNS = TASK_EXTRACTOR.columns
+STAGE_EXECUTOR_COLUMNS = STAGE_EXECUTOR_EXTRACTOR.columns
+
+
+def transform_task_page(body, stage_key, app_id):
+    """
+    Decode a page of the task list of a stage and turn it into compact row tuples. Executed either in the application
+    threads, or in the decode process pool if configured, so that the CPU-bound decoding and transformation of the
+    large task lists scales with the number of cores.
+    :param body: response body of the taskList endpoint (bytes)
+    :param stage_key: stage key
+    :param app_id: application_id
+    :raises ValueError: if the body is not a valid json
+    :return: list of the row tuples of the tasks, in the order of TASK_COLUMNS
+    """
+    tasks = loads(body)
+    if not tasks:
+        return []
+
+    extract = TASK_EXTRACTOR.extract
+    return [extract(task, stage_key, app_id) for task in tasks]
+
+
+def transform_stage_detail(body, stage_key, app_id, task_limit):
+    """
+    Decode the detail of a stage and turn it into the records of all the tables it contains: the executor summary
+    (stage_executor), the task and executor metrics distributions (stage_statistics, included only if requested by
+    withSummaries and supported by SHS) and the tasks. Executed either in the application threads, or in the decode
+    process pool if configured.
+    :param body: response body of the stage detail endpoint (bytes)
+    :param stage_key: stage key
+    :param app_id: application_id
+    :param task_limit: maximum number of the tasks (sorted by executor_run_time descending) to transform
+    :raises ValueError: if the body is not a valid json
+    :return: tuple (list of the row tuples of the stage_executors, stage_statistics attributes or None if not
+    included, list of the row tuples of the tasks or None if not included)
+    """
+    stage = loads(body)
+    if not stage:
+        return [], None, None
+
+    stage_executors = [STAGE_EXECUTOR_EXTRACTOR.extract(stage_executor, stage_key, executor_id, app_id)
+                       for executor_id, stage_executor in stage['executorSummary'].items()]
+
+    stage_statistics = None
+    if stage.get('taskMetricsDistributions'):
+        stage_statistics = StageStatisticsEntity.get_attributes(stage_key, stage['taskMetricsDistributions'],
+                                                                stage.get('executorMetricsDistributions'))
+
+    task_rows = None
+    if stage.get('tasks') is not None:
+        # the same order as the taskList endpoint sorted by -runtime
+        tasks = sorted(stage['tasks'].values(), key=lambda task: get_prop(task, 'taskMetrics', 'executorRunTime') or 0,
+                       reverse=True)
+        extract = TASK_EXTRACTOR.extract
+        task_rows = [extract(task, stage_key, app_id) for task in tasks[:task_limit]]
+    return stage_executors, stage_statistics, task_rows
@@ -0,0 +1,110 @@
+import heapq
+import random
+
+from history_fetcher.row_transformer import TASK_COLUMNS
+
+
+class TaskSampler:
+    """
+    A class responsible for sampling the tasks of a single stage, so that only a fraction of the tasks is stored while
+    the skew, straggler and failure diagnostics and the distribution of the task metrics are preserved.
+
+    The tasks are added one by one (in any order, e.g. as the pages of the task list arrive) and the following tasks
+    are kept:
+    - all the failed, killed and speculative tasks,
+    - the top_n slowest of the other tasks (by executor_run_time),
+    - a uniform random sample (reservoir sampling) of sample_size of the remaining tasks, or of sample_size of the
+      remaining tasks of each executor if the sample is stratified by executor.
+
+    Each kept task carries a sampling weight: 1 for the tasks kept always, N/n for the tasks of a sample of n tasks out
+    of N, so that sum(metric * sampling_weight) is an unbiased estimate of the total of the metric over all the tasks of
+    the stage. The random generator is seeded by the stage key, so the sample of a stage is reproducible.
+    """
+    RUN_TIME_INDEX = TASK_COLUMNS.index('executor_run_time')
+    STATUS_INDEX = TASK_COLUMNS.index('status')
+    SPECULATIVE_INDEX = TASK_COLUMNS.index('speculative')
+    EXECUTOR_INDEX = TASK_COLUMNS.index('executor_key')
+    WEIGHT_INDEX = TASK_COLUMNS.index('sampling_weight')
+
+    def __init__(self, stage_key, top_n, sample_size, stratify_by_executor=False):
+        """
+        Create TaskSampler object
+        :param stage_key: stage key (seed of the random generator)
+        :param top_n: number of the slowest tasks which are always kept
+        :param sample_size: size of the uniform sample of the remaining tasks (per executor if stratified)
+        :param stratify_by_executor: True for sampling the tasks of each executor separately
+        """
+        self.top_n = max(top_n, 0)
+        self.sample_size = max(sample_size, 0)
+        self.stratify_by_executor = stratify_by_executor
+        self.random = random.Random(stage_key)
+
+        self.kept = []  # failed, killed and speculative tasks
+        self.top = []  # heap of (executor_run_time, sequence number, row tuple) of the slowest tasks
+        self.sequence = 0
+        self.reservoirs = {}  # dict[stratum, List[row tuple]]
+        self.populations = {}  # dict[stratum, number of the tasks offered to the reservoir]
+
+    def add(self, row_tuple):
+        """
+        Add a task of the stage.
+        :param row_tuple: task row tuple, in the order of TASK_COLUMNS
+        """
+        if row_tuple[self.STATUS_INDEX] != "SUCCESS" or row_tuple[self.SPECULATIVE_INDEX]:
+            self.kept.append(row_tuple)
+            return
+
+        if self.top_n > 0:
+            item = (row_tuple[self.RUN_TIME_INDEX] or 0, self.sequence, row_tuple)
+            self.sequence += 1
+            if len(self.top) < self.top_n:
+                heapq.heappush(self.top, item)
+                return
+            # the task replaces the fastest of the top tasks, which goes to the sample instead
+            row_tuple = heapq.heappushpop(self.top, item)[2]
+        self.add_to_sample(row_tuple)
+
+    def add_tuples(self, row_tuples):
+        """
+        Add tasks of the stage.
+        :param row_tuples: list of task row tuples
+        """
+        for row_tuple in row_tuples:
+            self.add(row_tuple)
+
+    def add_to_sample(self, row_tuple):
+        """
+        Offer a task to the reservoir of its stratum (algorithm R).
+        :param row_tuple: task row tuple
+        """
+        stratum = row_tuple[self.EXECUTOR_INDEX] if self.stratify_by_executor else None
+        population = self.populations.get(stratum, 0) + 1
+        self.populations[stratum] = population
+        reservoir = self.reservoirs.setdefault(stratum, [])
+        if len(reservoir) < self.sample_size:
+            reservoir.append(row_tuple)
+        else:
+            index = self.random.randrange(population)
+            if index < self.sample_size:
+                reservoir[index] = row_tuple
+
+    def get_rows(self):
+        """
+        Get the kept tasks together with their sampling weights.
+        :return: list of task row tuples
+        """
+        rows = self.kept + [item[2] for item in self.top]
+        for stratum, reservoir in self.reservoirs.items():
+            weight = self.populations[stratum] / len(reservoir) if reservoir else None
+            rows += [self.set_weight(row_tuple, weight) for row_tuple in reservoir]
+        return rows
+
+    @classmethod
+    def set_weight(cls, row_tuple, weight):
+        """
+        Set the sampling weight of a task row tuple.
+        :param row_tuple: task row tuple
+        :param weight: sampling weight
+        :return: new row tuple
+        """
+        return row_tuple[:cls.WEIGHT_INDEX] + (weight,) + row_tuple[cls.WEIGHT_INDEX + 1:]
@@ -12,28 +12,34 @@ class Utils:
     """
     Utilities for History Fetcher
     """
-    def __init__(self):
+    def __init__(self, base_url=None, app_id_prefix=""):
+        """
+        Create Utils object
+        :param base_url: URL of the applications endpoint of SHS, base_url from the config by default
+        :param app_id_prefix: prefix of the application_id's (the namespace of a History Server source), e.g. "prod-"
+        """
         self.config = configparser.ConfigParser()
         self.config.read(os.path.join(os.path.dirname(__file__), 'config.ini'))
-        self.base_url = self.config['history_fetcher']['base_url']
+        self.base_url = base_url if base_url is not None else self.config['history_fetcher']['base_url']
+        self.app_id_prefix = app_id_prefix
 
     def get_app_id_from_url(self, url):
         """
         Get application_id from url.
         :param url: url with pattern 'https://history.server:port/api/v1/applications/<app_id>/something_more'
-        :return: application_id or None (if the url is invalid or malformed)
+        :return: application_id (with the app_id_prefix) or None (if the url is invalid or malformed)
         """
         parse = re.search(rf'{self.base_url}/([a-zA-Z0-9\-_]*)(/.*)*', url.rstrip("/"))
-        return None if parse is None else parse.group(1)
+        return None if parse is None else f"{self.app_id_prefix}{parse.group(1)}"
 
     def get_stage_key_from_url(self, url):
         """
         Get stage_key from url.
         :param url: url with pattern 'https://history.server:port/api/v1/applications/<app_id>/stages/<stage_id>/...
-        :return: stage_key or None (if the url is invalid or malformed)
+        :return: stage_key (with the app_id_prefix) or None (if the url is invalid or malformed)
         """
         parse = re.search(rf'{self.base_url}/([a-zA-Z0-9\-_]+)/stages/([0-9]+)(/.*)*', url.rstrip("/"))
-        stage_key = None if parse is None else f"{parse.group(1)}_{parse.group(2)}"
+        stage_key = None if parse is None else f"{self.app_id_prefix}{parse.group(1)}_{parse.group(2)}"
         return stage_key
 
     def get_app_id_from_stage_key(self, stage_key):
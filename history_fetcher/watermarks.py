@@ -0,0 +1,98 @@
+class Watermarks:
+    """
+    A class responsible for the incremental fetching of a running application: it decides which jobs and stages are
+    new or changed since the previous poll, and computes the watermarks for the next poll.
+
+    The watermarks of a poll are the highest job id and stage id seen, and the newest completion time of the jobs and
+    stages seen. A job or a stage is changed if
+    - its id is above the id watermark (it is new),
+    - it has no completion time (it is still running or pending, so its progress changes),
+    - or its completion time is newer than the completion watermark (it finished after the previous poll).
+    The other jobs and stages finished before the previous poll and were already stored. The completion times share the
+    same format (e.g. 2020-01-01T01:01:01.123GMT), so they are compared as strings.
+    """
+    def __init__(self, job_id=None, stage_id=None, completion_time=None):
+        """
+        Create Watermarks object
+        :param job_id: highest job id seen by the previous poll, None for the first poll
+        :param stage_id: highest stage id seen by the previous poll, None for the first poll
+        :param completion_time: newest completion time seen by the previous poll, None for the first poll
+        """
+        self.job_id = job_id
+        self.stage_id = stage_id
+        self.completion_time = completion_time
+        self.next_job_id = job_id
+        self.next_stage_id = stage_id
+        self.next_completion_time = completion_time
+
+    def is_first_poll(self):
+        """
+        Check if no job or stage of the application has been seen before.
+        :return: True for the first poll
+        """
+        return self.job_id is None and self.stage_id is None
+
+    def is_job_changed(self, job):
+        """
+        Check if a job is new or changed since the previous poll, and take it into account in the next watermarks.
+        :param job: job data (json), as returned by the jobs endpoint
+        :return: True if the job should be stored
+        """
+        completion_time = job.get('completionTime')
+        self.next_job_id = self.get_max(self.next_job_id, job['jobId'])
+        self.next_completion_time = self.get_max(self.next_completion_time, completion_time)
+        return self.is_changed(job['jobId'], self.job_id, completion_time)
+
+    def is_stage_changed(self, stage):
+        """
+        Check if a stage is new or changed since the previous poll, and take it into account in the next watermarks.
+        :param stage: stage data (json), as returned by the stages endpoint
+        :return: True if the stage should be stored
+        """
+        completion_time = stage.get('completionTime')
+        self.next_stage_id = self.get_max(self.next_stage_id, stage['stageId'])
+        self.next_completion_time = self.get_max(self.next_completion_time, completion_time)
+        return self.is_changed(stage['stageId'], self.stage_id, completion_time)
+
+    def is_changed(self, item_id, id_watermark, completion_time):
+        """
+        Check if a job or a stage is new or changed since the previous poll.
+        :param item_id: job id or stage id
+        :param id_watermark: highest id seen by the previous poll
+        :param completion_time: completion time of the job or the stage, None if it has not finished
+        :return: True if the job or the stage is new or changed
+        """
+        if id_watermark is None or item_id > id_watermark or completion_time is None:
+            return True
+        return self.completion_time is None or completion_time > self.completion_time
+
+    @staticmethod
+    def get_max(current, value):
+        """
+        Get the higher of two values, ignoring None.
+        :param current: current maximum or None
+        :param value: new value or None
+        :return: the higher value
+        """
+        if current is None:
+            return value
+        return current if value is None else max(current, value)
+
+    def get_attributes(self, next_poll=True):
+        """
+        Get the watermarks as the fetch_state attributes.
+        :param next_poll: True for the watermarks of the next poll, False for those of the previous poll (e.g. for
+        repeating a failed poll)
+        :return: dict (attribute: value)
+        """
+        if next_poll:
+            return {
+                'job_watermark': self.next_job_id,
+                'stage_watermark': self.next_stage_id,
+                'completion_watermark': self.next_completion_time,
+            }
+        return {
+            'job_watermark': self.job_id,
+            'stage_watermark': self.stage_id,
+            'completion_watermark': self.completion_time,
+        }
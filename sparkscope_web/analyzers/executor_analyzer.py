@@ -6,10 +6,10 @@ from db.entities.stage_statistics import StageStatisticsEntity
 from db.entities.task import TaskEntity
 from sparkscope_web.analyzers.analyzer import Analyzer
 from db.entities.stage import StageEntity
-from sparkscope_web.metrics.helpers import size_in_bytes, fmt_time
+from sparkscope_web.metrics.helpers import size_in_bytes, fmt_time, fmt_bytes
 from sparkscope_web.metrics.metric import StageFailureMetric, EmptyMetric, StageSkewMetric, StageDiskSpillMetric, \
-    DriverGcTimeMetric, ExecutorGcTimeMetric
-from sparkscope_web.metrics.metric_details import MetricDetailsList
+    DriverGcTimeMetric, ExecutorGcTimeMetric, ExecutorMemoryWastageMetric
+from sparkscope_web.metrics.metric_details import MetricDetailsList, MetricDetails
 from sparkscope_web.metrics.metrics_constants import SPARK_RESERVED_MEMORY, DEFAULT_EXECUTOR_MEMORY, \
     EXECUTOR_MEMORY_WASTAGE_THRESHOLDS, DRIVER_TOO_LOW_GC_THRESHOLDS, \
     DRIVER_TOO_HIGH_GC_THRESHOLDS, EXECUTOR_TOO_LOW_GC_THRESHOLDS, EXECUTOR_TOO_HIGH_GC_THRESHOLDS
@@ -40,25 +40,44 @@ class ExecutorAnalyzer(Analyzer):
 
     def analyze_executor_memory_wastage(self):
         """
-        !!! At the moment, this analysis does not work correctly and should not be used !!!
-        Analyze if executors have reasonable amount of memory allocated or if they have more than needed.
-        :return: Metric object
+        Analyze if executors have reasonable amount of memory allocated or if they have more than needed. The allocated
+        memory (spark.executor.memory) is compared to the peak JVM heap memory used by any of the executors (the
+        peakMemoryMetrics of SHS, available since Spark 3.0) plus the memory reserved by Spark.
+        :return: ExecutorMemoryWastageMetric object if an issue is found. Otherwise (or if the peak memory metrics are
+        not available), EmptyMetric is returned.
         """
-        severity = Severity.NONE
-        details = {}
+        executors = [e for e in self.executors if e.peak_jvm_heap_memory]
+        if len(executors) == 0:
+            return EmptyMetric(severity=Severity.NONE)
 
         allocated_executor_memory = self.app.get_spark_property(EXECUTOR_MEMORY_KEY)
         allocated_executor_memory_bytes = size_in_bytes(allocated_executor_memory, default=DEFAULT_EXECUTOR_MEMORY)
 
-        # TODO Currently, this analysis/metric cannot work with Spark History Server (on SHS, peak execution
-        # TODO memory is always 0).
-        # TODO Maybe there could be a way how to retrieve the peak memory usage data from event logs.
-        max_memory_usage_per_executor = 0
+        max_memory_usage_per_executor = max(e.peak_jvm_heap_memory for e in executors)
 
-        ratio = allocated_executor_memory_bytes / (max_memory_usage_per_executor + EXECUTOR_MEMORY_KEY)
+        ratio = allocated_executor_memory_bytes / (max_memory_usage_per_executor + SPARK_RESERVED_MEMORY)
         severity = EXECUTOR_MEMORY_WASTAGE_THRESHOLDS.severity_of(ratio)
 
-        return EmptyMetric(severity=Severity.NONE)
+        if severity == Severity.NONE:
+            return EmptyMetric(severity=Severity.NONE)
+
+        overall_info = f"Executors were allocated {fmt_bytes(allocated_executor_memory_bytes)} of memory, but they " \
+                       f"used at most {fmt_bytes(max_memory_usage_per_executor)} of JVM heap " \
+                       f"(the allocated memory is {ratio:.1f}x the peak usage plus {fmt_bytes(SPARK_RESERVED_MEMORY)} " \
+                       f"reserved by Spark)"
+        details = MetricDetailsList(ascending=True)
+        for e in executors:
+            details.add(MetricDetails(entity_id=e.id,
+                                      detail_string=f"Executor {e.id}: peak JVM heap memory "
+                                                    f"{fmt_bytes(e.peak_jvm_heap_memory)}",
+                                      sort_attr=e.peak_jvm_heap_memory,
+                                      subdetails=[f"Peak execution memory {fmt_bytes(e.peak_on_heap_execution_memory)}"
+                                                  f" (on heap), peak storage memory "
+                                                  f"{fmt_bytes(e.peak_on_heap_storage_memory)} (on heap)",
+                                                  f"Peak resident set size of the process tree "
+                                                  f"{fmt_bytes(e.peak_process_tree_jvm_rss_memory)}"]))
+
+        return ExecutorMemoryWastageMetric(severity, overall_info, details)
 
     def analyze_driver_gc_time(self):
         """
@@ -145,6 +145,10 @@ class StageAnalyzer(Analyzer):
             # also find which tasks is the most responsible for the spill
             worst_task = self.db.query(TaskEntity).filter(TaskEntity.stage_key == stage_key)\
                 .order_by(desc(TaskEntity.memory_bytes_spilled)).first()
+            # number of the spilling tasks, estimated from the stored tasks weighted by their sampling weights (the
+            # tasks stored before the sampling was introduced have no weight, they stand for themselves)
+            spilling_tasks = self.db.query(func.sum(func.coalesce(TaskEntity.sampling_weight, 1.0)))\
+                .filter(TaskEntity.stage_key == stage_key, TaskEntity.memory_bytes_spilled > 0).scalar()
 
             max_memory_usage = max(input_bytes, output_bytes, shuffle_read_bytes, shuffle_write_bytes)
             stage_severity = STAGE_DISK_SPILL_THRESHOLDS.severity_of(memory_bytes_spilled/max_memory_usage)
@@ -166,6 +170,8 @@ class StageAnalyzer(Analyzer):
                     subdetails.append(f"Biggest contributor: task {worst_task.task_id}, "
                                       f"{fmt_bytes(memory_bytes_spilled_by_worst_task)} spilled "
                                       f"({fmt_bytes(disk_bytes_spilled_by_worst_task)} on disk).")
+                if spilling_tasks:
+                    subdetails.append(f"Tasks with a spill: {round(spilling_tasks)} (estimated from the stored tasks).")
 
                 detail_string = f"Stage {id} spilled {fmt_bytes(memory_bytes_spilled)} ({fmt_bytes(disk_bytes_spilled)} on disk)."
 
@@ -133,12 +133,14 @@ def application(app_id):
     spark_app = session.query(ApplicationEntity).get(app_id)
     basic_metrics = spark_app.get_basic_metrics()
     basic_configs = spark_app.get_basic_configs()
+    sql_executions = spark_app.get_slowest_sql_executions()
     all_configs_json = spark_app.get_spark_properties_as_dict()
     return render_template('application.html',
                            form=search_form,
                            app=spark_app,
                            basic_metrics=basic_metrics,
                            basic_configs=basic_configs,
+                           sql_executions=sql_executions,
                            all_configs_json=all_configs_json)
 
 
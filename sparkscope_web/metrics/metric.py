@@ -1,6 +1,6 @@
 from sparkscope_web.metrics.metrics_constants import STAGE_FAILURE_READABLE_LIST_LENGTH, \
     STAGE_SKEW_READABLE_LIST_LENGTH, STAGE_DISK_SPILL_READABLE_LIST_LENGTH, JOB_FAILURE_READABLE_LIST_LENGTH, \
-    DRIVER_GC_READABLE_LIST_LENGTH, EXECUTOR_GC_READABLE_LIST_LENGTH
+    DRIVER_GC_READABLE_LIST_LENGTH, EXECUTOR_GC_READABLE_LIST_LENGTH, EXECUTOR_MEMORY_WASTAGE_READABLE_LIST_LENGTH
 from sparkscope_web.metrics.severity import Severity
 
 
@@ -103,6 +103,19 @@ class ExecutorGcTimeMetric(Metric):
         self.title = "Executors GC Time"
 
 
+class ExecutorMemoryWastageMetric(Metric):
+    def __init__(self, severity, overall_info, details):
+        """
+        Create ExecutorMemoryWastageMetric object
+        :param severity: Severity enum object
+        :param overall_info: high level info about metric result (how much more memory the executors were allocated
+        than they used at their peak)
+        :param details: detailed info (peak memory usage of the executors)
+        """
+        super().__init__(severity, overall_info, details, EXECUTOR_MEMORY_WASTAGE_READABLE_LIST_LENGTH)
+        self.title = "Executor Memory Wastage"
+
+
 class SerializerConfigMetric(Metric):
     def __init__(self, severity, overall_info, details):
         """
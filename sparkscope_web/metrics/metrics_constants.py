@@ -43,7 +43,7 @@ STAGE_DISK_SPILL_THRESHOLDS = Thresholds(STAGE_DISK_SPILL_LOW, STAGE_DISK_SPILL_
 
 
 # ========== executor memory metric configuration ==========
-# Ratio (allocated executor memory)/(executor peak memory + Spark reserved memory)
+# Ratio (allocated executor memory)/(executor peak JVM heap memory + Spark reserved memory)
 # where the reserved memory is hardcoded to 300 MB in Spark
 EXECUTOR_MEMORY_RATIO_LOW_DEFAULT = 2.0
 EXECUTOR_MEMORY_RATIO_HIGH_DEFAULT = 10.0
@@ -224,6 +224,9 @@ JOB_FAILURE_READABLE_LIST_LENGTH = config.getint("readable_list_length", "job_fa
 DRIVER_GC_READABLE_LIST_LENGTH = config.getint("readable_list_length", "driver_gc_readable_list_length", fallback=-1)
 EXECUTOR_GC_READABLE_LIST_LENGTH = config.getint("readable_list_length", "executor_gc_readable_list_length",
                                                  fallback=-1)
+EXECUTOR_MEMORY_WASTAGE_READABLE_LIST_LENGTH = config.getint("readable_list_length",
+                                                             "executor_memory_wastage_readable_list_length",
+                                                             fallback=-1)
 SERIALIZER_CONFIG_READABLE_LIST_LENGTH = config.getint("readable_list_length", "serializer_config_readable_list_length",
                                                        fallback=-1)
 DYNAMIC_ALLOCATION_CONFIG_READABLE_LIST_LENGTH = config.getint("readable_list_length",
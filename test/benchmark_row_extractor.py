@@ -0,0 +1,117 @@
+"""
+Benchmark of the extraction of the task rows: the compiled RowExtractor against the previous path (the attribute dict
+built by get_prop calls, turned into a row tuple). Not collected by pytest, run it by
+
+    python -m test.benchmark_row_extractor [number of tasks]
+"""
+import json
+import sys
+import time
+
+from db.entities.task import TASK_EXTRACTOR
+from history_fetcher.utils import get_prop
+
+TASK_COLUMNS = TASK_EXTRACTOR.columns
+
+
+def get_task(task_id):
+    return {
+        'taskId': task_id, 'index': task_id, 'attempt': 0, 'launchTime': "2020-01-01T00:00:00.000GMT",
+        'duration': 1000 + task_id % 500, 'executorId': str(task_id % 50), 'host': "host", 'status': "SUCCESS",
+        'taskLocality': "PROCESS_LOCAL", 'speculative': False, 'accumulatorUpdates': [],
+        'taskMetrics': {
+            'executorDeserializeTime': 1, 'executorDeserializeCpuTime': 1, 'executorRunTime': 900,
+            'executorCpuTime': 800, 'resultSize': 10, 'jvmGcTime': 5, 'resultSerializationTime': 0,
+            'memoryBytesSpilled': 0, 'diskBytesSpilled': 0, 'peakExecutionMemory': 0,
+            'inputMetrics': {'bytesRead': 10, 'recordsRead': 1},
+            'outputMetrics': {'bytesWritten': 0, 'recordsWritten': 0},
+            'shuffleReadMetrics': {'remoteBlocksFetched': 0, 'localBlocksFetched': 0, 'fetchWaitTime': 0,
+                                   'remoteBytesRead': 0, 'remoteBytesReadToDisk': 0, 'localBytesRead': 0,
+                                   'recordsRead': 0},
+            'shuffleWriteMetrics': {'bytesWritten': 0, 'writeTime': 0, 'recordsWritten': 0},
+        },
+    }
+
+
+def get_attributes_with_get_prop(stage_key, task, app_id):
+    """
+    The previous TaskEntity.get_attributes().
+    """
+    return {
+        'task_key': f"{stage_key}_{task['taskId']}",
+        'stage_key': stage_key,
+        'task_id': task['taskId'],
+        'index': task['index'],
+        'attempt': task['attempt'],
+        'launch_time': task['launchTime'],
+        'duration': task['duration'],
+        'executor_key': f"{app_id}_{task['executorId']}",
+        'host': task['host'],
+        'status': task['status'],
+        'error_message': get_prop(task, 'errorMessage'),
+        'task_locality': task['taskLocality'],
+        'speculative': task['speculative'],
+        'accumulator_updates': task['accumulatorUpdates'],
+        'executor_deserialize_time': get_prop(task, 'taskMetrics', 'executorDeserializeTime'),
+        'executor_deserialize_cpu_time': get_prop(task, 'taskMetrics', 'executorDeserializeCpuTime'),
+        'executor_run_time': get_prop(task, 'taskMetrics', 'executorRunTime'),
+        'executor_cpu_time': get_prop(task, 'taskMetrics', 'executorCpuTime'),
+        'result_size': get_prop(task, 'taskMetrics', 'resultSize'),
+        'jvm_gc_time': get_prop(task, 'taskMetrics', 'jvmGcTime'),
+        'result_serialization_time': get_prop(task, 'taskMetrics', 'resultSerializationTime'),
+        'memory_bytes_spilled': get_prop(task, 'taskMetrics', 'memoryBytesSpilled'),
+        'disk_bytes_spilled': get_prop(task, 'taskMetrics', 'diskBytesSpilled'),
+        'peak_execution_memory': get_prop(task, 'taskMetrics', 'peakExecutionMemory'),
+        'bytes_read': get_prop(task, 'taskMetrics', 'inputMetrics', 'bytesRead'),
+        'records_read': get_prop(task, 'taskMetrics', 'inputMetrics', 'recordsRead'),
+        'bytes_written': get_prop(task, 'taskMetrics', 'outputMetrics', 'bytesWritten'),
+        'records_written': get_prop(task, 'taskMetrics', 'outputMetrics', 'recordsWritten'),
+        'shuffle_remote_blocks_fetched': get_prop(task, 'taskMetrics', 'shuffleReadMetrics', 'remoteBlocksFetched'),
+        'shuffle_local_blocks_fetched': get_prop(task, 'taskMetrics', 'shuffleReadMetrics', 'localBlocksFetched'),
+        'shuffle_fetch_wait_time': get_prop(task, 'taskMetrics', 'shuffleReadMetrics', 'fetchWaitTime'),
+        'shuffle_remote_bytes_read': get_prop(task, 'taskMetrics', 'shuffleReadMetrics', 'remoteBytesRead'),
+        'shuffle_remote_bytes_read_to_disk': get_prop(task, 'taskMetrics', 'shuffleReadMetrics',
+                                                      'remoteBytesReadToDisk'),
+        'shuffle_local_bytes_read': get_prop(task, 'taskMetrics', 'shuffleReadMetrics', 'localBytesRead'),
+        'shuffle_records_read': get_prop(task, 'taskMetrics', 'shuffleReadMetrics', 'recordsRead'),
+        'shuffle_bytes_written': get_prop(task, 'taskMetrics', 'shuffleWriteMetrics', 'bytesWritten'),
+        'shuffle_write_time': get_prop(task, 'taskMetrics', 'shuffleWriteMetrics', 'writeTime'),
+        'shuffle_records_written': get_prop(task, 'taskMetrics', 'shuffleWriteMetrics', 'recordsWritten'),
+        'sampling_weight': 1.0
+    }
+
+
+def extract_with_get_prop(tasks):
+    rows = []
+    for task in tasks:
+        attributes = get_attributes_with_get_prop("app-1_0", task, "app-1")
+        rows.append(tuple(attributes.get(column) for column in TASK_COLUMNS))
+    return rows
+
+
+def extract_compiled(tasks):
+    extract = TASK_EXTRACTOR.extract
+    return [extract(task, "app-1_0", "app-1") for task in tasks]
+
+
+def benchmark(name, function, tasks, repeat=5):
+    best = min(measure(function, tasks) for _ in range(repeat))
+    print(f"{name:<12} {len(tasks) / best:>12,.0f} tasks/s")
+    return best
+
+
+def measure(function, tasks):
+    start = time.perf_counter()
+    function(tasks)
+    return time.perf_counter() - start
+
+
+if __name__ == "__main__":
+    task_count = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+    # decoded from json, as the tasks come from SHS
+    tasks = json.loads(json.dumps([get_task(task_id) for task_id in range(task_count)]))
+    assert extract_with_get_prop(tasks) == extract_compiled(tasks)
+
+    previous = benchmark("get_prop", extract_with_get_prop, tasks)
+    compiled = benchmark("compiled", extract_compiled, tasks)
+    print(f"speedup      {previous / compiled:>12.1f}x")
@@ -1,8 +1,10 @@
+import configparser
+
+from history_fetcher.data_fetcher import DataFetcher
 from history_fetcher.utils import Utils
 import history_fetcher.utils as utils
 
-u = Utils()
-u.base_url = "https://spark.history.server.com:18488/api/v1/applications"
+u = Utils("https://spark.history.server.com:18488/api/v1/applications")
 
 
 def test_get_app_id_from_url():
@@ -41,6 +43,20 @@ def test_get_stage_key_from_url():
     assert u.get_stage_key_from_url(urls[5]) is None
 
 
+def test_get_app_id_from_url_with_prefix():
+    prefixed = Utils("https://spark.history.server.com:18488/api/v1/applications", app_id_prefix="prod-")
+    urls = [
+        "https://spark.history.server.com:18488/api/v1/applications/application_1602836119886_0201/jobs",
+        "https://spark.history.server.com:18488/api/v1/applications/app_id_12345/stages/10/taskSummary",
+        "https://www.google.com",
+    ]
+
+    assert prefixed.get_app_id_from_url(urls[0]) == "prod-application_1602836119886_0201"
+    assert prefixed.get_stage_key_from_url(urls[1]) == "prod-app_id_12345_10"
+    assert prefixed.get_app_id_from_url(urls[2]) is None
+    assert u.get_app_id_from_stage_key("prod-application_1602836119886_0201_3") == "prod-application_1602836119886_0201"
+
+
 def test_get_app_id_from_stage_key():
     stage_keys = [
         "applicationId_123_456_555",
@@ -75,5 +91,48 @@ def test_get_prop():
 
 test_get_app_id_from_url()
 test_get_stage_key_from_url()
+test_get_app_id_from_url_with_prefix()
 test_get_app_id_from_stage_key()
 test_get_prop()
+
+
+def get_config(text):
+    config = configparser.ConfigParser()
+    config.read_string(text)
+    return config
+
+
+def test_get_app_id_source():
+    config = get_config("""
+[history_fetcher]
+sources=legacy,a,ab
+[source:legacy]
+app_id_prefix=
+[source:a]
+app_id_prefix=a-
+[source:ab]
+app_id_prefix=a-b-
+""")
+    assert DataFetcher.get_app_id_prefix("legacy", config) == ""
+    assert DataFetcher.get_app_id_source("application_1602836119886_0201", config) == "legacy"
+    assert DataFetcher.get_app_id_source("a-application_1602836119886_0201", config) == "a"
+    assert DataFetcher.get_app_id_source("a-b-application_1602836119886_0201", config) == "ab"
+
+
+def test_get_app_id_source_default_prefix():
+    config = get_config("""
+[history_fetcher]
+sources=prod,test
+[source:prod]
+[source:test]
+""")
+    assert DataFetcher.get_app_id_prefix("prod", config) == "prod-"
+    assert DataFetcher.get_app_id_source("test-application_1602836119886_0201", config) == "test"
+    for app_id in ["application_1602836119886_0201", "dev-application_1602836119886_0201"]:
+        try:
+            DataFetcher.get_app_id_source(app_id, config)
+            assert False
+        except ValueError:
+            pass
+    # the History Server of the history_fetcher section
+    assert DataFetcher.get_app_id_source("application_1602836119886_0201", get_config("[history_fetcher]")) is None
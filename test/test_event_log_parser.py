@@ -0,0 +1,110 @@
+from db.entities.application import ApplicationEntity
+from db.entities.executor import ExecutorEntity
+from db.entities.job import JobEntity
+from db.entities.stage import StageEntity
+from db.entities.stage_executor import StageExecutorEntity, STAGE_EXECUTOR_EXTRACTOR
+from db.entities.stage_statistics import StageStatisticsEntity
+from db.entities.task import TaskEntity, TASK_EXTRACTOR
+from history_fetcher.event_log_parser import EventLogParser
+
+APP_ID = "app-20240101000000-0001"
+
+
+def get_task_end(task_id, index, executor_id, run_time, reason="Success", stage_attempt_id=0):
+    return {"Event": "SparkListenerTaskEnd", "Stage ID": 0, "Stage Attempt ID": stage_attempt_id,
+            "Task End Reason": {"Reason": reason},
+            "Task Info": {"Task ID": task_id, "Index": index, "Attempt": 0, "Launch Time": 1704067201000,
+                          "Executor ID": executor_id, "Host": f"host{executor_id}", "Locality": "PROCESS_LOCAL",
+                          "Speculative": False, "Finish Time": 1704067201000 + run_time + 100},
+            "Task Metrics": {"Executor Run Time": run_time, "Executor Deserialize Time": 10,
+                             "Input Metrics": {"Bytes Read": 100, "Records Read": 10},
+                             "Shuffle Write Metrics": {"Shuffle Bytes Written": 50, "Shuffle Records Written": 5}},
+            "Task Executor Metrics": {"JVMHeapMemory": 1000 * task_id}}
+
+
+STAGE_0 = {"Stage ID": 0, "Stage Attempt ID": 0, "Stage Name": "map", "Number of Tasks": 3, "RDD Info": [],
+           "Submission Time": 1704067200500, "Completion Time": 1704067205000, "Accumulables": []}
+STAGE_1 = {"Stage ID": 1, "Stage Attempt ID": 0, "Stage Name": "reduce", "Number of Tasks": 4, "RDD Info": []}
+
+# a small synthetic event log: one job with a stage run on two executors (one of its tasks failed and was retried)
+# and a skipped stage
+EVENTS = [
+    {"Event": "SparkListenerLogStart", "Spark Version": "3.1.2"},
+    {"Event": "SparkListenerApplicationStart", "App Name": "test", "App ID": APP_ID, "Timestamp": 1704067200000,
+     "User": "spark"},
+    {"Event": "SparkListenerEnvironmentUpdate", "JVM Information": {"Java Version": "1.8.0"},
+     "Spark Properties": {"spark.executor.cores": "2"}, "System Properties": {"sun.java.command": "Main"}},
+    {"Event": "SparkListenerExecutorAdded", "Timestamp": 1704067200100, "Executor ID": "1",
+     "Executor Info": {"Host": "host1", "Total Cores": 2}},
+    {"Event": "SparkListenerExecutorAdded", "Timestamp": 1704067200100, "Executor ID": "2",
+     "Executor Info": {"Host": "host2", "Total Cores": 2}},
+    {"Event": "SparkListenerJobStart", "Job ID": 0, "Submission Time": 1704067200400, "Stage Infos": [STAGE_0, STAGE_1],
+     "Stage IDs": [0, 1]},
+    {"Event": "SparkListenerStageSubmitted", "Stage Info": STAGE_0},
+    get_task_end(0, 0, "1", 1000),
+    get_task_end(1, 1, "2", 3000, reason="ExceptionFailure"),
+    get_task_end(2, 1, "1", 2000),
+    get_task_end(3, 2, "2", 500),
+    {"Event": "SparkListenerStageCompleted", "Stage Info": STAGE_0},
+    {"Event": "SparkListenerJobEnd", "Job ID": 0, "Completion Time": 1704067205100,
+     "Job Result": {"Result": "JobSucceeded"}},
+    {"Event": "SparkListenerApplicationEnd", "Timestamp": 1704067206000}
+]
+
+
+def parse(events, task_limit=10, task_sampling=None):
+    parser = EventLogParser()
+    for event in events:
+        parser.process_event(event)
+    return parser.get_application_rows(task_limit, task_sampling)
+
+
+def test_application_rows():
+    rows = parse(EVENTS)
+    app, = rows.rows[ApplicationEntity]
+    assert app['app_id'] == APP_ID
+    assert app['duration'] == 6000
+    assert app['completed'] and app['mode'] == "client"
+
+    executors = {executor['id']: executor for executor in rows.rows[ExecutorEntity]}
+    assert sorted(executors) == ["1", "2"]
+    assert executors["1"]['failed_tasks'] == 0 and executors["2"]['failed_tasks'] == 1
+    assert executors["1"]['total_input_bytes'] == 200
+    assert executors["2"]['peak_jvm_heap_memory'] == 3000
+
+    job, = rows.rows[JobEntity]
+    assert job['status'] == "SUCCEEDED"
+    assert job['num_completed_tasks'] == 3 and job['num_failed_tasks'] == 1
+    assert job['num_skipped_stages'] == 1 and job['num_skipped_tasks'] == 4
+
+    stages = {stage['stage_id']: stage for stage in rows.rows[StageEntity]}
+    assert stages[0]['status'] == "COMPLETE" and stages[1]['status'] == "SKIPPED"
+    assert stages[0]['num_completed_indices'] == 3
+    assert stages[0]['executor_run_time'] == 6500
+    assert stages[0]['job_key'] == stages[1]['job_key'] == f"{APP_ID}_0"
+
+    stage_statistics, = rows.rows[StageStatisticsEntity]
+    assert stage_statistics['stage_key'] == f"{APP_ID}_0"
+
+    stage_executors = {row['executor_id']: row for row in (dict(zip(STAGE_EXECUTOR_EXTRACTOR.columns, row_tuple))
+                                                           for row_tuple in rows.tuples[StageExecutorEntity])}
+    assert stage_executors["2"]['failed_tasks'] == 1 and stage_executors["2"]['succeeded_tasks'] == 1
+    assert stage_executors["1"]['input_bytes'] == 200
+
+    tasks = [dict(zip(TASK_EXTRACTOR.columns, row_tuple)) for row_tuple in rows.tuples[TaskEntity]]
+    assert [task['task_id'] for task in tasks] == [1, 2, 0, 3]
+    assert rows.task_count == 4
+
+
+def test_task_limit():
+    rows = parse(EVENTS, task_limit=2)
+    tasks = [dict(zip(TASK_EXTRACTOR.columns, row_tuple)) for row_tuple in rows.tuples[TaskEntity]]
+    assert [task['task_id'] for task in tasks] == [1, 2]
+
+
+def test_unfinished_application():
+    try:
+        parse(EVENTS[:-1])
+        assert False
+    except ValueError:
+        pass
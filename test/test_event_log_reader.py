@@ -0,0 +1,71 @@
+import json
+import struct
+
+import pytest
+
+from db.entities.task import TaskEntity
+from history_fetcher.event_log_parser import parse_event_log
+from history_fetcher.event_log_reader import EventLogReader
+from test.test_event_log_parser import APP_ID, EVENTS
+
+
+def test_get_app_id_and_attempt():
+    names = [
+        "local-1602836119886",
+        "application_1602836119886_0201_1",
+        "application_1602836119886_0201_2.lz4",
+        "app-20201016101010-0001.zstd",
+        "eventlog_v2_application_1602836119886_0201_1",
+        "eventlog_v2_local-1602836119886",
+    ]
+
+    assert EventLogReader.get_app_id_and_attempt(names[0]) == ("local-1602836119886", None)
+    assert EventLogReader.get_app_id_and_attempt(names[1]) == ("application_1602836119886_0201", 1)
+    assert EventLogReader.get_app_id_and_attempt(names[2]) == ("application_1602836119886_0201", 2)
+    assert EventLogReader.get_app_id_and_attempt(names[3]) == ("app-20201016101010-0001", None)
+    assert EventLogReader.get_app_id_and_attempt(names[4]) == ("application_1602836119886_0201", 1)
+    assert EventLogReader.get_app_id_and_attempt(names[5]) == ("local-1602836119886", None)
+
+
+def test_split_codec():
+    assert EventLogReader.split_codec("local-1602836119886.snappy") == ("local-1602836119886", "snappy")
+    assert EventLogReader.split_codec("local-1602836119886") == ("local-1602836119886", None)
+    assert EventLogReader.split_codec("app-20201016101010-0001.unknown") == ("app-20201016101010-0001.unknown", None)
+
+
+def write_lz4(path, data, block_size):
+    # the block stream of LZ4BlockOutputStream (lz4-java), as written by Spark
+    import lz4.block
+    with open(path, "wb") as f:
+        for start in range(0, len(data), block_size):
+            block = data[start:start + block_size]
+            compressed = lz4.block.compress(block, store_size=False)
+            f.write(EventLogReader.LZ4_MAGIC + bytes([0x20]) + struct.pack("<iii", len(compressed), len(block), 0))
+            f.write(compressed)
+
+
+def write_snappy(path, data, block_size):
+    # the stream of SnappyOutputStream (snappy-java), as written by Spark
+    import snappy
+    with open(path, "wb") as f:
+        f.write(EventLogReader.SNAPPY_MAGIC + struct.pack(">ii", 1, 1))
+        for start in range(0, len(data), block_size):
+            compressed = snappy.compress(data[start:start + block_size])
+            f.write(struct.pack(">i", len(compressed)) + compressed)
+
+
+@pytest.mark.parametrize("codec, write", [("lz4", write_lz4), ("snappy", write_snappy)])
+def test_compressed_round_trip(tmp_path, codec, write):
+    pytest.importorskip("lz4" if codec == "lz4" else "snappy")
+    lines = [json.dumps(event) for event in EVENTS]
+    path = tmp_path / f"{APP_ID}.{codec}"
+    # small blocks, so that the lines span the block boundaries
+    write(path, "\n".join(lines).encode(), block_size=100)
+
+    reader, = EventLogReader.find_event_logs(tmp_path)
+    assert (reader.app_id, reader.attempt_id) == (APP_ID, None)
+    assert [line.decode() for line in reader.read_lines()] == lines
+
+    rows = parse_event_log(str(path), task_limit=10)
+    assert rows.app_id == APP_ID
+    assert len(rows.tuples[TaskEntity]) == 4
@@ -0,0 +1,32 @@
+from history_fetcher.fetch_metrics import FetchMetrics
+
+BASE_URL = "http://localhost:18080/api/v1/applications"
+
+
+def test_get_endpoint():
+    assert FetchMetrics.get_endpoint(f"{BASE_URL}?status=completed&limit=5") == "applications"
+    assert FetchMetrics.get_endpoint(f"{BASE_URL}/app-0001/1/environment") == "environment"
+    assert FetchMetrics.get_endpoint(f"{BASE_URL}/app-0001/allexecutors") == "allexecutors"
+    assert FetchMetrics.get_endpoint(f"{BASE_URL}/app-0001/stages") == "stages"
+    assert FetchMetrics.get_endpoint(f"{BASE_URL}/app-0001/stages/3/0") == "stage_detail"
+    assert FetchMetrics.get_endpoint(f"{BASE_URL}/app-0001/stages/3/0/taskSummary?quantiles=0.5") == "taskSummary"
+    assert FetchMetrics.get_endpoint(f"{BASE_URL}/app-0001/stages/3/0/taskList?offset=0&length=10") == "taskList"
+    assert FetchMetrics.get_endpoint(f"{BASE_URL}/app-0001/sql?details=true&offset=0&length=100") == "sql"
+    assert FetchMetrics.get_endpoint(f"{BASE_URL}/app-0001/storage/rdd") == "other"
+
+
+def test_summary():
+    metrics = FetchMetrics()
+    metrics.observe_request(f"{BASE_URL}/app-0001/jobs", 0.1, 100)
+    metrics.observe_request(f"{BASE_URL}/app-0001/jobs", 100.0, 0, failed=True)
+    metrics.set_table_statistics({"job": (5, 0.5)})
+
+    jobs = metrics.get_summary()['endpoints']['jobs']
+    assert jobs['requests'] == 2
+    assert jobs['failed_requests'] == 1
+    assert jobs['latency_histogram']['0.1'] == 1
+    assert jobs['latency_histogram']['+Inf'] == 1
+    assert jobs['bytes_received'] == 100
+    assert jobs['rows_written'] == 5
+    assert 'sparkscope_fetch_request_duration_seconds_bucket{endpoint="jobs",le="+Inf"} 2' \
+           in metrics.get_prometheus_text()
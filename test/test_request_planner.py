@@ -0,0 +1,36 @@
+from history_fetcher.request_planner import RequestPlanner
+
+
+def get_stage(stage_id, status="COMPLETE", complete_tasks=10, failed_tasks=0):
+    return {'stageId': stage_id, 'status': status, 'numTasks': complete_tasks + failed_tasks,
+            'numActiveTasks': 0, 'numCompleteTasks': complete_tasks, 'numFailedTasks': failed_tasks,
+            'numKilledTasks': 0}
+
+
+def test_plan():
+    planner = RequestPlanner()
+    assert planner.add_stage("app-1", get_stage(0, complete_tasks=10))
+    assert planner.add_stage("app-1", get_stage(1, complete_tasks=1000))
+    assert not planner.add_stage("app-1", get_stage(2, status="SKIPPED", complete_tasks=0))
+    assert not planner.add_stage("app-1", get_stage(3, status="PENDING", complete_tasks=0))
+    assert planner.add_stage("app-1", get_stage(4, status="FAILED", complete_tasks=0, failed_tasks=50))
+
+    assert planner.get_stages() == [("app-1", 1), ("app-1", 4), ("app-1", 0)]
+    assert planner.get_stages([("app-1", 0), ("app-1", 2), ("app-1", 4)]) == [("app-1", 4), ("app-1", 0)]
+    assert planner.get_task_count("app-1", 1) == 1000
+    assert planner.get_pruned_count() == 2
+
+
+def test_avoided_requests():
+    planner = RequestPlanner(task_limit=2500, task_page_size=1000)
+    assert planner.add_stage("app-1", get_stage(0, complete_tasks=10))
+    assert not planner.add_stage("app-1", dict(get_stage(1, status="SKIPPED", complete_tasks=0), numTasks=5000))
+    assert not planner.add_stage("app-1", get_stage(2, status="PENDING", complete_tasks=0))
+    # a single stage detail per stage, including the task summary and the tasks
+    assert planner.get_avoided_request_count() == 2
+    # the task summary falls back to its own request
+    planner.set_fallbacks(statistics_fallback=True, task_fallback=False)
+    assert planner.get_avoided_request_count() == 4
+    # and the tasks to the pages of the task list: 3 pages (limited to 2500 tasks) and a single page for no tasks
+    planner.set_fallbacks(statistics_fallback=True, task_fallback=True)
+    assert planner.get_avoided_request_count() == 8
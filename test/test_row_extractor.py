@@ -0,0 +1,58 @@
+from db.entities.executor import EXECUTOR_EXTRACTOR
+from db.entities.task import TaskEntity, TASK_EXTRACTOR
+from history_fetcher.row_extractor import RowExtractor, Field, OptionalField, Arg, Const, Key
+
+TASK = {'taskId': 7, 'index': 3, 'attempt': 0, 'launchTime': "2020-01-01T00:00:00.000GMT", 'duration': 1000,
+        'executorId': "2", 'host': "host", 'status': "SUCCESS", 'taskLocality': "PROCESS_LOCAL",
+        'speculative': False, 'accumulatorUpdates': [],
+        'taskMetrics': {'executorRunTime': 900, 'inputMetrics': {'bytesRead': 10}, 'outputMetrics': None}}
+
+
+def test_task():
+    row = dict(zip(TASK_EXTRACTOR.columns, TASK_EXTRACTOR.extract(TASK, "app-1_0", "app-1")))
+    assert row['task_key'] == "app-1_0_7"
+    assert row['executor_key'] == "app-1_2"
+    assert row['executor_run_time'] == 900
+    assert row['bytes_read'] == 10
+    # missing or null nested objects and values
+    assert row['bytes_written'] is None
+    assert row['shuffle_bytes_written'] is None
+    assert row['error_message'] is None
+    assert row['sampling_weight'] == 1.0
+    assert list(row) == [column.name for column in TaskEntity.__table__.columns]
+    assert TaskEntity.get_attributes("app-1_0", TASK, "app-1") == row
+
+
+def test_executor_peak_memory_metrics():
+    executor = {'id': "1", 'hostPort': "host:1", 'isActive': False, 'rddBlocks': 0, 'memoryUsed': 0, 'diskUsed': 0,
+                'totalCores': 2, 'maxTasks': 2, 'activeTasks': 0, 'failedTasks': 0, 'totalDuration': 1000,
+                'totalGCTime': 10, 'totalInputBytes': 0, 'totalShuffleRead': 0, 'totalShuffleWrite': 0,
+                'isBlacklisted': False, 'maxMemory': 1024, 'addTime': "2020-01-01T00:00:00.000GMT",
+                'blacklistedInStages': [], 'peakMemoryMetrics': {'JVMHeapMemory': 600, 'ProcessTreeJVMRSSMemory': 900}}
+    row = EXECUTOR_EXTRACTOR.get_attributes(executor, "app-1")
+    assert row['peak_jvm_heap_memory'] == 600
+    assert row['peak_process_tree_jvm_rss_memory'] == 900
+    assert row['peak_on_heap_execution_memory'] is None
+    # Spark 2 does not report the peak memory metrics
+    del executor['peakMemoryMetrics']
+    assert EXECUTOR_EXTRACTOR.get_attributes(executor, "app-1")['peak_jvm_heap_memory'] is None
+
+
+def test_missing_required_field():
+    try:
+        EXECUTOR_EXTRACTOR.extract({'hostPort': "host:1"}, "app-1")
+        assert False
+    except KeyError:
+        pass
+
+
+def test_invalid_mapping():
+    for fields, args in [({'no_such_column': Field('a')}, []),
+                         ({'task_key': Key(Arg('stage_key'), Const(1))}, ['app_id'])]:
+        try:
+            RowExtractor(TaskEntity, fields, args)
+            assert False
+        except ValueError:
+            pass
+    extractor = RowExtractor(TaskEntity, {'task_id': OptionalField('a', 'b')}, [])
+    assert extractor.extract({'a': {'b': 1}})[TASK_EXTRACTOR.columns.index('task_id')] == 1
@@ -0,0 +1,33 @@
+from history_fetcher.row_transformer import TASK_COLUMNS
+from history_fetcher.task_sampler import TaskSampler
+
+
+def get_task(task_id, run_time, executor_id=1, status="SUCCESS", speculative=False):
+    attributes = {'task_key': f"app-1_0_{task_id}", 'executor_run_time': run_time, 'status': status,
+                  'speculative': speculative, 'executor_key': f"app-1_{executor_id}", 'sampling_weight': 1.0}
+    return tuple(attributes.get(column) for column in TASK_COLUMNS)
+
+
+def test_sample():
+    sampler = TaskSampler("app-1_0", top_n=2, sample_size=10)
+    sampler.add(get_task(0, 10, status="FAILED"))
+    sampler.add(get_task(1, 10, speculative=True))
+    sampler.add_tuples([get_task(task_id, task_id) for task_id in range(2, 1002)])
+    rows = {row[TASK_COLUMNS.index('task_key')]: row[TASK_COLUMNS.index('sampling_weight')]
+            for row in sampler.get_rows()}
+
+    assert len(rows) == 2 + 2 + 10
+    assert rows["app-1_0_0"] == 1.0 and rows["app-1_0_1"] == 1.0
+    assert rows["app-1_0_1001"] == 1.0 and rows["app-1_0_1000"] == 1.0
+    # the sample represents all the remaining 998 tasks
+    assert round(sum(rows.values())) == 1002
+
+
+def test_sample_by_executor():
+    sampler = TaskSampler("app-1_0", top_n=0, sample_size=5, stratify_by_executor=True)
+    sampler.add_tuples([get_task(task_id, task_id, executor_id=task_id % 2) for task_id in range(100)])
+    sampler.add_tuples([get_task(task_id, task_id, executor_id=2) for task_id in range(100, 103)])
+    rows = sampler.get_rows()
+
+    assert len(rows) == 5 + 5 + 3
+    assert round(sum(row[TASK_COLUMNS.index('sampling_weight')] for row in rows)) == 103
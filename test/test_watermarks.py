@@ -0,0 +1,35 @@
+from history_fetcher.watermarks import Watermarks
+
+
+def get_stage(stage_id, completion_time=None):
+    stage = {'stageId': stage_id}
+    if completion_time is not None:
+        stage['completionTime'] = completion_time
+    return stage
+
+
+def test_first_poll():
+    watermarks = Watermarks()
+    assert watermarks.is_first_poll()
+    assert watermarks.is_stage_changed(get_stage(0, "2020-01-01T00:01:00.000GMT"))
+    assert watermarks.is_stage_changed(get_stage(1))
+    assert watermarks.get_attributes() == {'job_watermark': None, 'stage_watermark': 1,
+                                           'completion_watermark': "2020-01-01T00:01:00.000GMT"}
+
+
+def test_next_poll():
+    watermarks = Watermarks(0, 1, "2020-01-01T00:01:00.000GMT")
+    assert not watermarks.is_first_poll()
+    # finished before the previous poll
+    assert not watermarks.is_stage_changed(get_stage(0, "2020-01-01T00:01:00.000GMT"))
+    # running at the previous poll, finished since
+    assert watermarks.is_stage_changed(get_stage(1, "2020-01-01T00:02:00.000GMT"))
+    # new, still running
+    assert watermarks.is_stage_changed(get_stage(2))
+    assert watermarks.is_job_changed({'jobId': 0})
+    assert not watermarks.is_job_changed({'jobId': 0, 'completionTime': "2020-01-01T00:00:30.000GMT"})
+
+    assert watermarks.get_attributes() == {'job_watermark': 0, 'stage_watermark': 2,
+                                           'completion_watermark': "2020-01-01T00:02:00.000GMT"}
+    assert watermarks.get_attributes(next_poll=False) == {'job_watermark': 0, 'stage_watermark': 1,
+                                                          'completion_watermark': "2020-01-01T00:01:00.000GMT"}